@@ -36,6 +36,14 @@ class Config:
     TEMP_IMAGE_FOLDER = os.getenv('TEMP_IMAGE_FOLDER', os.path.join(BASE_DIR, 'uploads', 'temp_images'))
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+    LEAF_ANALYSIS_MAX_SIDE = int(os.getenv('LEAF_ANALYSIS_MAX_SIDE', 1024))  # px, 0 = full resolution
+    LEAF_BATCH_WORKERS = int(os.getenv('LEAF_BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+    LEAF_BATCH_MAX_FILES = int(os.getenv('LEAF_BATCH_MAX_FILES', 50))
+    
+    # Image Result Cache (BWD + disease detection)
+    IMAGE_CACHE_MAX_ENTRIES = int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', 512))
+    IMAGE_CACHE_TTL = int(os.getenv('IMAGE_CACHE_TTL', 3600))  # seconds
+    IMAGE_CACHE_PHASH_DISTANCE = int(os.getenv('IMAGE_CACHE_PHASH_DISTANCE', 0))  # bits, 0 = exact SHA-256 only
     
     # ML Models Configuration
     # ML Models Configuration
@@ -49,7 +57,37 @@ class Config:
         'shap_explainer': 'shap_explainer.pkl',
         'success_model': 'success_model.pkl'
     }
-    
+    MODEL_MANIFEST = os.getenv('MODEL_MANIFEST', 'model_manifest.json')
+    MODEL_REGISTRY_POLL_INTERVAL = int(os.getenv('MODEL_REGISTRY_POLL_INTERVAL', 30))  # seconds, 0 = off
+    CROP_SURROGATE_ENABLED = os.getenv('CROP_SURROGATE_ENABLED', 'false').lower() == 'true'
+    CROP_SURROGATE_MODE = os.getenv('CROP_SURROGATE_MODE', 'nearest')  # nearest | interpolate
+    CROP_SURROGATE_MIN_AGREEMENT = float(os.getenv('CROP_SURROGATE_MIN_AGREEMENT', 0.97))
+    # Shadow candidates: "crop_recommendation=crop_recommendation_model.compact.pkl,..."
+    SHADOW_MODELS = dict(
+        (part.strip() for part in item.split('=', 1))
+        for item in os.getenv('SHADOW_MODELS', '').split(',') if '=' in item
+    )
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 0.1))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', 1000))
+    DRIFT_MONITOR_ENABLED = os.getenv('DRIFT_MONITOR_ENABLED', 'true').lower() == 'true'
+    DRIFT_BINS = int(os.getenv('DRIFT_BINS', 10))
+    DRIFT_WINDOW_SECONDS = int(os.getenv('DRIFT_WINDOW_SECONDS', 3600))
+    PRICE_FORECAST_REFRESH_SECONDS = int(os.getenv('PRICE_FORECAST_REFRESH_SECONDS', 3600))  # 0 = cron only
+    PRICE_FORECAST_MODEL = os.getenv('PRICE_FORECAST_MODEL', 'auto')  # auto | trend | seasonal_naive | holt_winters | ar
+    TICKER_SOURCE = os.getenv('TICKER_SOURCE', 'simulated')  # simulated | pihps
+    TICKER_REFRESH_SECONDS = int(os.getenv('TICKER_REFRESH_SECONDS', 60))
+    TICKER_COLD_TIMEOUT = float(os.getenv('TICKER_COLD_TIMEOUT', 5))  # seconds the first request may wait
+    WORLDBANK_CACHE_TTL = int(os.getenv('WORLDBANK_CACHE_TTL', 6 * 3600))  # seconds
+    WORLDBANK_MAX_RECORDS = int(os.getenv('WORLDBANK_MAX_RECORDS', 20000))
+    WORLDBANK_COLD_TIMEOUT = float(os.getenv('WORLDBANK_COLD_TIMEOUT', 5))  # seconds a request may wait for the first fetch
+    WORLDBANK_FAILURE_BACKOFF = int(os.getenv('WORLDBANK_FAILURE_BACKOFF', 300))  # seconds before retrying a failed fetch
+    PRICE_ANOMALY_ENABLED = os.getenv('PRICE_ANOMALY_ENABLED', 'true').lower() == 'true'
+    PRICE_ANOMALY_SOURCES = os.getenv('PRICE_ANOMALY_SOURCES', 'manual,crowdsource').split(',')
+    PRICE_ANOMALY_WINDOW = int(os.getenv('PRICE_ANOMALY_WINDOW', 64))  # recent prices per group
+    PRICE_ANOMALY_MIN_SAMPLES = int(os.getenv('PRICE_ANOMALY_MIN_SAMPLES', 8))
+    PRICE_ANOMALY_FLAG_Z = float(os.getenv('PRICE_ANOMALY_FLAG_Z', 3.5))  # robust z-score
+    PRICE_ANOMALY_HOLD_Z = float(os.getenv('PRICE_ANOMALY_HOLD_Z', 6.0))  # held for verification
+
     # Redis Configuration
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     CACHE_TYPE = 'redis'
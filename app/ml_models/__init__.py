@@ -1,4 +1,5 @@
 """ML Models module for AgriSensa API."""
 from app.ml_models.model_loader import ModelLoader
+from app.ml_models.model_registry import ModelRegistry
 
-__all__ = ['ModelLoader']
+__all__ = ['ModelLoader', 'ModelRegistry']
@@ -0,0 +1,235 @@
+"""
+Chunked, parallel batch scoring of plot records.
+
+Streams a CSV in chunks, coerces the feature columns the way MLService
+reads request fields, scores each chunk vectorized in a process pool and
+appends the results to the output CSV in input order. At most
+``2 * workers`` chunks are in flight, so memory stays bounded regardless of
+input size.
+
+Column names may be either the API field names (``n_value``, ``nitrogen``,
+...) or the training dataset names (``N``, ``Nitrogen``, ...), in any case.
+As in MLService, a missing feature column is read as 0. A row whose feature
+value is present but not numeric is not scored, and its ``error`` column
+names the offending fields.
+
+Usage:
+    python -m app.ml_models.batch_score plots.csv scored.csv
+    python -m app.ml_models.batch_score plots.csv scored.csv --models crop success --chunk-size 100000 --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.config.config import Config
+from app.ml_models.model_registry import ModelRegistry
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# task -> (registry model, [(API field, dataset column), ...])
+SCORING_TASKS = {
+    'crop': ('crop_recommendation', [
+        ('n_value', 'N'), ('p_value', 'P'), ('k_value', 'K'), ('temperature', 'temperature'),
+        ('humidity', 'humidity'), ('ph', 'ph'), ('rainfall', 'rainfall')
+    ]),
+    'yield': ('advanced_yield', [
+        ('nitrogen', 'Nitrogen'), ('phosphorus', 'Phosphorus'), ('potassium', 'Potassium'),
+        ('temperature', 'Temperature'), ('rainfall', 'Rainfall'), ('ph', 'pH')
+    ]),
+    'success': ('success_model', [
+        ('nitrogen', 'Nitrogen'), ('phosphorus', 'Phosphorus'), ('potassium', 'Potassium'),
+        ('temperature', 'Temperature'), ('rainfall', 'Rainfall'), ('ph', 'pH')
+    ]),
+}
+
+_worker_models = {}
+
+
+def _init_worker(models_path, model_names):
+    """Process-pool initializer: load (and checksum-verify) each model once per worker."""
+    registry = ModelRegistry(models_path, Config.MODEL_PATHS)
+    for name in model_names:
+        entry = registry.get(name)
+        if entry is None or entry.model is None:
+            raise RuntimeError(f"Model '{name}' is not available")
+        _worker_models[name] = entry.model
+
+
+def resolve_columns(header, tasks):
+    """
+    Map each task's features to input columns.
+
+    Returns:
+        dict: {task: [input column or None, ...]} in model feature order
+    """
+    lookup = {column.strip().lower(): column for column in header}
+    resolved = {}
+    for task in tasks:
+        resolved[task] = [
+            lookup.get(field) or lookup.get(column.lower())
+            for field, column in SCORING_TASKS[task][1]
+        ]
+    return resolved
+
+
+def coerce_features(chunk, columns):
+    """
+    Build a float64 feature matrix for one task.
+
+    Returns:
+        tuple: (matrix, boolean mask of present-but-non-numeric cells)
+    """
+    matrix = np.zeros((len(chunk), len(columns)))
+    invalid = np.zeros((len(chunk), len(columns)), dtype=bool)
+    for i, column in enumerate(columns):
+        if column is None:
+            continue  # MLService: data.get(field, 0)
+        raw = chunk[column]
+        values = pd.to_numeric(raw, errors='coerce')
+        invalid[:, i] = (values.isna() & raw.notna()).to_numpy()
+        matrix[:, i] = values.fillna(0).to_numpy()
+    return matrix, invalid
+
+
+def score_chunk(chunk, resolved):
+    """Score one chunk with every requested task. Runs inside a worker process."""
+    out = pd.DataFrame(index=chunk.index)
+    errors = pd.Series('', index=chunk.index, dtype=object)
+
+    for task, columns in resolved.items():
+        model_name, features = SCORING_TASKS[task]
+        model = _worker_models[model_name]
+        matrix, invalid = coerce_features(chunk, columns)
+        bad = invalid.any(axis=1)
+        if bad.any():
+            names = np.array([c or f for c, (f, _) in zip(columns, features)])
+            for row in np.flatnonzero(bad):
+                errors.iloc[row] += f"{task}: invalid {', '.join(names[invalid[row]])}; "
+        good = ~bad
+
+        if task == 'crop':
+            labels = np.full(len(chunk), None, dtype=object)
+            confidence = np.full(len(chunk), np.nan)
+            if good.any():
+                proba = model.predict_proba(matrix[good])
+                labels[good] = [str(label).capitalize() for label in model.classes_[proba.argmax(axis=1)]]
+                confidence[good] = np.round(proba.max(axis=1) * 100, 2)
+            out['recommended_crop'] = labels
+            out['crop_confidence'] = confidence
+
+        elif task == 'yield':
+            predicted = np.full(len(chunk), np.nan)
+            if good.any():
+                frame = pd.DataFrame(matrix[good], columns=[column for _, column in features])
+                predicted[good] = np.round(np.asarray(model.predict(frame), dtype=np.float64) / 1000, 2)
+            out['predicted_yield_ton_ha'] = predicted
+
+        elif task == 'success':
+            status = np.full(len(chunk), None, dtype=object)
+            probability = np.full(len(chunk), np.nan)
+            if good.any():
+                proba = model.predict_proba(matrix[good])
+                predicted = model.classes_[proba.argmax(axis=1)]
+                status[good] = np.where(predicted == 1, 'Berhasil', 'Berisiko Tinggi')
+                probability[good] = np.round(proba[:, 1] * 100, 2)
+            out['success_status'] = status
+            out['probability_of_success'] = probability
+
+    out['error'] = errors.str.rstrip('; ')
+    return out
+
+
+def _score_job(chunk, resolved, keep_columns):
+    scored = score_chunk(chunk, resolved)
+    if keep_columns:
+        scored = pd.concat([chunk[keep_columns], scored], axis=1)
+    return scored
+
+
+def run(input_path, output_path, tasks=None, chunk_size=50000, workers=None, keep_columns=None,
+        models_path=ML_MODELS_PATH, progress=sys.stderr):
+    """
+    Score ``input_path`` into ``output_path``.
+
+    Args:
+        tasks: Subset of SCORING_TASKS (default: all)
+        keep_columns: Input columns copied to the output (default: all; [] for none)
+
+    Returns:
+        dict: Summary (rows, errors, seconds, rows/sec)
+    """
+    tasks = tasks or list(SCORING_TASKS)
+    workers = workers or os.cpu_count() or 1
+    header = list(pd.read_csv(input_path, nrows=0).columns)
+    resolved = resolve_columns(header, tasks)
+    for task, columns in resolved.items():
+        missing = [field for (field, _), column in zip(SCORING_TASKS[task][1], columns) if column is None]
+        if missing and progress:
+            print(f"[{task}] columns not found, read as 0: {', '.join(missing)}", file=progress)
+    keep_columns = header if keep_columns is None else [c for c in keep_columns if c in header]
+
+    model_names = sorted({SCORING_TASKS[task][0] for task in tasks})
+    ctx = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    rows = errors = 0
+    wrote_header = False
+    tmp_path = output_path + '.partial'
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(models_path, model_names)) as pool, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+        in_flight = deque()
+
+        def drain(limit):
+            nonlocal rows, errors, wrote_header
+            while len(in_flight) > limit:
+                scored = in_flight.popleft().result()
+                scored.to_csv(out, header=not wrote_header, index=False)
+                wrote_header = True
+                rows += len(scored)
+                errors += int((scored['error'] != '').sum())
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"scored {rows:,} rows ({rows / elapsed:,.0f} rows/s, {errors:,} invalid)", file=progress)
+
+        for chunk in pd.read_csv(input_path, chunksize=chunk_size, dtype=str, keep_default_na=True):
+            in_flight.append(pool.submit(_score_job, chunk, resolved, keep_columns))
+            drain(workers * 2)
+        drain(0)
+
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'invalid_rows': errors,
+        'seconds': round(elapsed, 2),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed else None,
+        'output': output_path
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch-score plot records with the crop, yield and success models.')
+    parser.add_argument('input', help='Input CSV')
+    parser.add_argument('output', help='Output CSV (written incrementally, renamed into place when done)')
+    parser.add_argument('--models', nargs='*', choices=list(SCORING_TASKS), help='Tasks to run (default: all)')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--keep-columns', nargs='*', help='Input columns to copy to the output (default: all)')
+    parser.add_argument('--models-path', default=ML_MODELS_PATH)
+    args = parser.parse_args(argv)
+
+    summary = run(args.input, args.output, args.models, args.chunk_size, args.workers, args.keep_columns,
+                  args.models_path)
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Inference benchmark for the bundled ML models.
+
+Measures, for every model in MODEL_PATHS: cold load time, warm single-row
+latency percentiles, batch throughput and resident memory. Each model is
+benchmarked in its own spawned interpreter so load time and RSS are not
+polluted by models loaded earlier.
+
+Usage:
+    python -m app.ml_models.benchmark --output bench.json
+    python -m app.ml_models.benchmark --models crop_recommendation bwd --baseline bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.config.config import Config
+from app.ml_models.model_registry import ModelRegistry
+from app.utils.columnar_store import load_frame
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+YIELD_FEATURES = ['Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Rainfall', 'pH']
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+DEFAULT_BATCH_SIZES = [1, 16, 128, 1024]
+
+# How MLService/AnalysisService feed each model: (dataset, columns, pass as DataFrame)
+FEATURE_SOURCES = {
+    'crop_recommendation': ('Crop_recommendation.csv', CROP_FEATURES, False),
+    'yield_prediction': ('EDA_500.csv', YIELD_FEATURES, False),
+    'advanced_yield': ('EDA_500.csv', YIELD_FEATURES, True),
+    'shap_explainer': ('EDA_500.csv', YIELD_FEATURES, True),
+    'success_model': ('EDA_500.csv', YIELD_FEATURES, False),
+}
+
+PREDICT_METHODS = {
+    'shap_explainer': 'shap_values',
+}
+
+
+def _rss_bytes():
+    """Current resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _jitter(frame, rng, scale=0.05):
+    """Perturb sampled rows by a fraction of each column's std."""
+    noise = rng.normal(0, 1, frame.shape) * frame.std(ddof=0).values * scale
+    return frame + noise
+
+
+def build_inputs(model_name, n_rows, seed=42):
+    """
+    Draw synthetic model inputs from the bundled datasets.
+
+    Returns:
+        DataFrame or ndarray shaped like the live service input.
+    """
+    rng = np.random.default_rng(seed)
+
+    if model_name == 'bwd':
+        hues = pd.read_csv(os.path.join(ML_MODELS_PATH, 'bwd_dataset.csv'))['avg_hue_value']
+        sample = rng.choice(hues.values, n_rows) + rng.normal(0, 2, n_rows)
+        return sample.reshape(-1, 1)
+
+    if model_name == 'recommendation':
+        crops = load_frame(os.path.join(ML_MODELS_PATH, 'Crop_recommendation.csv'), ['ph', 'humidity'])
+        rows = crops.sample(n_rows, replace=True, random_state=seed).values
+        return np.column_stack([
+            rows[:, 0],                       # ph_tanah
+            rng.integers(2, 6, n_rows),       # skor_bwd
+            rows[:, 1],                       # kelembaban_tanah
+            rng.integers(7, 100, n_rows)      # umur_tanaman_hari
+        ]).astype(float)
+
+    dataset, columns, as_frame = FEATURE_SOURCES[model_name]
+    frame = load_frame(os.path.join(ML_MODELS_PATH, dataset), columns).dropna()
+    sample = _jitter(frame.sample(n_rows, replace=True, random_state=seed).reset_index(drop=True), rng)
+    return sample if as_frame else sample.values
+
+
+def _take(inputs, n):
+    return inputs.iloc[:n] if isinstance(inputs, pd.DataFrame) else inputs[:n]
+
+
+def _bench_model(model_name, full_path, batch_sizes, latency_iterations, min_batch_seconds, seed):
+    """Benchmark one model. Runs inside a fresh spawned process."""
+    import joblib
+
+    result = {'model': model_name, 'path': full_path}
+    rss_before = _rss_bytes()
+
+    start = time.perf_counter()
+    model = joblib.load(full_path)
+    result['cold_load_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    result['rss_model_mb'] = round((_rss_bytes() - rss_before) / 1024 / 1024, 2)
+    result['file_size_mb'] = round(os.path.getsize(full_path) / 1024 / 1024, 3)
+
+    predict = getattr(model, PREDICT_METHODS.get(model_name, 'predict'))
+    inputs = build_inputs(model_name, max(max(batch_sizes), latency_iterations), seed)
+
+    # Warm single-row latency
+    for i in range(min(20, latency_iterations)):
+        predict(_take(inputs, 1))
+    samples = np.empty(latency_iterations)
+    for i in range(latency_iterations):
+        row = inputs.iloc[i:i + 1] if isinstance(inputs, pd.DataFrame) else inputs[i:i + 1]
+        start = time.perf_counter()
+        predict(row)
+        samples[i] = time.perf_counter() - start
+    samples_ms = samples * 1000
+    result['latency_ms'] = {
+        'p50': round(float(np.percentile(samples_ms, 50)), 4),
+        'p95': round(float(np.percentile(samples_ms, 95)), 4),
+        'p99': round(float(np.percentile(samples_ms, 99)), 4),
+        'mean': round(float(samples_ms.mean()), 4),
+        'iterations': latency_iterations
+    }
+
+    # Batch throughput
+    throughput = {}
+    for size in batch_sizes:
+        batch = _take(inputs, size)
+        predict(batch)
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            predict(batch)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_batch_seconds and calls >= 3:
+                break
+        throughput[str(size)] = {
+            'rows_per_sec': round(calls * size / elapsed, 1),
+            'ms_per_batch': round(elapsed / calls * 1000, 4)
+        }
+    result['throughput'] = throughput
+    result['rss_total_mb'] = round(_rss_bytes() / 1024 / 1024, 2)
+    return result
+
+
+def _bench_worker(args):
+    try:
+        return _bench_model(*args)
+    except Exception as e:
+        return {'model': args[0], 'path': args[1], 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_benchmarks(models=None, batch_sizes=None, latency_iterations=500, min_batch_seconds=0.5, seed=42):
+    """
+    Benchmark the requested models (default: everything in MODEL_PATHS).
+
+    Returns:
+        dict: Machine-readable report.
+    """
+    registry = ModelRegistry(ML_MODELS_PATH, Config.MODEL_PATHS)
+    specs = registry.read_manifest()
+    batch_sizes = batch_sizes or DEFAULT_BATCH_SIZES
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'settings': {
+            'batch_sizes': batch_sizes,
+            'latency_iterations': latency_iterations,
+            'min_batch_seconds': min_batch_seconds,
+            'seed': seed
+        },
+        'models': {}
+    }
+
+    ctx = multiprocessing.get_context('spawn')
+    for name in models or list(Config.MODEL_PATHS):
+        spec = specs.get(name)
+        if spec is None:
+            report['models'][name] = {'model': name, 'error': 'not registered'}
+            continue
+        full_path = os.path.join(ML_MODELS_PATH, spec['path'])
+        if not os.path.exists(full_path):
+            report['models'][name] = {'model': name, 'path': full_path, 'skipped': 'file not found'}
+            continue
+
+        with ctx.Pool(1) as pool:
+            result = pool.apply(_bench_worker, ((name, full_path, batch_sizes, latency_iterations, min_batch_seconds, seed),))
+        result['version'] = spec['version']
+        report['models'][name] = result
+
+    return report
+
+
+def compare_reports(current, baseline, tolerance=0.2):
+    """
+    Compare a report against a baseline.
+
+    Returns:
+        list: Human-readable regressions where p50 latency grew or largest-batch
+        throughput dropped by more than ``tolerance``.
+    """
+    regressions = []
+    for name, cur in current['models'].items():
+        base = baseline.get('models', {}).get(name)
+        if not base or 'latency_ms' not in cur or 'latency_ms' not in base:
+            continue
+
+        cur_p50, base_p50 = cur['latency_ms']['p50'], base['latency_ms']['p50']
+        if base_p50 and cur_p50 > base_p50 * (1 + tolerance):
+            regressions.append(f"{name}: p50 {base_p50}ms -> {cur_p50}ms")
+
+        shared = set(cur['throughput']) & set(base['throughput'])
+        if shared:
+            size = max(shared, key=int)
+            cur_tp, base_tp = cur['throughput'][size]['rows_per_sec'], base['throughput'][size]['rows_per_sec']
+            if base_tp and cur_tp < base_tp * (1 - tolerance):
+                regressions.append(f"{name}: batch {size} throughput {base_tp} -> {cur_tp} rows/s")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark bundled ML model inference.')
+    parser.add_argument('--models', nargs='*', help='Model names (default: all in MODEL_PATHS)')
+    parser.add_argument('--batch-sizes', nargs='*', type=int, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--iterations', type=int, default=500, help='Single-row latency samples')
+    parser.add_argument('--min-batch-seconds', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Previous JSON report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.models, args.batch_sizes, args.iterations, args.min_batch_seconds, args.seed)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fh:
+            report['regressions'] = compare_reports(report, json.load(fh), args.tolerance)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+
+    for line in report.get('regressions', []):
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Float32 compaction of the bundled tree-ensemble models.
+
+sklearn forests pickle one estimator object per tree with float64
+thresholds and values, plus training-only state (impurity, sample counts,
+estimator params, OOB data). ``CompactForest`` keeps only what inference
+needs, concatenated across all trees:
+- int32 child and feature indices
+- float32 thresholds
+- float32 leaf values, normalized per tree for classifiers
+
+It predicts with a vectorized walk over all trees at once. sklearn already
+casts inputs to float32 before walking a tree, and thresholds are rounded
+down to float32, so every split makes the same decision. Parity is still
+verified on real inputs before anything is installed.
+
+Usage:
+    python -m app.ml_models.compact                     # report only
+    python -m app.ml_models.compact --install           # point the manifest at the compact artifacts
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import tracemalloc
+
+import joblib
+import numpy as np
+
+from app.config.config import Config
+from app.ml_models.model_registry import MANIFEST_FILENAME, file_checksum
+
+logger = logging.getLogger(__name__)
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+COMPACT_SUFFIX = '.compact.pkl'
+COMPACT_VERSION_TAG = '+f32'
+
+# Models that are sklearn forests. advanced_yield is LightGBM and keeps its own format.
+FOREST_MODELS = ('crop_recommendation', 'recommendation')
+
+
+class CompactForest:
+    """Inference-only, float32 replacement for a fitted sklearn forest."""
+
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        self.is_classifier = hasattr(forest, 'classes_')
+        self.n_features_in_ = int(forest.n_features_in_)
+        if hasattr(forest, 'feature_names_in_'):
+            self.feature_names_in_ = np.asarray(forest.feature_names_in_)
+        self.n_outputs_ = int(forest.n_outputs_)
+        if self.is_classifier:
+            self.classes_ = np.asarray(forest.classes_)
+        self.feature_importances_ = np.asarray(forest.feature_importances_, dtype=np.float32)
+
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+        self.roots = offsets[:-1].astype(np.int32)
+        self.max_depth = int(max(t.max_depth for t in trees))
+
+        left, right, feature, threshold, value = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            tree_value = tree.value[:, 0, :] if self.is_classifier else tree.value[:, :, 0]
+            if self.is_classifier:
+                # Older sklearn stores class counts, newer stores fractions; normalize both.
+                totals = tree_value.sum(axis=1, keepdims=True)
+                tree_value = tree_value / np.where(totals > 0, totals, 1)
+            value.append(tree_value)
+
+        self.children_left = np.concatenate(left).astype(np.int32)
+        self.children_right = np.concatenate(right).astype(np.int32)
+        self.feature = np.concatenate(feature).astype(np.int32)
+        # Round thresholds down to the nearest float32 so that, for float32
+        # inputs, ``x <= t32`` is exactly ``x <= t64``.
+        threshold = np.concatenate(threshold)
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32.astype(np.float64) > threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        self.threshold = threshold32
+        self.value = np.concatenate(value).astype(np.float32)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _leaves(self, X):
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            active = left != -1
+            if not active.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(active, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return nodes
+
+    def _mean_value(self, X):
+        return self.value[self._leaves(X)].mean(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_value(X)
+
+    def predict(self, X):
+        mean = self._mean_value(X)
+        if self.is_classifier:
+            return self.classes_[np.argmax(mean, axis=1)]
+        return mean[:, 0] if self.n_outputs_ == 1 else mean
+
+
+def compact_model(model):
+    """Return a CompactForest for sklearn forests, or None if the model is not one."""
+    if hasattr(model, 'estimators_') and all(hasattr(e, 'tree_') for e in getattr(model, 'estimators_', [])):
+        return CompactForest(model)
+    return None
+
+
+def _loaded_bytes(path):
+    """Python-heap bytes allocated by ``joblib.load(path)`` (numpy buffers included)."""
+    tracemalloc.start()
+    try:
+        model = joblib.load(path)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return model, current
+
+
+def check_parity(original, compact, X, atol=1e-5):
+    """
+    Compare predictions of the original and compacted model.
+
+    Returns:
+        dict: label agreement (classifiers) and max absolute difference
+    """
+    if hasattr(original, 'classes_'):
+        labels_equal = float((np.asarray(original.predict(X)) == compact.predict(X)).mean())
+        max_diff = float(np.abs(original.predict_proba(X) - compact.predict_proba(X)).max())
+        return {'label_agreement': labels_equal, 'max_proba_diff': max_diff,
+                'ok': labels_equal == 1.0 and max_diff <= atol}
+    expected = np.asarray(original.predict(X), dtype=np.float64)
+    actual = np.asarray(compact.predict(X), dtype=np.float64)
+    max_diff = float(np.abs(expected - actual).max())
+    scale = float(np.abs(expected).max()) or 1.0
+    return {'max_abs_diff': max_diff, 'ok': max_diff <= atol * scale}
+
+
+def compact_artifact(name, models_path=ML_MODELS_PATH, n_rows=2000, seed=42):
+    """
+    Compact one model artifact and report the savings.
+
+    Returns:
+        dict: Report with sizes, parity and the compact artifact path
+    """
+    from app.ml_models.benchmark import build_inputs
+
+    path = os.path.join(models_path, Config.MODEL_PATHS[name])
+    report = {'model': name, 'path': path}
+    if not os.path.exists(path):
+        report['skipped'] = 'file not found'
+        return report
+
+    original, original_memory = _loaded_bytes(path)
+    compact = compact_model(original)
+    if compact is None:
+        report['skipped'] = f"{type(original).__name__} is not a tree forest"
+        return report
+
+    compact_path = os.path.splitext(path)[0] + COMPACT_SUFFIX
+    fd, tmp_path = tempfile.mkstemp(prefix='.compact-', dir=models_path)
+    os.close(fd)
+    joblib.dump(compact, tmp_path)
+    os.replace(tmp_path, compact_path)
+    _, compact_memory = _loaded_bytes(compact_path)
+
+    parity = check_parity(original, compact, build_inputs(name, n_rows, seed))
+    original_disk, compact_disk = os.path.getsize(path), os.path.getsize(compact_path)
+    report.update({
+        'compact_path': compact_path,
+        'trees': compact.n_estimators,
+        'nodes': int(len(compact.threshold)),
+        'disk_bytes': original_disk,
+        'compact_disk_bytes': compact_disk,
+        'disk_saving_pct': round((1 - compact_disk / original_disk) * 100, 1),
+        'memory_bytes': int(original_memory),
+        'compact_memory_bytes': int(compact_memory),
+        'memory_saving_pct': round((1 - compact_memory / original_memory) * 100, 1) if original_memory else None,
+        'parity': parity,
+    })
+    return report
+
+
+def install(reports, models_path=ML_MODELS_PATH):
+    """
+    Point manifest entries at compact artifacts that passed the parity check.
+
+    The original pickles are left in place, so reverting the manifest entry
+    rolls back. A running registry picks the change up on its next refresh.
+
+    Returns:
+        list: Names of models that were switched
+    """
+    manifest_path = os.path.join(models_path, MANIFEST_FILENAME)
+    with open(manifest_path, 'r', encoding='utf-8') as fh:
+        manifest = json.load(fh)
+
+    installed = []
+    for report in reports:
+        if not report.get('parity', {}).get('ok'):
+            continue
+        spec = manifest['models'].setdefault(report['model'], {'version': '0', 'features': None})
+        version = str(spec.get('version', '0'))
+        spec['version'] = version if version.endswith(COMPACT_VERSION_TAG) else version + COMPACT_VERSION_TAG
+        spec['path'] = os.path.basename(report['compact_path'])
+        spec['sha256'] = file_checksum(report['compact_path'])
+        installed.append(report['model'])
+
+    if installed:
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(tmp_path, manifest_path)
+    return installed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compact forest models to float32 and report savings.')
+    parser.add_argument('--models', nargs='*', default=list(FOREST_MODELS))
+    parser.add_argument('--models-path', default=ML_MODELS_PATH)
+    parser.add_argument('--rows', type=int, default=2000, help='Rows used for the parity check')
+    parser.add_argument('--install', action='store_true', help='Switch the manifest to compact artifacts that pass parity')
+    args = parser.parse_args(argv)
+
+    reports = [compact_artifact(name, args.models_path, args.rows) for name in args.models]
+    result = {'models': reports}
+    if args.install:
+        result['installed'] = install(reports, args.models_path)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
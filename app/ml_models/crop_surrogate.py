@@ -0,0 +1,279 @@
+"""
+Lookup-table surrogate for the crop recommendation classifier.
+
+The classifier's seven inputs (N, P, K, temperature, humidity, ph, rainfall)
+are bounded, so ``predict_proba`` can be evaluated once on a quantized grid
+and stored. Each feature is cut into quantile bins of Crop_recommendation.csv.
+The model is evaluated at every cell centre, and the probabilities are kept
+as uint8 in a compressed ``.npz``. Serving is then a bisect per feature plus
+one array read (nearest cell), or a multilinear blend of the 2^7
+surrounding cells (interpolated). Neither needs sklearn or the pickled
+forest.
+
+The build measures top-1 agreement with the full model on every row of
+Crop_recommendation.csv. MLService only uses the table when it is enabled,
+when it was built from the model currently in the manifest, and when its
+agreement meets CROP_SURROGATE_MIN_AGREEMENT.
+
+Usage:
+    python -m app.ml_models.crop_surrogate --bins 6
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import product
+
+import numpy as np
+
+from app.ml_models.model_registry import MANIFEST_FILENAME, file_checksum
+
+logger = logging.getLogger(__name__)
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+SURROGATE_FILENAME = 'crop_recommendation_surrogate.npz'
+CROP_FEATURES = ('N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall')
+
+_surrogates = {}
+_surrogates_lock = threading.Lock()
+
+
+class CropSurrogate:
+    """Quantized ``predict_proba`` table with nearest-cell and interpolated lookup."""
+
+    def __init__(self, arrays):
+        self.classes = [str(c) for c in arrays['classes']]
+        self.edges = [np.asarray(e, dtype=np.float64) for e in arrays['edges']]
+        self.centers = [np.asarray(c, dtype=np.float64) for c in arrays['centers']]
+        self.table = np.asarray(arrays['table'])
+        self.meta = {
+            key: arrays[key].item()
+            for key in ('model_sha256', 'model_version', 'built_at', 'agreement_nearest',
+                        'agreement_interpolated', 'rows_checked')
+            if key in arrays
+        }
+        # Plain lists keep the nearest-cell path in pure Python (bisect), which
+        # beats numpy call overhead for a single row.
+        self._inner_edges = [e[1:-1].tolist() for e in self.edges]
+        self._n_dims = len(self.edges)
+        self._corners = np.array(list(product((0, 1), repeat=self._n_dims)), dtype=np.intp)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+        arrays['edges'] = [arrays.pop(f'edges_{i}') for i in range(len(CROP_FEATURES))]
+        arrays['centers'] = [arrays.pop(f'centers_{i}') for i in range(len(CROP_FEATURES))]
+        return cls(arrays)
+
+    def cell(self, features):
+        """Grid cell index of one feature row."""
+        return tuple(bisect.bisect_right(inner, value) for inner, value in zip(self._inner_edges, features))
+
+    def proba_nearest(self, features):
+        """Class probabilities (float, 0-1) from the cell containing ``features``."""
+        return self.table[self.cell(features)] / 255.0
+
+    def proba_interpolated(self, features):
+        """Class probabilities blended from the 2^7 cell centres around ``features``."""
+        lower = np.empty(self._n_dims, dtype=np.intp)
+        frac = np.empty(self._n_dims)
+        for d, (centers, value) in enumerate(zip(self.centers, features)):
+            position = float(np.interp(value, centers, np.arange(len(centers))))
+            lower[d] = min(int(position), len(centers) - 2)
+            frac[d] = position - lower[d]
+
+        index = lower + self._corners
+        weights = np.prod(np.where(self._corners == 1, frac, 1 - frac), axis=1)
+        return weights @ self.table[tuple(index.T)].astype(np.float64) / 255.0
+
+    def predict(self, features, interpolate=False):
+        """
+        Recommend a crop.
+
+        Returns:
+            tuple: (label, probability 0-1)
+        """
+        probs = self.proba_interpolated(features) if interpolate else self.proba_nearest(features)
+        best = int(np.argmax(probs))
+        return self.classes[best], float(probs[best])
+
+
+def build_surrogate(model, X, bins=6, chunk_size=50000):
+    """
+    Evaluate ``model.predict_proba`` over a quantile grid of ``X``.
+
+    Args:
+        model: Fitted classifier with predict_proba and classes_
+        X: ndarray (n_rows, 7) of real inputs in CROP_FEATURES order
+        bins: Quantile bins per feature
+
+    Returns:
+        dict: Arrays for ``CropSurrogate`` / ``np.savez_compressed``
+    """
+    X = np.asarray(X, dtype=np.float64)
+    edges, centers = [], []
+    for d in range(X.shape[1]):
+        e = np.unique(np.quantile(X[:, d], np.linspace(0, 1, bins + 1)))
+        if len(e) < 3:
+            # Interpolation needs at least two cell centres per feature.
+            e = np.linspace(X[:, d].min(), X[:, d].max() + 1e-9, 3)
+        edges.append(e)
+        centers.append((e[:-1] + e[1:]) / 2)
+
+    shape = tuple(len(c) for c in centers)
+    mesh = np.stack(np.meshgrid(*centers, indexing='ij'), axis=-1).reshape(-1, len(centers))
+    probs = np.empty((len(mesh), len(model.classes_)), dtype=np.uint8)
+    for start in range(0, len(mesh), chunk_size):
+        chunk = model.predict_proba(mesh[start:start + chunk_size])
+        probs[start:start + chunk_size] = np.rint(chunk * 255).astype(np.uint8)
+
+    return {
+        'classes': np.array([str(c) for c in model.classes_]),
+        'edges': edges,
+        'centers': centers,
+        'table': probs.reshape(shape + (len(model.classes_),)),
+    }
+
+
+def measure_agreement(surrogate, model, X):
+    """Top-1 agreement (0-1) of nearest and interpolated lookups with ``model.predict`` on X."""
+    reference = np.asarray(model.predict(X)).astype(str)
+    nearest = np.array([surrogate.predict(row)[0] for row in X.tolist()])
+    interpolated = np.array([surrogate.predict(row, interpolate=True)[0] for row in X.tolist()])
+    return float((nearest == reference).mean()), float((interpolated == reference).mean())
+
+
+def build_for_model(models_path=ML_MODELS_PATH, model_file='crop_recommendation_model.pkl', dataset=None,
+                    output=None, bins=6, model_version=None):
+    """
+    Build, validate and save the surrogate for the model in ``models_path``.
+
+    Returns:
+        dict: Summary (size, build time, agreement, lookup latency)
+    """
+    import joblib
+    from app.utils.columnar_store import load_frame
+
+    model_path = os.path.join(models_path, model_file)
+    dataset = dataset or os.path.join(ML_MODELS_PATH, 'Crop_recommendation.csv')
+    output = output or os.path.join(models_path, SURROGATE_FILENAME)
+
+    if model_version is None:
+        manifest_path = os.path.join(models_path, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as fh:
+                model_version = json.load(fh).get('models', {}).get('crop_recommendation', {}).get('version')
+
+    X = load_frame(dataset, list(CROP_FEATURES)).to_numpy(dtype=np.float64)
+    model = joblib.load(model_path)
+
+    start = time.perf_counter()
+    arrays = build_surrogate(model, X, bins=bins)
+    build_seconds = time.perf_counter() - start
+
+    surrogate = CropSurrogate(arrays)
+    agreement_nearest, agreement_interpolated = measure_agreement(surrogate, model, X)
+
+    rows = X[:200].tolist()
+    start = time.perf_counter()
+    for row in rows:
+        surrogate.predict(row)
+    nearest_us = (time.perf_counter() - start) / len(rows) * 1e6
+    start = time.perf_counter()
+    for row in rows:
+        surrogate.predict(row, interpolate=True)
+    interpolated_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+    payload = {
+        'classes': arrays['classes'],
+        'table': arrays['table'],
+        'model_sha256': np.array(file_checksum(model_path)),
+        'model_version': np.array(str(model_version)),
+        'built_at': np.array(datetime.utcnow().isoformat()),
+        'agreement_nearest': np.float64(agreement_nearest),
+        'agreement_interpolated': np.float64(agreement_interpolated),
+        'rows_checked': np.int64(len(X)),
+    }
+    for i, (e, c) in enumerate(zip(arrays['edges'], arrays['centers'])):
+        payload[f'edges_{i}'] = e
+        payload[f'centers_{i}'] = c
+
+    tmp_path = output + '.tmp.npz'
+    np.savez_compressed(tmp_path, **payload)
+    os.replace(tmp_path, output)
+
+    summary = {
+        'path': output,
+        'bins': bins,
+        'cells': int(np.prod(arrays['table'].shape[:-1])),
+        'table_bytes': int(arrays['table'].nbytes),
+        'size_bytes': os.path.getsize(output),
+        'build_seconds': round(build_seconds, 2),
+        'agreement_nearest': round(agreement_nearest, 4),
+        'agreement_interpolated': round(agreement_interpolated, 4),
+        'lookup_nearest_us': round(nearest_us, 2),
+        'lookup_interpolated_us': round(interpolated_us, 2),
+    }
+    logger.info(f"Crop surrogate written: {summary}")
+    return summary
+
+
+def get_crop_surrogate(models_path, min_agreement=0.0, interpolate=False):
+    """
+    Get the surrogate in ``models_path`` if it is usable, else None.
+
+    Usable means: the file exists, it was built from the crop model checksum
+    currently in the manifest, and its agreement (for the chosen lookup mode)
+    is at least ``min_agreement``. The verdict is cached until either file's
+    mtime changes, so the hot path only pays two ``os.stat`` calls.
+    """
+    path = os.path.join(models_path, SURROGATE_FILENAME)
+    manifest_path = os.path.join(models_path, MANIFEST_FILENAME)
+    try:
+        key = (os.stat(path).st_mtime_ns, os.stat(manifest_path).st_mtime_ns, min_agreement, interpolate)
+    except OSError:
+        return None
+
+    cached = _surrogates.get(models_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _surrogates_lock:
+        cached = _surrogates.get(models_path)
+        if cached is None or cached[0] != key:
+            surrogate = None
+            try:
+                candidate = CropSurrogate.load(path)
+                with open(manifest_path, 'r', encoding='utf-8') as fh:
+                    expected = json.load(fh).get('models', {}).get('crop_recommendation', {}).get('sha256')
+                agreement = candidate.meta.get('agreement_interpolated' if interpolate else 'agreement_nearest', 0.0)
+                if expected and candidate.meta.get('model_sha256') != expected:
+                    logger.warning("Crop surrogate was built from a different model; ignoring it")
+                elif agreement < min_agreement:
+                    logger.warning(f"Crop surrogate agreement {agreement:.3f} below {min_agreement}; ignoring it")
+                else:
+                    surrogate = candidate
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load crop surrogate: {e}")
+            cached = (key, surrogate)
+            _surrogates[models_path] = cached
+        return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the lookup-table surrogate for crop_recommendation.')
+    parser.add_argument('--models-path', default=ML_MODELS_PATH)
+    parser.add_argument('--bins', type=int, default=6, help='Quantile bins per feature')
+    parser.add_argument('--output', help=f'Output .npz (default: <models-path>/{SURROGATE_FILENAME})')
+    args = parser.parse_args(argv)
+
+    print(json.dumps(build_for_model(args.models_path, output=args.output, bins=args.bins), indent=2))
+
+
+if __name__ == '__main__':
+    main()
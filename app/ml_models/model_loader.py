@@ -1,82 +1,163 @@
 """ML Model loader with lazy loading and caching."""
 import os
-import joblib
 import threading
 from flask import current_app
+from app.ml_models.model_registry import ModelRegistry, MANIFEST_FILENAME
+from app.ml_models.shadow import ShadowEvaluator
 
 
 class ModelLoader:
     """Singleton class for loading and caching ML models."""
-    
+
     _instance = None
     _lock = threading.Lock()
-    _model_cache = {}
-    
+    _registry = None
+    _shadow = None
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
         return cls._instance
-    
+
+    @classmethod
+    def get_registry(cls):
+        """
+        Get the model registry, creating it on first use.
+
+        The registry starts a background poller (MODEL_REGISTRY_POLL_INTERVAL
+        seconds, 0 disables it) that hot-swaps models when the manifest or
+        artifacts change.
+        """
+        if cls._registry is not None:
+            return cls._registry
+
+        with cls._lock:
+            if cls._registry is None:
+                try:
+                    model_paths = current_app.config['MODEL_PATHS']
+                    ml_models_path = current_app.config['ML_MODELS_PATH']
+                    manifest_file = current_app.config.get('MODEL_MANIFEST', MANIFEST_FILENAME)
+                    poll_interval = current_app.config.get('MODEL_REGISTRY_POLL_INTERVAL', 30)
+                except RuntimeError:
+                    # Fallback if not in app context
+                    model_paths = {
+                        'bwd': 'bwd_model.pkl',
+                        'recommendation': 'recommendation_model.pkl',
+                        'crop_recommendation': 'crop_recommendation_model.pkl',
+                        'yield_prediction': 'yield_prediction_model.pkl',
+                        'advanced_yield': 'advanced_yield_model.pkl',
+                        'shap_explainer': 'shap_explainer.pkl',
+                        'success_model': 'success_model.pkl'
+                    }
+                    ml_models_path = os.path.dirname(os.path.abspath(__file__))
+                    manifest_file = MANIFEST_FILENAME
+                    poll_interval = 0
+
+                registry = ModelRegistry(ml_models_path, model_paths, manifest_file)
+                registry.start_polling(poll_interval)
+                cls._registry = registry
+
+        return cls._registry
+
     @classmethod
     def get_model(cls, model_name):
         """
         Get ML model with lazy loading and caching.
-        
+
         Args:
             model_name: Name of the model to load
-            
+
         Returns:
             Loaded model or None if not found
         """
+        entry = cls.get_registry().get(model_name)
+        return entry.model if entry is not None else None
+
+    @classmethod
+    def get_model_with_version(cls, model_name):
+        """
+        Get a model together with the version it was loaded from.
+
+        Both values come from the same registry snapshot, so a hot swap
+        between the two reads cannot mislabel a prediction.
+
+        Returns:
+            tuple: (model or None, version or None)
+        """
+        entry = cls.get_registry().get(model_name)
+        if entry is None:
+            return None, None
+        return entry.model, entry.version if entry.model is not None else None
+
+    @classmethod
+    def get_model_version(cls, model_name):
+        """Get the active version of a model, or None if it is not available."""
+        return cls.get_model_with_version(model_name)[1]
+
+    @classmethod
+    def refresh(cls):
+        """Check the manifest now and swap in any changed models."""
+        return cls.get_registry().refresh()
+
+    @classmethod
+    def get_status(cls):
+        """Get registry status for all loaded models."""
+        return cls.get_registry().status()
+
+    @classmethod
+    def get_shadow(cls):
+        """
+        Get the shadow evaluator, creating it on first use.
+
+        Candidates listed in SHADOW_MODELS start shadowing immediately; more
+        can be added at runtime through the admin API.
+        """
+        if cls._shadow is not None:
+            return cls._shadow
+
         with cls._lock:
-            # Return cached model if available
-            if model_name in cls._model_cache:
-                return cls._model_cache[model_name]
-            
-            # Get model path from config
-            try:
-                model_paths = current_app.config['MODEL_PATHS']
-                ml_models_path = current_app.config['ML_MODELS_PATH']
-            except:
-                # Fallback if not in app context
-                model_paths = {
-                    'bwd': 'bwd_model.pkl',
-                    'recommendation': 'recommendation_model.pkl',
-                    'crop_recommendation': 'crop_recommendation_model.pkl',
-                    'yield_prediction': 'yield_prediction_model.pkl',
-                    'advanced_yield': 'advanced_yield_model.pkl',
-                    'shap_explainer': 'shap_explainer.pkl'
-                }
-                ml_models_path = '.'
-            
-            if model_name not in model_paths:
-                current_app.logger.warning(f"Model '{model_name}' not found in MODEL_PATHS")
-                cls._model_cache[model_name] = None
-                return None
-            
-            # Construct full path
-            model_file = model_paths[model_name]
-            full_path = os.path.join(ml_models_path, model_file)
-            
-            # Load model
-            if os.path.exists(full_path):
+            if cls._shadow is None:
                 try:
-                    cls._model_cache[model_name] = joblib.load(full_path)
-                    current_app.logger.info(f"Model '{model_name}' loaded successfully")
-                except Exception as e:
-                    current_app.logger.error(f"Failed to load model '{model_name}': {e}")
-                    cls._model_cache[model_name] = None
-            else:
-                current_app.logger.warning(f"Model file not found: {full_path}")
-                cls._model_cache[model_name] = None
-            
-            return cls._model_cache[model_name]
-    
+                    config = current_app.config
+                    evaluator = ShadowEvaluator(
+                        config['ML_MODELS_PATH'],
+                        sample_rate=config.get('SHADOW_SAMPLE_RATE', 0.1),
+                        max_queue=config.get('SHADOW_QUEUE_SIZE', 1000)
+                    )
+                    candidates = config.get('SHADOW_MODELS', {})
+                except RuntimeError:
+                    # Fallback if not in app context: shadowing stays off
+                    evaluator = ShadowEvaluator(os.path.dirname(os.path.abspath(__file__)), sample_rate=0.0)
+                    candidates = {}
+
+                for name, path in candidates.items():
+                    try:
+                        evaluator.set_candidate(name, path)
+                    except FileNotFoundError as e:
+                        current_app.logger.error(f"Shadow candidate for '{name}' not started: {e}")
+                cls._shadow = evaluator
+
+        return cls._shadow
+
+    @classmethod
+    def shadow(cls, model_name, inputs, primary_output, primary_ms):
+        """
+        Offer one primary prediction to the shadow evaluator (non-blocking).
+
+        Args:
+            model_name: Registry name of the primary model
+            inputs: The exact inputs passed to the primary's predict()
+            primary_output: What the primary's predict() returned
+            primary_ms: Primary predict() latency in milliseconds
+        """
+        shadow = cls.get_shadow()
+        if shadow.is_active(model_name):
+            shadow.submit(model_name, inputs, primary_output, primary_ms)
+
     @classmethod
     def clear_cache(cls):
         """Clear all cached models."""
-        with cls._lock:
-            cls._model_cache.clear()
-            current_app.logger.info("Model cache cleared")
+        cls.get_registry().clear()
+        current_app.logger.info("Model cache cleared")
@@ -0,0 +1,311 @@
+"""Versioned model registry with background hot swap."""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'model_manifest.json'
+UNVERSIONED = 'unversioned'
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelEntry:
+    """Immutable snapshot of one loaded model version."""
+
+    __slots__ = ('name', 'version', 'checksum', 'features', 'path', 'model', 'signature', 'loaded_at')
+
+    def __init__(self, name, version, checksum, features, path, model, signature):
+        self.name = name
+        self.version = version
+        self.checksum = checksum
+        self.features = features
+        self.path = path
+        self.model = model
+        self.signature = signature
+        self.loaded_at = datetime.utcnow()
+
+    def to_dict(self):
+        """Convert entry metadata to dictionary (without the model object)."""
+        return {
+            'name': self.name,
+            'version': self.version,
+            'checksum': self.checksum,
+            'features': self.features,
+            'path': self.path,
+            'available': self.model is not None,
+            'loaded_at': self.loaded_at.isoformat()
+        }
+
+
+class ModelRegistry:
+    """
+    Registry of versioned models described by a manifest file.
+
+    The manifest (``model_manifest.json`` in the models directory) maps each
+    model name to its version, SHA-256 checksum, feature schema and load path.
+    Models not listed there fall back to ``MODEL_PATHS`` and are reported as
+    ``unversioned``.
+
+    Loaded models are kept in a copy-on-write dict of :class:`ModelEntry`
+    snapshots. A refresh loads the new artifact outside the lock and then
+    swaps the dict reference, so requests that already hold the old entry
+    finish on it while new requests see the new version.
+    """
+
+    def __init__(self, models_path, model_paths=None, manifest_file=MANIFEST_FILENAME):
+        self.models_path = models_path
+        self.model_paths = dict(model_paths or {})
+        self.manifest_path = os.path.join(models_path, manifest_file)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stop_event = threading.Event()
+        self._poller = None
+        self._manifest_cache = (None, None)  # (file signature, specs)
+        self.last_refresh = None
+
+    # ---------- Manifest ----------
+    def read_manifest(self):
+        """
+        Read model specs from the manifest, falling back to MODEL_PATHS.
+
+        Returns:
+            dict: {name: {"version", "path", "sha256", "features"}}
+        """
+        specs = {
+            name: {'version': UNVERSIONED, 'path': filename, 'sha256': None, 'features': None}
+            for name, filename in self.model_paths.items()
+        }
+
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                    manifest = json.load(fh)
+                for name, spec in manifest.get('models', {}).items():
+                    specs[name] = {
+                        'version': str(spec.get('version', UNVERSIONED)),
+                        'path': spec.get('path') or self.model_paths.get(name),
+                        'sha256': spec.get('sha256'),
+                        'features': spec.get('features')
+                    }
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to read model manifest {self.manifest_path}: {e}")
+
+        return specs
+
+    def cached_manifest(self):
+        """
+        Same as read_manifest(), re-reading the file only when its mtime/size change.
+
+        For per-request lookups; the result must not be mutated.
+        """
+        signature = self._file_signature(self.manifest_path)
+        cached_signature, specs = self._manifest_cache
+        if specs is None or signature != cached_signature:
+            specs = self.read_manifest()
+            self._manifest_cache = (signature, specs)
+        return specs
+
+    def _full_path(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.models_path, path)
+
+    @staticmethod
+    def _file_signature(full_path):
+        """Cheap change detector: (mtime_ns, size) of the artifact."""
+        try:
+            stat = os.stat(full_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    # ---------- Loading ----------
+    def _load_entry(self, name, spec):
+        """Load one model according to its spec. Never raises."""
+        if not spec.get('path'):
+            return ModelEntry(name, spec['version'], None, spec.get('features'), None, None, None)
+
+        full_path = self._full_path(spec['path'])
+        signature = self._file_signature(full_path)
+        if signature is None:
+            logger.warning(f"Model file not found: {full_path}")
+            return ModelEntry(name, spec['version'], None, spec.get('features'), full_path, None, None)
+
+        try:
+            checksum = file_checksum(full_path)
+            expected = spec.get('sha256')
+            if expected and checksum != expected:
+                logger.error(
+                    f"Checksum mismatch for model '{name}' v{spec['version']}: "
+                    f"expected {expected[:12]}, got {checksum[:12]}"
+                )
+                return None
+
+            model = joblib.load(full_path)
+            logger.info(f"Model '{name}' v{spec['version']} loaded ({checksum[:12]})")
+            return ModelEntry(name, spec['version'], checksum, spec.get('features'), full_path, model, signature)
+        except Exception as e:
+            logger.error(f"Failed to load model '{name}': {e}")
+            return ModelEntry(name, spec['version'], None, spec.get('features'), full_path, None, signature)
+
+    def _install(self, entry):
+        """Atomically publish a new entry (copy-on-write)."""
+        with self._lock:
+            entries = dict(self._entries)
+            entries[entry.name] = entry
+            self._entries = entries
+
+    def get(self, name):
+        """
+        Get the active entry for a model, loading it lazily on first use.
+
+        Returns:
+            ModelEntry or None if the model is not registered.
+        """
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                return entry
+
+            spec = self.read_manifest().get(name)
+            if spec is None:
+                logger.warning(f"Model '{name}' not found in registry")
+                return None
+
+            entry = self._load_entry(name, spec)
+            if entry is None:
+                # Checksum rejected on first load: register as unavailable
+                entry = ModelEntry(name, spec['version'], None, spec.get('features'), None, None, None)
+            self._install(entry)
+            return entry
+
+    # ---------- Hot swap ----------
+    def refresh(self):
+        """
+        Reload every loaded model whose manifest spec or artifact changed.
+
+        Returns:
+            list: Names of models that were swapped.
+        """
+        specs = self.read_manifest()
+        swapped = []
+
+        for name, current in list(self._entries.items()):
+            spec = specs.get(name)
+            if spec is None:
+                continue
+
+            full_path = self._full_path(spec['path']) if spec.get('path') else None
+            signature = self._file_signature(full_path) if full_path else None
+            changed = (
+                spec['version'] != current.version
+                or (spec.get('sha256') and spec['sha256'] != current.checksum)
+                or full_path != current.path
+                or signature != current.signature
+            )
+            if not changed:
+                continue
+
+            entry = self._load_entry(name, spec)
+            if entry is None or (entry.model is None and current.model is not None):
+                # Keep serving the last good version
+                continue
+
+            self._install(entry)
+            swapped.append(name)
+            logger.info(f"Model '{name}' swapped: v{current.version} -> v{entry.version}")
+
+        self.last_refresh = datetime.utcnow()
+        return swapped
+
+    def start_polling(self, interval):
+        """Start a daemon thread that calls refresh() every ``interval`` seconds."""
+        if interval <= 0 or (self._poller is not None and self._poller.is_alive()):
+            return
+
+        self._stop_event.clear()
+
+        def _poll():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Model registry refresh failed: {e}")
+
+        self._poller = threading.Thread(target=_poll, name='model-registry-poller', daemon=True)
+        self._poller.start()
+
+    def stop_polling(self):
+        """Stop the background poller."""
+        self._stop_event.set()
+        if self._poller is not None:
+            self._poller.join(timeout=1)
+            self._poller = None
+
+    def clear(self):
+        """Drop all loaded entries."""
+        with self._lock:
+            self._entries = {}
+
+    def status(self):
+        """Get metadata for all loaded models."""
+        return {
+            'manifest': self.manifest_path if os.path.exists(self.manifest_path) else None,
+            'polling': self._poller is not None and self._poller.is_alive(),
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+            'models': {name: entry.to_dict() for name, entry in self._entries.items()}
+        }
+
+
+def build_manifest(models_path, model_paths, versions=None, features=None, output=None):
+    """
+    Write a manifest for the artifacts currently in ``models_path``.
+
+    Args:
+        models_path: Directory containing the model files
+        model_paths: {name: filename} mapping (usually Config.MODEL_PATHS)
+        versions: Optional {name: version} overrides
+        features: Optional {name: [feature, ...]} schemas
+
+    Returns:
+        dict: The manifest written to disk
+    """
+    versions = versions or {}
+    features = features or {}
+    models = {}
+    for name, filename in model_paths.items():
+        full_path = os.path.join(models_path, filename)
+        if not os.path.exists(full_path):
+            continue
+        models[name] = {
+            'version': versions.get(name, time.strftime('%Y.%m.%d')),
+            'path': filename,
+            'sha256': file_checksum(full_path),
+            'features': features.get(name)
+        }
+
+    manifest = {'generated_at': datetime.utcnow().isoformat(), 'models': models}
+    with open(output or os.path.join(models_path, MANIFEST_FILENAME), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
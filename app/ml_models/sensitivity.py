@@ -0,0 +1,266 @@
+"""
+Precomputed partial-dependence grids for the advanced yield model.
+
+The what-if UI moves one slider at a time, and each tick used to be a full
+LightGBM + SHAP call. This module evaluates the model once, offline, on
+a grid over each feature (1-D partial dependence) and over every feature
+pair (2-D partial dependence). It stores the result as a small compressed
+``.npz``. At request time a prediction is rebuilt from those tables:
+
+    f(x) ~ mean + sum_i [PD_i(x_i) - mean]
+                + sum_i<j [PD_ij(x_i, x_j) - PD_i(x_i) - PD_j(x_j) + mean]
+
+with linear / bilinear interpolation between grid points, so no model is
+loaded or invoked. The build also records how closely this surrogate tracks
+the real model on held-out rows.
+
+Usage:
+    python -m app.ml_models.sensitivity                 # build next to the model
+    python -m app.ml_models.sensitivity --grid-points 32 --background 600
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import combinations
+
+import numpy as np
+
+from app.ml_models.model_registry import MANIFEST_FILENAME, file_checksum
+
+logger = logging.getLogger(__name__)
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+SENSITIVITY_FILENAME = 'advanced_yield_sensitivity.npz'
+YIELD_FEATURES = ('Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Rainfall', 'pH')
+
+_grids = {}
+_grids_lock = threading.Lock()
+
+
+def _predict(model, features, rows):
+    import pandas as pd
+    return np.asarray(model.predict(pd.DataFrame(rows, columns=list(features))), dtype=np.float64)
+
+
+def build_sensitivity_grids(model, X, features=YIELD_FEATURES, grid_points=24, background=400,
+                            validation=1000, seed=42):
+    """
+    Evaluate 1-D and 2-D partial dependence of ``model`` over ``X``.
+
+    Args:
+        model: Fitted regressor taking a DataFrame with ``features`` columns
+        X: ndarray (n_rows, n_features) of real inputs
+        grid_points: Points per feature, evenly spaced between its p1 and p99
+        background: Rows averaged over for each partial-dependence value
+        validation: Rows used to measure surrogate fidelity
+
+    Returns:
+        dict: Arrays ready for ``np.savez_compressed``
+    """
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float64)
+    order = rng.permutation(len(X))
+    bg = X[order[:background]]
+    holdout = X[order[background:background + validation]]
+    n_features = len(features)
+
+    low, high = np.percentile(X, 1, axis=0), np.percentile(X, 99, axis=0)
+    grids = np.stack([np.linspace(low[i], high[i], grid_points) for i in range(n_features)])
+    mean = float(_predict(model, features, bg).mean())
+
+    pd1 = np.empty((n_features, grid_points))
+    for i in range(n_features):
+        rows = np.repeat(bg[None, :, :], grid_points, axis=0)
+        rows[:, :, i] = grids[i][:, None]
+        pd1[i] = _predict(model, features, rows.reshape(-1, n_features)).reshape(grid_points, -1).mean(axis=1)
+
+    pairs = list(combinations(range(n_features), 2))
+    pd2 = np.empty((len(pairs), grid_points, grid_points))
+    for p, (i, j) in enumerate(pairs):
+        rows = np.repeat(bg[None, None, :, :], grid_points, axis=0).repeat(grid_points, axis=1)
+        rows[:, :, :, i] = grids[i][:, None, None]
+        rows[:, :, :, j] = grids[j][None, :, None]
+        pd2[p] = _predict(model, features, rows.reshape(-1, n_features)).reshape(grid_points, grid_points, -1).mean(axis=2)
+
+    arrays = {
+        'features': np.array(features),
+        'grids': grids.astype(np.float32),
+        'pd1': pd1.astype(np.float32),
+        'pd2': pd2.astype(np.float32),
+        'pairs': np.array(pairs, dtype=np.int8),
+        'mean': np.float32(mean),
+        'reference': np.median(X, axis=0).astype(np.float32),
+    }
+
+    if len(holdout):
+        grid = SensitivityGrid(arrays)
+        approx = grid.predict_rows(holdout)
+        actual = _predict(model, features, holdout)
+        residual = actual - approx
+        arrays['fidelity_mae'] = np.float32(np.abs(residual).mean())
+        arrays['fidelity_r2'] = np.float32(1 - (residual ** 2).sum() / max(((actual - actual.mean()) ** 2).sum(), 1e-12))
+
+    return arrays
+
+
+class SensitivityGrid:
+    """Interpolating lookup over precomputed partial-dependence tables."""
+
+    def __init__(self, arrays):
+        self.features = [str(f) for f in arrays['features']]
+        self.grids = np.asarray(arrays['grids'], dtype=np.float64)
+        self.pd1 = np.asarray(arrays['pd1'], dtype=np.float64)
+        self.pd2 = np.asarray(arrays['pd2'], dtype=np.float64)
+        self.pairs = [tuple(int(v) for v in pair) for pair in arrays['pairs']]
+        self.mean = float(arrays['mean'])
+        self.reference = np.asarray(arrays['reference'], dtype=np.float64)
+        self.meta = {
+            key: (arrays[key].item() if hasattr(arrays[key], 'item') else arrays[key])
+            for key in ('model_sha256', 'model_version', 'built_at', 'fidelity_mae', 'fidelity_r2')
+            if key in arrays
+        }
+        self._positions = np.arange(self.grids.shape[1], dtype=np.float64)
+        # PD_ij - PD_i - PD_j + mean, precomputed so a lookup is one bilinear read per pair
+        self._interaction = np.stack([
+            self.pd2[p] - self.pd1[i][:, None] - self.pd1[j][None, :] + self.mean
+            for p, (i, j) in enumerate(self.pairs)
+        ]) if self.pairs else np.empty((0,) + self.pd2.shape[1:])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def _fractional_index(self, i, values):
+        return np.interp(values, self.grids[i], self._positions)
+
+    def _bilinear(self, table, fi, fj):
+        last = table.shape[0] - 1
+        i0 = np.clip(np.floor(fi).astype(int), 0, last - 1)
+        j0 = np.clip(np.floor(fj).astype(int), 0, last - 1)
+        di, dj = fi - i0, fj - j0
+        return (table[i0, j0] * (1 - di) * (1 - dj) + table[i0 + 1, j0] * di * (1 - dj)
+                + table[i0, j0 + 1] * (1 - di) * dj + table[i0 + 1, j0 + 1] * di * dj)
+
+    def predict_rows(self, X):
+        """Approximate model output for rows of X (n_rows, n_features)."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        frac = [self._fractional_index(i, X[:, i]) for i in range(len(self.features))]
+        out = np.full(len(X), self.mean)
+        for i in range(len(self.features)):
+            out += np.interp(frac[i], self._positions, self.pd1[i]) - self.mean
+        for p, (i, j) in enumerate(self.pairs):
+            out += self._bilinear(self._interaction[p], frac[i], frac[j])
+        return out
+
+    def row_from(self, values):
+        """Feature row from {feature name: value}; missing features use the dataset median."""
+        return np.array([
+            float(values[name]) if values.get(name) is not None else self.reference[i]
+            for i, name in enumerate(self.features)
+        ])
+
+    def predict(self, values):
+        """Approximate prediction for one set of conditions."""
+        return float(self.predict_rows(self.row_from(values)[None, :])[0])
+
+    def curve(self, values, feature, points=None):
+        """
+        Predictions as ``feature`` sweeps its range with the others held fixed.
+
+        Returns:
+            tuple: (x values, predictions)
+        """
+        i = self.features.index(feature)
+        xs = self.grids[i] if points is None else np.linspace(self.grids[i][0], self.grids[i][-1], points)
+        rows = np.repeat(self.row_from(values)[None, :], len(xs), axis=0)
+        rows[:, i] = xs
+        return xs, self.predict_rows(rows)
+
+
+def get_sensitivity_grid(path):
+    """Get the loaded grid for ``path``, reloading when the file changes. None if missing."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _grids.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _grids_lock:
+        cached = _grids.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, SensitivityGrid.load(path))
+            _grids[path] = cached
+        return cached[1]
+
+
+def build_for_model(models_path=ML_MODELS_PATH, model_file='advanced_yield_model.pkl', dataset=None,
+                    output=None, grid_points=24, background=400, model_version=None):
+    """
+    Build and save the sensitivity grids for the model artifact in ``models_path``.
+
+    Returns:
+        dict: Summary (path, size, build time, fidelity)
+    """
+    import joblib
+    from app.utils.columnar_store import load_frame
+
+    model_path = os.path.join(models_path, model_file)
+    dataset = dataset or os.path.join(ML_MODELS_PATH, 'EDA_500.csv')
+    output = output or os.path.join(models_path, SENSITIVITY_FILENAME)
+
+    if model_version is None:
+        manifest_path = os.path.join(models_path, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as fh:
+                model_version = json.load(fh).get('models', {}).get('advanced_yield', {}).get('version')
+
+    # Rows without a numeric Yield are column-shifted in EDA_500; their features are not usable
+    frame = load_frame(dataset, list(YIELD_FEATURES) + ['Yield']).dropna()[list(YIELD_FEATURES)]
+    model = joblib.load(model_path)
+
+    start = time.perf_counter()
+    arrays = build_sensitivity_grids(model, frame.to_numpy(dtype=np.float64), grid_points=grid_points,
+                                     background=background)
+    build_seconds = time.perf_counter() - start
+
+    arrays['model_sha256'] = np.array(file_checksum(model_path))
+    arrays['model_version'] = np.array(str(model_version))
+    arrays['built_at'] = np.array(datetime.utcnow().isoformat())
+
+    tmp_path = output + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, output)
+
+    summary = {
+        'path': output,
+        'size_bytes': os.path.getsize(output),
+        'build_seconds': round(build_seconds, 2),
+        'grid_points': grid_points,
+        'fidelity_mae': float(arrays.get('fidelity_mae', np.nan)),
+        'fidelity_r2': float(arrays.get('fidelity_r2', np.nan)),
+    }
+    logger.info(f"Sensitivity grids written: {summary}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute partial-dependence grids for advanced_yield.')
+    parser.add_argument('--models-path', default=ML_MODELS_PATH)
+    parser.add_argument('--grid-points', type=int, default=24)
+    parser.add_argument('--background', type=int, default=400, help='Rows averaged per grid value')
+    parser.add_argument('--output', help=f'Output .npz (default: <models-path>/{SENSITIVITY_FILENAME})')
+    args = parser.parse_args(argv)
+
+    summary = build_for_model(args.models_path, output=args.output, grid_points=args.grid_points,
+                              background=args.background)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Shadow evaluation of candidate models against the live primary."""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000
+REGRESSION_RTOL = 0.01  # outputs within 1% count as agreeing
+
+
+class ShadowStats:
+    """Running agreement and latency figures for one candidate."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.compared = 0
+        self.agreed = 0
+        self.errors = 0
+        self.max_abs_diff = 0.0
+        self.primary_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.candidate_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.last_error = None
+
+    def to_dict(self):
+        primary = np.array(self.primary_ms)
+        candidate = np.array(self.candidate_ms)
+
+        def pct(values, q):
+            return round(float(np.percentile(values, q)), 4) if len(values) else None
+
+        latency = {
+            'primary_p50_ms': pct(primary, 50),
+            'primary_p95_ms': pct(primary, 95),
+            'candidate_p50_ms': pct(candidate, 50),
+            'candidate_p95_ms': pct(candidate, 95),
+        }
+        if len(primary) and len(candidate):
+            latency['p50_delta_ms'] = round(latency['candidate_p50_ms'] - latency['primary_p50_ms'], 4)
+            latency['p95_delta_ms'] = round(latency['candidate_p95_ms'] - latency['primary_p95_ms'], 4)
+            latency['speedup'] = round(latency['primary_p50_ms'] / latency['candidate_p50_ms'], 2) \
+                if latency['candidate_p50_ms'] else None
+
+        return {
+            'model': self.name,
+            'candidate_path': self.path,
+            'started_at': self.started_at.isoformat(),
+            'compared': self.compared,
+            'agreement_rate': round(self.agreed / self.compared, 4) if self.compared else None,
+            'max_abs_diff': round(self.max_abs_diff, 6),
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'latency': latency
+        }
+
+
+class ShadowEvaluator:
+    """
+    Scores a sampled fraction of live requests with candidate models.
+
+    The request thread only does a random draw and a non-blocking queue put.
+    A daemon worker loads each candidate on first use, times its prediction
+    on the same inputs, and compares it with the primary output the request
+    already produced. Classifier labels must match exactly; numeric outputs
+    agree when they are within 1% of each other. When the queue is full, the
+    sample is dropped rather than slowing the response.
+    """
+
+    def __init__(self, models_path, sample_rate=0.1, max_queue=1000):
+        self.models_path = models_path
+        self.sample_rate = sample_rate
+        self._candidates = {}   # name -> path
+        self._models = {}       # path -> loaded model
+        self._stats = {}        # name -> ShadowStats
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self.dropped = 0
+
+    # ---------- Configuration ----------
+    def set_candidate(self, name, path):
+        """Shadow ``name`` with the artifact at ``path`` (relative to the models directory)."""
+        full_path = path if os.path.isabs(path) else os.path.join(self.models_path, path)
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"Candidate model not found: {path}")
+        with self._lock:
+            self._candidates[name] = full_path
+            self._stats[name] = ShadowStats(name, full_path)
+        self._ensure_worker()
+
+    def remove_candidate(self, name):
+        with self._lock:
+            path = self._candidates.pop(name, None)
+            if path is not None and path not in self._candidates.values():
+                self._models.pop(path, None)
+
+    def is_active(self, name):
+        return name in self._candidates
+
+    # ---------- Request path ----------
+    def submit(self, name, inputs, primary_output, primary_ms):
+        """Queue one request for shadow scoring if ``name`` has a candidate and it is sampled."""
+        if name not in self._candidates or random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((name, inputs, primary_output, primary_ms))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # ---------- Worker ----------
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+        self._worker.start()
+
+    def _load(self, path):
+        model = self._models.get(path)
+        if model is None:
+            model = joblib.load(path)
+            self._models[path] = model
+            logger.info(f"Shadow candidate loaded: {path}")
+        return model
+
+    def _run(self):
+        while True:
+            name, inputs, primary_output, primary_ms = self._queue.get()
+            try:
+                self._evaluate(name, inputs, primary_output, primary_ms)
+            except Exception as e:
+                stats = self._stats.get(name)
+                if stats is not None:
+                    stats.errors += 1
+                    stats.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self, name, inputs, primary_output, primary_ms):
+        path = self._candidates.get(name)
+        stats = self._stats.get(name)
+        if path is None or stats is None:
+            return
+
+        model = self._load(path)
+        start = time.perf_counter()
+        candidate_output = model.predict(inputs)
+        candidate_ms = (time.perf_counter() - start) * 1000
+
+        primary = np.asarray(primary_output)
+        candidate = np.asarray(candidate_output)
+        if primary.dtype.kind in 'fc' and candidate.dtype.kind in 'fc':
+            diff = np.abs(primary.astype(np.float64) - candidate.astype(np.float64))
+            agreed = bool(np.all(diff <= REGRESSION_RTOL * np.maximum(np.abs(primary), 1e-9)))
+            stats.max_abs_diff = max(stats.max_abs_diff, float(diff.max()) if diff.size else 0.0)
+        else:
+            agreed = bool(np.array_equal(primary.astype(str), candidate.astype(str)))
+
+        stats.compared += 1
+        stats.agreed += int(agreed)
+        stats.primary_ms.append(primary_ms)
+        stats.candidate_ms.append(candidate_ms)
+
+    def report(self):
+        """Agreement and latency comparison for every candidate."""
+        return {
+            'sample_rate': self.sample_rate,
+            'queued': self._queue.qsize(),
+            'dropped': self.dropped,
+            'candidates': {name: stats.to_dict() for name, stats in list(self._stats.items())
+                           if name in self._candidates}
+        }
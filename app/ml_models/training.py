@@ -0,0 +1,375 @@
+"""
+Offline training pipeline for the bundled ML models.
+
+Rebuilds every artifact ModelLoader serves from the CSVs shipped next to
+it. For each model a small grid of candidates is cross-validated in
+parallel (GridSearchCV over ``--jobs`` cores), every candidate is refit and
+profiled for single-row latency, batch throughput and pickled size, and the
+best-scoring candidate that fits the optional latency/size budget is
+written under the filename from MODEL_PATHS. The manifest is regenerated so
+a running registry hot-swaps the new versions. A retrained advanced_yield
+model also gets fresh sensitivity grids (sensitivity.py) and a retrained
+crop_recommendation model a fresh lookup-table surrogate (crop_surrogate.py).
+
+Usage:
+    python -m app.ml_models.training --output-dir /tmp/models --report train.json
+    python -m app.ml_models.training --models crop_recommendation --max-latency-ms 5
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import GridSearchCV, KFold, StratifiedKFold, train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from app.config.config import Config
+from app.ml_models.model_registry import MANIFEST_FILENAME, build_manifest
+from app.utils.columnar_store import load_frame
+
+logger = logging.getLogger(__name__)
+
+ML_MODELS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+YIELD_FEATURES = ['Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Rainfall', 'pH']
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+RECOMMENDATION_FEATURES = ['ph_tanah', 'skor_bwd', 'kelembaban_tanah', 'umur_tanaman_hari']
+RECOMMENDATION_TARGETS = ['rekomendasi_N', 'rekomendasi_P', 'rekomendasi_K']
+
+# Below this many rows there is no holdout split; candidates are ranked on CV only.
+MIN_HOLDOUT_ROWS = 50
+LATENCY_SAMPLES = 200
+
+
+def _load_yield_frame():
+    frame = load_frame(os.path.join(ML_MODELS_PATH, 'EDA_500.csv'), YIELD_FEATURES + ['Yield'])
+    return frame.dropna().reset_index(drop=True)
+
+
+def _crop_data():
+    frame = load_frame(os.path.join(ML_MODELS_PATH, 'Crop_recommendation.csv'), CROP_FEATURES + ['label'])
+    return frame[CROP_FEATURES].to_numpy(dtype=np.float64), np.asarray(frame['label'].astype(str))
+
+
+def _bwd_data():
+    frame = pd.read_csv(os.path.join(ML_MODELS_PATH, 'bwd_dataset.csv')).dropna()
+    return frame[['avg_hue_value']].to_numpy(dtype=np.float64), frame['bwd_score'].to_numpy(dtype=int)
+
+
+def _recommendation_data():
+    frame = pd.read_csv(os.path.join(ML_MODELS_PATH, 'fertilizer_data.csv')).dropna()
+    return frame[RECOMMENDATION_FEATURES].to_numpy(dtype=np.float64), frame[RECOMMENDATION_TARGETS].to_numpy(dtype=np.float64)
+
+
+def _advanced_yield_data():
+    frame = _load_yield_frame()
+    return frame[YIELD_FEATURES].astype(np.float64), frame['Yield'].to_numpy(dtype=np.float64)
+
+
+def _success_data():
+    # "Success" = reaching at least the median yield of the dataset.
+    frame = _load_yield_frame()
+    target = (frame['Yield'] >= frame['Yield'].median()).astype(int).to_numpy()
+    return frame[YIELD_FEATURES].to_numpy(dtype=np.float64), target
+
+
+def _lightgbm_candidates():
+    from lightgbm import LGBMRegressor
+    return [(
+        'lightgbm',
+        LGBMRegressor(random_state=42, verbose=-1, n_jobs=1),
+        {'n_estimators': [100, 300], 'num_leaves': [15, 31, 63], 'learning_rate': [0.05, 0.1]}
+    )]
+
+
+# name -> (loader, task, scoring, candidate factory)
+# Each candidate is (family, estimator, param grid); estimators use n_jobs=1
+# because parallelism comes from the search, not from the individual fit.
+TRAINING_SPECS = {
+    'crop_recommendation': (_crop_data, 'classification', 'accuracy', lambda: [
+        ('random_forest', RandomForestClassifier(random_state=42, n_jobs=1),
+         {'n_estimators': [25, 50, 100, 200], 'max_depth': [None, 12]}),
+        ('extra_trees', ExtraTreesClassifier(random_state=42, n_jobs=1),
+         {'n_estimators': [50, 100], 'max_depth': [None, 12]}),
+    ]),
+    'recommendation': (_recommendation_data, 'regression', 'neg_mean_absolute_error', lambda: [
+        ('random_forest', RandomForestRegressor(random_state=42, n_jobs=1),
+         {'n_estimators': [10, 50, 100], 'max_depth': [None, 4]}),
+    ]),
+    'advanced_yield': (_advanced_yield_data, 'regression', 'r2', _lightgbm_candidates),
+    'success_model': (_success_data, 'classification', 'roc_auc', lambda: [
+        ('logistic_regression', LogisticRegression(max_iter=1000),
+         {'C': [0.01, 0.1, 1.0, 10.0]}),
+        ('scaled_logistic_regression', make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)),
+         {'logisticregression__C': [0.01, 0.1, 1.0, 10.0]}),
+    ]),
+    'bwd': (_bwd_data, 'classification', 'accuracy', lambda: [
+        ('svc', SVC(probability=True), {'C': [0.1, 1.0, 10.0, 100.0], 'kernel': ['linear', 'rbf']}),
+    ]),
+}
+
+# Methods the services call on each artifact; a model without them is not written.
+REQUIRED_METHODS = {
+    'crop_recommendation': ('predict', 'predict_proba'),
+    'success_model': ('predict_proba',),
+    'bwd': ('predict', 'predict_proba'),
+}
+
+# Artifacts derived from another model rather than trained on their own.
+DERIVED_ARTIFACTS = {'shap_explainer': 'advanced_yield'}
+
+MANIFEST_FEATURES = {
+    'crop_recommendation': CROP_FEATURES,
+    'recommendation': RECOMMENDATION_FEATURES,
+    'advanced_yield': YIELD_FEATURES,
+    'shap_explainer': YIELD_FEATURES,
+    'success_model': YIELD_FEATURES,
+    'bwd': ['avg_hue_value'],
+}
+
+
+def _cv_splitter(task, y, folds):
+    if task == 'classification':
+        _, counts = np.unique(y, return_counts=True)
+        return StratifiedKFold(n_splits=max(2, min(folds, int(counts.min()))), shuffle=True, random_state=42)
+    return KFold(n_splits=max(2, min(folds, len(y))), shuffle=True, random_state=42)
+
+
+def _take(X, rows):
+    return X.iloc[rows] if isinstance(X, pd.DataFrame) else X[rows]
+
+
+def _profile(model, X, batch_size=1024):
+    """Single-row latency percentiles, batch throughput and pickled size of a fitted model."""
+    row = _take(X, slice(0, 1))
+    model.predict(row)
+    samples = []
+    for _ in range(LATENCY_SAMPLES):
+        start = time.perf_counter()
+        model.predict(row)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    batch = _take(X, np.resize(np.arange(len(X)), batch_size))
+    start = time.perf_counter()
+    model.predict(batch)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'latency_p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'latency_p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'batch_rows_per_sec': round(batch_size / max(batch_seconds, 1e-9), 1),
+        'size_bytes': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    }
+
+
+def _fit(estimator, params, X, y):
+    model = clone(estimator).set_params(**params)
+    start = time.perf_counter()
+    model.fit(X, y)
+    return model, time.perf_counter() - start
+
+
+def train_model(name, jobs=-1, folds=5, max_latency_ms=None, max_size_mb=None):
+    """
+    Search, profile and select the best candidate for one model.
+
+    Args:
+        name: Key of TRAINING_SPECS
+        jobs: Parallel workers for cross-validation and refits (-1 = all cores)
+        folds: Upper bound on CV folds (reduced for tiny datasets)
+        max_latency_ms: Optional p50 single-row latency budget
+        max_size_mb: Optional pickled size budget
+
+    Returns:
+        tuple: (fitted model or None, report dict)
+    """
+    loader, task, scoring, candidate_factory = TRAINING_SPECS[name]
+    report = {'model': name, 'task': task, 'scoring': scoring}
+    try:
+        candidates = candidate_factory()
+    except ImportError as e:
+        report['skipped'] = f"missing dependency: {e.name}"
+        return None, report
+
+    X, y = loader()
+    report['rows'] = int(len(y))
+
+    if len(y) >= MIN_HOLDOUT_ROWS:
+        stratify = y if task == 'classification' else None
+        train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42, stratify=stratify)
+        X_train, y_train = _take(X, train_idx), y[train_idx]
+        X_test, y_test = _take(X, test_idx), y[test_idx]
+    else:
+        X_train, y_train, X_test, y_test = X, y, None, None
+    scorer = get_scorer(scoring)
+    cv = _cv_splitter(task, y_train, folds)
+
+    results = []
+    for family, estimator, grid in candidates:
+        search = GridSearchCV(estimator, grid, scoring=scoring, cv=cv, n_jobs=jobs, refit=False)
+        search.fit(X_train, y_train)
+        params_list = search.cv_results_['params']
+
+        fitted = Parallel(n_jobs=jobs)(delayed(_fit)(estimator, params, X_train, y_train) for params in params_list)
+        for i, (params, (model, fit_seconds)) in enumerate(zip(params_list, fitted)):
+            entry = {
+                'family': family,
+                'params': params,
+                'cv_score': round(float(search.cv_results_['mean_test_score'][i]), 5),
+                'cv_std': round(float(search.cv_results_['std_test_score'][i]), 5),
+                'fit_seconds': round(fit_seconds, 4),
+            }
+            if X_test is not None:
+                entry['holdout_score'] = round(float(scorer(model, X_test, y_test)), 5)
+            entry.update(_profile(model, X_train))
+            results.append((entry, estimator))
+
+    def within_budget(entry):
+        if max_latency_ms is not None and entry['latency_p50_ms'] > max_latency_ms:
+            return False
+        if max_size_mb is not None and entry['size_bytes'] > max_size_mb * 1024 * 1024:
+            return False
+        return True
+
+    score_key = 'holdout_score' if X_test is not None else 'cv_score'
+    eligible = [r for r in results if within_budget(r[0])] or results
+    best_entry, best_estimator = max(eligible, key=lambda r: (r[0][score_key], -r[0]['latency_p50_ms']))
+    best_entry['selected'] = True
+    report['within_budget'] = within_budget(best_entry)
+    report['candidates'] = [entry for entry, _ in results]
+    report['selected'] = {k: best_entry[k] for k in ('family', 'params', score_key, 'latency_p50_ms', 'size_bytes')}
+
+    final_model, _ = _fit(best_estimator, best_entry['params'], X, y)
+    return final_model, report
+
+
+def _build_shap_explainer(model):
+    import shap
+    return shap.TreeExplainer(model)
+
+
+def _atomic_dump(obj, path):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.train-', dir=directory)
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def run_training(models=None, output_dir=None, version=None, jobs=-1, folds=5,
+                 max_latency_ms=None, max_size_mb=None):
+    """
+    Train the requested models (default: all) and write their artifacts.
+
+    Returns:
+        dict: Machine-readable training report.
+    """
+    output_dir = output_dir or ML_MODELS_PATH
+    os.makedirs(output_dir, exist_ok=True)
+    version = version or datetime.utcnow().strftime('%Y.%m.%d.%H%M')
+    models = models or list(TRAINING_SPECS)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'version': version,
+        'output_dir': output_dir,
+        'settings': {'jobs': jobs, 'folds': folds, 'max_latency_ms': max_latency_ms, 'max_size_mb': max_size_mb},
+        'models': {}
+    }
+
+    trained = {}
+    for name in models:
+        start = time.perf_counter()
+        model, model_report = train_model(name, jobs, folds, max_latency_ms, max_size_mb)
+        model_report['total_seconds'] = round(time.perf_counter() - start, 2)
+        report['models'][name] = model_report
+        if model is None:
+            logger.warning(f"Skipped {name}: {model_report.get('skipped')}")
+            continue
+        missing = [m for m in REQUIRED_METHODS.get(name, ()) if not hasattr(model, m)]
+        if missing:
+            model_report['skipped'] = f"selected model lacks {', '.join(missing)}"
+            logger.error(f"Not writing {name}: {model_report['skipped']}")
+            continue
+        _atomic_dump(model, os.path.join(output_dir, Config.MODEL_PATHS[name]))
+        trained[name] = version
+        logger.info(f"Trained {name}: {model_report['selected']}")
+
+    for derived, source in DERIVED_ARTIFACTS.items():
+        if source not in trained:
+            continue
+        try:
+            explainer = _build_shap_explainer(joblib.load(os.path.join(output_dir, Config.MODEL_PATHS[source])))
+        except ImportError as e:
+            report['models'][derived] = {'model': derived, 'skipped': f"missing dependency: {e.name}"}
+            continue
+        _atomic_dump(explainer, os.path.join(output_dir, Config.MODEL_PATHS[derived]))
+        trained[derived] = version
+        report['models'][derived] = {'model': derived, 'derived_from': source}
+
+    if 'crop_recommendation' in trained:
+        from app.ml_models.crop_surrogate import build_for_model as build_crop_surrogate
+        report['crop_surrogate'] = build_crop_surrogate(output_dir, Config.MODEL_PATHS['crop_recommendation'],
+                                                        model_version=version)
+
+    if 'advanced_yield' in trained:
+        from app.ml_models.sensitivity import build_for_model
+        report['sensitivity'] = build_for_model(output_dir, Config.MODEL_PATHS['advanced_yield'],
+                                                model_version=version)
+
+    # Keep versions of artifacts that were not retrained this run.
+    versions = {}
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as fh:
+            versions = {name: spec.get('version') for name, spec in json.load(fh).get('models', {}).items()}
+    versions.update(trained)
+    build_manifest(output_dir, Config.MODEL_PATHS, versions=versions, features=MANIFEST_FEATURES)
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Retrain the bundled ML models from the bundled datasets.')
+    parser.add_argument('--models', nargs='*', choices=list(TRAINING_SPECS), help='Models to train (default: all)')
+    parser.add_argument('--output-dir', help='Where to write artifacts and manifest (default: app/ml_models)')
+    parser.add_argument('--version', help='Version recorded in the manifest (default: UTC timestamp)')
+    parser.add_argument('--jobs', type=int, default=-1, help='Parallel workers (-1 = all cores)')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--max-latency-ms', type=float, help='p50 single-row latency budget for selection')
+    parser.add_argument('--max-size-mb', type=float, help='Pickled size budget for selection')
+    parser.add_argument('--report', help='Write JSON report to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    report = run_training(args.models, args.output_dir, args.version, args.jobs, args.folds,
+                          args.max_latency_ms, args.max_size_mb)
+
+    payload = json.dumps(report, indent=2, default=str)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
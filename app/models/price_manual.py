@@ -1,6 +1,13 @@
 """Manual Price model for commodity prices not covered by Bapanas API."""
-from datetime import datetime, date
+import bisect
+import random
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
 from app import db
+from app.config.config import Config
 
 
 class ManualPrice(db.Model):
@@ -34,6 +41,7 @@ class ManualPrice(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     verified_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     verified_at = db.Column(db.DateTime)
+    is_held = db.Column(db.Boolean, nullable=False, default=False, index=True)  # Outlier menunggu review admin
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -60,26 +68,28 @@ class ManualPrice(db.Model):
             'source': self.source,
             'notes': self.notes,
             'is_verified': self.is_verified,
+            'is_held': bool(self.is_held),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
     @classmethod
     def get_latest_price(cls, commodity_id, province_id=None):
-        """Get the latest price for a commodity."""
-        query = cls.query.filter(cls.commodity_id == commodity_id)
+        """Get the latest price for a commodity (held prices excluded)."""
+        query = cls.query.filter(cls.commodity_id == commodity_id, cls.is_held.is_(False))
         if province_id:
             query = query.filter(cls.province_id == province_id)
         return query.order_by(cls.price_date.desc()).first()
     
     @classmethod
     def get_price_history(cls, commodity_id, province_id=None, days=30):
-        """Get price history for a commodity."""
+        """Get price history for a commodity (held prices excluded)."""
         from datetime import timedelta
         start_date = date.today() - timedelta(days=days)
         
         query = cls.query.filter(
             cls.commodity_id == commodity_id,
-            cls.price_date >= start_date
+            cls.price_date >= start_date,
+            cls.is_held.is_(False)
         )
         if province_id:
             query = query.filter(cls.province_id == province_id)
@@ -106,6 +116,432 @@ class ManualPrice(db.Model):
             )
             prices.append(price)
         
-        db.session.bulk_save_objects(prices)
+        # bulk_save_objects skips flush events, so screen prices and update the rollups here
+        held, anomalies = screen_prices(prices)
+        db.session.bulk_save_objects(prices, return_defaults=bool(anomalies))
+        for price, anomaly in anomalies:
+            anomaly.price_id = price.id
+        db.session.add_all([anomaly for _, anomaly in anomalies])
+        accepted = [p for p in prices if id(p) not in held]
+        ManualPriceRollup.apply(db.session, added=accepted)
+        record_after_commit(db.session, accepted)
         db.session.commit()
         return len(prices)
+
+
+class ManualPriceRollup(db.Model):
+    """
+    Daily and weekly aggregates of ManualPrice per (commodity, province, price_type).
+
+    Rows with ``scope='national'`` aggregate every province and use
+    ``province_id = NO_PROVINCE``, as do province rows for prices without a
+    province, so the unique constraint holds (NULLs never collide). Each row
+    keeps count, sum, min, max and a median estimate. Inserts only touch
+    those columns. A delete that removes the current min or max re-reads
+    that one group's extreme.
+
+    The median comes from a sorted sample of at most
+    ``MEDIAN_SAMPLE_SIZE`` prices kept on the row (reservoir sampling on
+    insert, dropped on delete). It is exact while the group is no larger
+    than the sample and an estimate beyond that; rebuild() resamples.
+
+    Rows are maintained in the same flush that inserts or deletes the
+    ManualPrice rows. Each group row is created if missing (insert ... on
+    conflict do nothing) and then locked with SELECT ... FOR UPDATE in key
+    order, so concurrent writers serialize per group instead of losing
+    updates.
+    """
+
+    __tablename__ = 'manual_price_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start', 'scope', 'commodity_id', 'province_id', 'price_type',
+                            name='uq_manual_price_rollup_group'),
+        db.Index('ix_manual_price_rollup_lookup', 'period', 'commodity_id', 'scope', 'period_start'),
+    )
+
+    PERIODS = ('day', 'week')
+    NO_PROVINCE = 0
+    MEDIAN_SAMPLE_SIZE = 64
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)  # day, week
+    period_start = db.Column(db.Date, nullable=False)  # the day, or the Monday of the week
+    scope = db.Column(db.String(10), nullable=False, default='province')  # province, national
+    commodity_id = db.Column(db.Integer, db.ForeignKey('commodities.id'), nullable=False)
+    province_id = db.Column(db.Integer, nullable=False, default=NO_PROVINCE)
+    province_name = db.Column(db.String(100))
+    price_type = db.Column(db.String(20), nullable=False, default='retail')
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum_price = db.Column(db.Float, nullable=False, default=0.0)
+    min_price = db.Column(db.Float)
+    max_price = db.Column(db.Float)
+    median_price = db.Column(db.Float)
+    median_sample = db.Column(db.JSON)  # sorted, at most MEDIAN_SAMPLE_SIZE prices
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def mean_price(self):
+        return round(self.sum_price / self.count, 2) if self.count else None
+
+    def to_dict(self):
+        """Convert model to dictionary for API response."""
+        return {
+            'period': self.period,
+            'period_start': self.period_start.isoformat() if self.period_start else None,
+            'scope': self.scope,
+            'commodity_id': self.commodity_id,
+            'province_id': None if self.province_id == self.NO_PROVINCE else self.province_id,
+            'province_name': self.province_name,
+            'price_type': self.price_type,
+            'count': self.count,
+            'min': self.min_price,
+            'median': self.median_price,
+            'mean': self.mean_price,
+            'max': self.max_price
+        }
+
+    @staticmethod
+    def period_start_for(period, price_date):
+        return price_date - timedelta(days=price_date.weekday()) if period == 'week' else price_date
+
+    @staticmethod
+    def period_end_for(period, start):
+        return start + timedelta(days=6) if period == 'week' else start
+
+    @classmethod
+    def _keys(cls, values):
+        """Group keys a price with ``values`` (dict of ManualPrice fields) contributes to."""
+        price_date = values['price_date'] or date.today()
+        price_type = values['price_type'] or 'retail'
+        province_id = cls.NO_PROVINCE if values['province_id'] is None else values['province_id']
+        for period in cls.PERIODS:
+            start = cls.period_start_for(period, price_date)
+            yield (period, start, 'province', values['commodity_id'], province_id, price_type)
+            yield (period, start, 'national', values['commodity_id'], cls.NO_PROVINCE, price_type)
+
+    @classmethod
+    def _group_filter(cls, query, key):
+        """Restrict a ManualPrice query to the prices of one rollup group."""
+        period, start, scope, commodity_id, province_id, price_type = key
+        query = query.filter(
+            ManualPrice.commodity_id == commodity_id,
+            func.coalesce(ManualPrice.price_type, 'retail') == price_type,
+            ManualPrice.price_date >= start,
+            ManualPrice.price_date <= cls.period_end_for(period, start)
+        )
+        if scope == 'province':
+            query = query.filter(ManualPrice.province_id.is_(None) if province_id == cls.NO_PROVINCE
+                                 else ManualPrice.province_id == province_id)
+        return query
+
+    @classmethod
+    def _insert_missing(cls, session, key, province_name):
+        """Create the group row if it does not exist, without failing when a concurrent writer wins."""
+        period, start, scope, commodity_id, province_id, price_type = key
+        values = dict(period=period, period_start=start, scope=scope, commodity_id=commodity_id,
+                      province_id=province_id, province_name=province_name if scope == 'province' else None,
+                      price_type=price_type, count=0, sum_price=0.0, updated_at=datetime.utcnow())
+        dialect = session.get_bind(mapper=cls.__mapper__).dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            statement = insert(cls.__table__).values(**values).on_conflict_do_nothing(
+                constraint='uq_manual_price_rollup_group')
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            statement = insert(cls.__table__).values(**values).on_conflict_do_nothing()
+        elif dialect in ('mysql', 'mariadb'):
+            statement = cls.__table__.insert().values(**values).prefix_with('IGNORE')
+        else:
+            if cls._locked_row(session, key) is not None:
+                return
+            statement = cls.__table__.insert().values(**values)
+        session.execute(statement)
+
+    @classmethod
+    def _locked_row(cls, session, key):
+        period, start, scope, commodity_id, province_id, price_type = key
+        return session.query(cls).filter_by(
+            period=period, period_start=start, scope=scope, commodity_id=commodity_id,
+            province_id=province_id, price_type=price_type
+        ).with_for_update().populate_existing().first()
+
+    @classmethod
+    def _group_extremes(cls, session, key, exclude_ids):
+        """(min, max) of the group's prices in the database, leaving out ``exclude_ids`` and held prices."""
+        query = cls._group_filter(session.query(func.min(ManualPrice.price), func.max(ManualPrice.price)), key)
+        query = query.filter(ManualPrice.is_held.is_(False))
+        if exclude_ids:
+            query = query.filter(ManualPrice.id.notin_(exclude_ids))
+        low, high = query.one()
+        return (float(low) if low is not None else None, float(high) if high is not None else None)
+
+    @classmethod
+    def _update_median(cls, row, adds, removes):
+        """Fold prices into the row's bounded sample; ``row.count`` already includes ``adds``."""
+        sample = list(row.median_sample or [])
+        for value in removes:
+            i = bisect.bisect_left(sample, value)
+            if i < len(sample) and sample[i] == value:
+                del sample[i]
+        seen = row.count - len(adds)
+        for value in adds:
+            seen += 1
+            if len(sample) < cls.MEDIAN_SAMPLE_SIZE:
+                bisect.insort(sample, value)
+            elif random.random() < cls.MEDIAN_SAMPLE_SIZE / seen:
+                del sample[random.randrange(len(sample))]
+                bisect.insort(sample, value)
+        n = len(sample)
+        row.median_sample = sample  # a new list, so the JSON change is detected
+        row.median_price = (sample[n // 2] if n % 2 else (sample[n // 2 - 1] + sample[n // 2]) / 2) if n else None
+
+    @classmethod
+    def apply(cls, session, added=(), removed=()):
+        """
+        Fold inserted and deleted prices into the rollups.
+
+        Args:
+            session: SQLAlchemy session (new rollup rows are added to it)
+            added: ManualPrice objects or field dicts that were inserted
+            removed: ManualPrice objects or field dicts that were deleted
+        """
+        changes = {}  # key -> (province name, added prices, removed prices)
+        touched_ids = set()
+        for items, index in ((added, 1), (removed, 2)):
+            for item in items:
+                values = _rollup_values(item)
+                if values['price'] is None or values['commodity_id'] is None:
+                    continue
+                if values['id'] is not None:
+                    touched_ids.add(values['id'])
+                for key in cls._keys(values):
+                    change = changes.setdefault(key, (values['province_name'], [], []))
+                    change[index].append(values['price'])
+
+        with session.no_autoflush:
+            # Lock in a fixed order so two writers touching the same groups cannot deadlock
+            for key in sorted(changes, key=lambda k: (k[0], k[1], k[2], k[3], k[4], k[5])):
+                province_name, adds, removes = changes[key]
+                cls._insert_missing(session, key, province_name)
+                row = cls._locked_row(session, key)
+                row.count += len(adds) - len(removes)
+                row.sum_price += sum(adds) - sum(removes)
+                if row.count <= 0:
+                    session.delete(row)
+                    continue
+                lost_extreme = removes and (row.min_price is None or row.max_price is None
+                                            or min(removes) <= row.min_price or max(removes) >= row.max_price)
+                if lost_extreme:
+                    # An extreme may have gone: re-read it (rows changed in this flush are not in the table yet)
+                    low, high = cls._group_extremes(session, key, touched_ids)
+                    candidates_low = [v for v in (low, *adds) if v is not None]
+                    candidates_high = [v for v in (high, *adds) if v is not None]
+                    row.min_price = min(candidates_low) if candidates_low else None
+                    row.max_price = max(candidates_high) if candidates_high else None
+                elif adds:
+                    row.min_price = min(adds) if row.min_price is None else min(row.min_price, *adds)
+                    row.max_price = max(adds) if row.max_price is None else max(row.max_price, *adds)
+                cls._update_median(row, adds, removes)
+                row.updated_at = datetime.utcnow()
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every rollup from manual_prices (one full scan, for backfills). Held prices stay out."""
+        cls.query.delete()
+        cls.apply(db.session, added=ManualPrice.query.filter(ManualPrice.is_held.is_(False)).all())
+        db.session.commit()
+        return cls.query.count()
+
+
+_ROLLUP_FIELDS = ('commodity_id', 'province_id', 'province_name', 'price', 'price_type', 'price_date')
+
+
+def _rollup_values(item):
+    if isinstance(item, dict):
+        values = {field: item.get(field) for field in _ROLLUP_FIELDS + ('id',)}
+    else:
+        values = {field: getattr(item, field) for field in _ROLLUP_FIELDS + ('id',)}
+    if values['price'] is not None:
+        values['price'] = float(values['price'])
+    return values
+
+
+class PriceAnomaly(db.Model):
+    """A reported price that scored as an outlier against recent prices."""
+
+    __tablename__ = 'price_anomalies'
+
+    id = db.Column(db.Integer, primary_key=True)
+    price_id = db.Column(db.Integer, db.ForeignKey('manual_prices.id', ondelete='SET NULL'), index=True)
+    commodity_id = db.Column(db.Integer, nullable=False, index=True)
+    province_id = db.Column(db.Integer)
+    price_type = db.Column(db.String(20))
+    source = db.Column(db.String(50))
+    price = db.Column(db.Float, nullable=False)
+
+    # Robust statistics at insert time
+    score = db.Column(db.Float, nullable=False)  # |price - median| / (1.4826 * MAD)
+    median = db.Column(db.Float)
+    mad = db.Column(db.Float)
+    samples = db.Column(db.Integer)
+    scope = db.Column(db.String(10))  # province, national
+
+    action = db.Column(db.String(10), nullable=False)  # flag, hold
+    status = db.Column(db.String(10), nullable=False, default='open', index=True)  # open, approved, rejected
+    resolved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    resolved_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    manual_price = db.relationship('ManualPrice', backref=db.backref('anomalies', lazy='dynamic'))
+
+    def to_dict(self):
+        """Convert model to dictionary for API response."""
+        return {
+            'id': self.id,
+            'price_id': self.price_id,
+            'commodity_id': self.commodity_id,
+            'province_id': self.province_id,
+            'price_type': self.price_type,
+            'source': self.source,
+            'price': self.price,
+            'score': self.score,
+            'median': self.median,
+            'mad': self.mad,
+            'samples': self.samples,
+            'scope': self.scope,
+            'action': self.action,
+            'status': self.status,
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+_PENDING_KEY = 'price_anomaly_pending'
+
+
+def _screened(obj):
+    return ((obj.source or 'manual') in Config.PRICE_ANOMALY_SOURCES
+            and obj.price is not None and obj.commodity_id is not None)
+
+
+def _recent_prices(commodity_id, province_id, price_type, limit):
+    """
+    The last ``limit`` accepted prices of a validator group, oldest first.
+
+    Seeds the validator once per group; province None reads every province
+    (the national window). Held prices stay out.
+    """
+    query = db.session.query(ManualPrice.price).filter(
+        ManualPrice.commodity_id == commodity_id,
+        ManualPrice.is_held.is_(False),
+        func.coalesce(ManualPrice.price_type, 'retail') == price_type
+    )
+    if province_id is not None:
+        query = query.filter(ManualPrice.province_id == province_id)
+    with db.session.no_autoflush:
+        rows = query.order_by(ManualPrice.price_date.desc(), ManualPrice.id.desc()).limit(limit).all()
+    return [float(row[0]) for row in reversed(rows)]
+
+
+def get_validator():
+    """The process-wide price validator, configured from Config and seeded from manual_prices."""
+    from app.utils.price_anomaly import get_price_validator
+    return get_price_validator(Config.PRICE_ANOMALY_WINDOW, Config.PRICE_ANOMALY_MIN_SAMPLES,
+                               Config.PRICE_ANOMALY_FLAG_Z, Config.PRICE_ANOMALY_HOLD_Z,
+                               loader=_recent_prices)
+
+
+def record_after_commit(session, prices):
+    """Queue accepted prices for the validator; they are recorded only if the transaction commits."""
+    pending = [(p.commodity_id, p.province_id, p.price_type or 'retail', float(p.price))
+               for p in prices if _screened(p)]
+    if pending and Config.PRICE_ANOMALY_ENABLED:
+        session.info.setdefault(_PENDING_KEY, []).extend(pending)
+
+
+@event.listens_for(Session, 'after_commit')
+def _record_committed_prices(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        validator = get_validator()
+        for commodity_id, province_id, price_type, price in pending:
+            validator.record(commodity_id, province_id, price_type, price)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_prices(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def screen_prices(prices):
+    """
+    Score new ManualPrice objects and build PriceAnomaly rows for outliers.
+
+    Held prices get ``is_held=True``, which keeps them out of reads, the
+    rollups and the validator's statistics until an admin approves them.
+    Nothing is recorded in the validator here; callers pass accepted
+    prices to record_after_commit().
+
+    Returns:
+        tuple: (ids of held objects, [(price, PriceAnomaly), ...]); the
+        anomalies are not yet linked to their price or added to a session
+    """
+    held, anomalies = set(), []
+    if not Config.PRICE_ANOMALY_ENABLED:
+        return held, anomalies
+
+    validator = get_validator()
+    for obj in prices:
+        if not _screened(obj):
+            continue
+        price_type = obj.price_type or 'retail'
+        action, stats = validator.check(obj.commodity_id, obj.province_id, price_type, float(obj.price),
+                                        record=False)
+        if action == 'ok':
+            continue
+        if action == 'hold':
+            obj.is_held = True
+            held.add(id(obj))
+        anomalies.append((obj, PriceAnomaly(
+            commodity_id=obj.commodity_id, province_id=obj.province_id, price_type=price_type,
+            source=obj.source or 'manual', price=float(obj.price), action=action, status='open', **stats
+        )))
+    return held, anomalies
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_manual_price_rollups(session, flush_context, instances):
+    """Screen new ManualPrice rows and keep ManualPriceRollup in step with inserts, deletes and edits."""
+    new = [obj for obj in session.new if isinstance(obj, ManualPrice)]
+    held, anomalies = screen_prices(new)
+    for obj, anomaly in anomalies:
+        anomaly.manual_price = obj
+        session.add(anomaly)
+    added = [obj for obj in new if id(obj) not in held]
+    record_after_commit(session, added)
+
+    deleted = [obj for obj in session.deleted if isinstance(obj, ManualPrice)]
+    dirty = [obj for obj in session.dirty if isinstance(obj, ManualPrice) and session.is_modified(obj)]
+    removed = [obj for obj in deleted if not obj.is_held]
+
+    for obj in dirty:
+        # Held rows are outside the rollups; releasing one is applied by the approve path
+        if obj.is_held or inspect(obj).attrs['is_held'].history.deleted:
+            continue
+        state = inspect(obj)
+        old, changed = {'id': obj.id}, False
+        for field in _ROLLUP_FIELDS:
+            history = state.attrs[field].history
+            if history.deleted:
+                old[field] = history.deleted[0]
+                changed = True
+            else:
+                old[field] = getattr(obj, field)
+        if changed:
+            removed.append(old)
+            added.append(obj)
+
+    if added or removed:
+        ManualPriceRollup.apply(session, added=added, removed=removed)
@@ -1,11 +1,16 @@
 """Admin API routes for managing commodities, prices, and users."""
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 from functools import wraps
+import math
+import os
 from datetime import datetime
 
 from app import db
 from app.models import User, Commodity, ManualPrice, AdminAuditLog
+from app.models.price_manual import ManualPriceRollup, PriceAnomaly, get_validator, record_after_commit
+from app.ml_models.model_loader import ModelLoader
+from app.utils.drift_monitor import drift_report, reset_monitors
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -121,6 +126,7 @@ def get_dashboard_stats():
         'active_commodities': Commodity.query.filter_by(is_active=True).count(),
         'total_manual_prices': ManualPrice.query.count(),
         'unverified_prices': ManualPrice.query.filter_by(is_verified=False).count(),
+        'held_prices': ManualPrice.query.filter_by(is_held=True).count(),
         'total_users': User.query.count(),
         'admin_users': User.query.filter_by(role='admin').count(),
         'recent_activity': AdminAuditLog.get_activity_summary(days=7)
@@ -442,6 +448,160 @@ def delete_manual_price(id):
     })
 
 
+@admin_bp.route('/prices/rollups', methods=['GET'])
+@admin_required
+def list_price_rollups():
+    """Daily or weekly price aggregates, newest first, paged by period_start."""
+    period = request.args.get('period', 'day')
+    commodity_id = request.args.get('commodity_id', type=int)
+    province_id = request.args.get('province_id', type=int)
+    scope = request.args.get('scope', 'province' if province_id else 'national')
+    price_type = request.args.get('price_type')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    before = request.args.get('before')  # "period_start,id" cursor from the previous page
+    limit = min(request.args.get('limit', 90, type=int), 1000)
+    
+    if period not in ManualPriceRollup.PERIODS or scope not in ('province', 'national'):
+        return jsonify({
+            'success': False,
+            'error': 'period must be day or week, scope must be province or national'
+        }), 400
+    
+    try:
+        query = ManualPriceRollup.query.filter(
+            ManualPriceRollup.period == period,
+            ManualPriceRollup.scope == scope
+        )
+        if commodity_id:
+            query = query.filter(ManualPriceRollup.commodity_id == commodity_id)
+        if province_id:
+            query = query.filter(ManualPriceRollup.province_id == province_id)
+        if price_type:
+            query = query.filter(ManualPriceRollup.price_type == price_type)
+        if start:
+            query = query.filter(ManualPriceRollup.period_start >= datetime.strptime(start, '%Y-%m-%d').date())
+        if end:
+            query = query.filter(ManualPriceRollup.period_start <= datetime.strptime(end, '%Y-%m-%d').date())
+        if before:
+            before_date, before_id = before.split(',')
+            before_date = datetime.strptime(before_date, '%Y-%m-%d').date()
+            query = query.filter(db.or_(
+                ManualPriceRollup.period_start < before_date,
+                db.and_(ManualPriceRollup.period_start == before_date, ManualPriceRollup.id < int(before_id))
+            ))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Dates must be YYYY-MM-DD and before must be "YYYY-MM-DD,id"'
+        }), 400
+    
+    rows = query.order_by(ManualPriceRollup.period_start.desc(), ManualPriceRollup.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return jsonify({
+        'success': True,
+        'rollups': [r.to_dict() for r in rows],
+        'next_before': f"{rows[-1].period_start.isoformat()},{rows[-1].id}" if has_more and rows else None
+    })
+
+
+@admin_bp.route('/prices/rollups/rebuild', methods=['POST'])
+@admin_required
+def rebuild_price_rollups():
+    """Recompute all price rollups from the raw prices (backfill)."""
+    count = ManualPriceRollup.rebuild()
+    
+    log_admin_action('REBUILD', 'manual_price_rollups', notes=f"{count} rollup rows")
+    
+    return jsonify({
+        'success': True,
+        'rollups': count
+    })
+
+
+@admin_bp.route('/prices/anomalies', methods=['GET'])
+@admin_required
+def list_price_anomalies():
+    """List prices flagged or held by the anomaly validator."""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    status = request.args.get('status', 'open')
+    action = request.args.get('action')
+    commodity_id = request.args.get('commodity_id', type=int)
+    
+    query = PriceAnomaly.query.filter(PriceAnomaly.status == status)
+    if action:
+        query = query.filter(PriceAnomaly.action == action)
+    if commodity_id:
+        query = query.filter(PriceAnomaly.commodity_id == commodity_id)
+    
+    pagination = query.order_by(PriceAnomaly.created_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'success': True,
+        'anomalies': [a.to_dict() for a in pagination.items],
+        'validator': get_validator().status(),
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    })
+
+
+@admin_bp.route('/prices/anomalies/<int:id>/resolve', methods=['POST'])
+@admin_required
+def resolve_price_anomaly(id):
+    """Approve (verify and release) or reject (delete) a flagged or held price."""
+    anomaly = PriceAnomaly.query.get_or_404(id)
+    data = request.get_json() or {}
+    decision = data.get('decision')
+    
+    if decision not in ('approve', 'reject'):
+        return jsonify({
+            'success': False,
+            'error': 'decision must be approve or reject'
+        }), 400
+    if anomaly.status != 'open':
+        return jsonify({
+            'success': False,
+            'error': f'Anomaly already {anomaly.status}'
+        }), 409
+    
+    price = anomaly.manual_price
+    was_held = anomaly.action == 'hold'
+    anomaly.status = 'approved' if decision == 'approve' else 'rejected'
+    anomaly.resolved_by = g.current_user.id
+    anomaly.resolved_at = datetime.utcnow()
+    
+    if price is not None:
+        if decision == 'approve':
+            price.is_verified = True
+            price.verified_by = g.current_user.id
+            price.verified_at = datetime.utcnow()
+            if was_held and price.is_held:
+                # Held prices were kept out of reads, the rollups and the validator until now
+                price.is_held = False
+                ManualPriceRollup.apply(db.session, added=[price])
+                record_after_commit(db.session, [price])
+        else:
+            db.session.delete(price)
+    
+    db.session.commit()
+    
+    log_admin_action(decision.upper(), 'price_anomalies', id, new_values=anomaly.to_dict())
+    
+    return jsonify({
+        'success': True,
+        'anomaly': anomaly.to_dict()
+    })
+
+
 # ========== AUDIT LOG ==========
 @admin_bp.route('/audit-log', methods=['GET'])
 @admin_required
@@ -478,6 +638,137 @@ def get_audit_log():
     })
 
 
+# ========== ML MODELS ==========
+@admin_bp.route('/models', methods=['GET'])
+@admin_required
+def get_model_registry():
+    """Get active model versions from the registry."""
+    return jsonify({
+        'success': True,
+        'registry': ModelLoader.get_status()
+    })
+
+
+@admin_bp.route('/models/refresh', methods=['POST'])
+@admin_required
+def refresh_model_registry():
+    """Re-read the model manifest and hot-swap changed models now."""
+    swapped = ModelLoader.refresh()
+    
+    log_admin_action('REFRESH', 'ml_models', notes=f"Swapped: {', '.join(swapped) or 'none'}")
+    
+    return jsonify({
+        'success': True,
+        'swapped': swapped,
+        'registry': ModelLoader.get_status()
+    })
+
+
+@admin_bp.route('/models/shadow', methods=['GET'])
+@admin_required
+def get_shadow_report():
+    """Agreement and latency of shadow candidates against the primary models (this worker only)."""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'shadow': ModelLoader.get_shadow().report()
+    })
+
+
+@admin_bp.route('/models/shadow', methods=['POST'])
+@admin_required
+def start_shadow():
+    """Start shadowing a model with a candidate artifact from the models directory."""
+    data = request.get_json() or {}
+    name = data.get('model')
+    candidate = data.get('candidate')
+    
+    if not name or not candidate:
+        return jsonify({
+            'success': False,
+            'error': 'model and candidate are required'
+        }), 400
+    
+    if name not in current_app.config['MODEL_PATHS']:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown model: {name}'
+        }), 400
+    
+    sample_rate = None
+    if 'sample_rate' in data:
+        try:
+            sample_rate = float(data['sample_rate'])
+        except (TypeError, ValueError):
+            sample_rate = float('nan')
+        if not math.isfinite(sample_rate):
+            return jsonify({
+                'success': False,
+                'error': 'sample_rate must be a number between 0 and 1'
+            }), 400
+        sample_rate = max(0.0, min(sample_rate, 1.0))
+    
+    shadow = ModelLoader.get_shadow()
+    try:
+        # Only artifacts inside the models directory may be loaded
+        shadow.set_candidate(name, os.path.basename(candidate))
+    except FileNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    
+    if sample_rate is not None:
+        shadow.sample_rate = sample_rate
+    
+    log_admin_action('SHADOW_START', 'ml_models',
+                     new_values={'model': name, 'candidate': candidate, 'sample_rate': shadow.sample_rate})
+    
+    return jsonify({
+        'success': True,
+        'shadow': shadow.report()
+    })
+
+
+@admin_bp.route('/models/shadow/<name>', methods=['DELETE'])
+@admin_required
+def stop_shadow(name):
+    """Stop shadowing a model."""
+    ModelLoader.get_shadow().remove_candidate(name)
+    
+    log_admin_action('SHADOW_STOP', 'ml_models', notes=name)
+    
+    return jsonify({
+        'success': True,
+        'message': f'Shadow for {name} stopped'
+    })
+
+
+@admin_bp.route('/drift', methods=['GET'])
+@admin_required
+def get_input_drift():
+    """Compare recent prediction inputs with the training distributions (this worker only)."""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'monitors': drift_report()
+    })
+
+
+@admin_bp.route('/drift/reset', methods=['POST'])
+@admin_required
+def reset_input_drift():
+    """Reset the drift histograms, e.g. after deploying a retrained model."""
+    reset_monitors()
+    
+    log_admin_action('RESET', 'drift_monitor')
+    
+    return jsonify({
+        'success': True,
+        'message': 'Drift monitors reset'
+    })
+
+
 # ========== CATEGORIES ==========
 @admin_bp.route('/categories', methods=['GET'])
 @admin_required
@@ -4,11 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db, limiter
 from app.models.npk_reading import NpkReading
 from app.services.analysis_service import AnalysisService
-from werkzeug.utils import secure_filename
-from inference_sdk import InferenceHTTPClient
 import base64
-import os
-import uuid
 
 analysis_bp = Blueprint('analysis', __name__)
 
@@ -51,7 +47,8 @@ def analyze_bwd():
             'avg_hue_value': result['avg_hue'],
             'confidence_percent': result['confidence'],
             'disease_analysis': result['disease_analysis'],
-            'recommendation': result['recommendation']
+            'recommendation': result['recommendation'],
+            'model_version': result['model_version']
         }), 200
         
     except Exception as e:
@@ -182,40 +179,13 @@ def analyze_disease_advanced():
                 'error': 'Invalid file type. Only PNG, JPG, JPEG allowed.'
             }), 400
         
-        # Save temporary file
-        temp_folder = current_app.config.get('TEMP_IMAGE_FOLDER', 'uploads/temp_images')
-        os.makedirs(temp_folder, exist_ok=True)
+        result, cache_match = AnalysisService.detect_disease_remote(file.read())
         
-        filename = secure_filename(f"{uuid.uuid4()}.jpg")
-        temp_path = os.path.join(temp_folder, filename)
-        file.save(temp_path)
-        
-        try:
-            # Initialize Roboflow client
-            roboflow_api_key = os.environ.get('ROBOFLOW_API_KEY', 'your_roboflow_key_here')
-            client = InferenceHTTPClient(
-                api_url="https://serverless.roboflow.com",
-                api_key=roboflow_api_key
-            )
-            
-            # Run workflow
-            result = client.run_workflow(
-                workspace_name="andriyanto39",
-                workflow_id="detect-and-classify",
-                images={"image": temp_path},
-                use_cache=True
-            )
-            
-            return jsonify({
-                'success': True,
-                'data': result
-            }), 200
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                current_app.logger.info(f"Temporary file removed: {temp_path}")
+        return jsonify({
+            'success': True,
+            'data': result,
+            'cached': cache_match is not None
+        }), 200
         
     except Exception as e:
         current_app.logger.error(f"Error in /disease-advanced: {e}", exc_info=True)
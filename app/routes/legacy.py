@@ -1,9 +1,9 @@
 """Legacy routes for backward compatibility with old frontend."""
-from flask import Blueprint, request, jsonify, send_from_directory, current_app, render_template
+from flask import Blueprint, request, jsonify, send_from_directory, current_app, render_template, Response, stream_with_context
 from werkzeug.utils import secure_filename
+import json
 import os
-import uuid
-from inference_sdk import InferenceHTTPClient
+import time
 from app.services.analysis_service import AnalysisService
 from app.services.recommendation_service import RecommendationService
 from app.services.knowledge_service import KnowledgeService
@@ -11,6 +11,7 @@ from app.services.market_service import MarketService
 from app.services.ml_service import MLService
 from app.services.chatbot_service import ChatbotService
 from app.models.npk_reading import NpkReading
+from app.utils.downsample import parse_max_points
 from app import db
 
 legacy_bp = Blueprint('legacy', __name__)
@@ -57,7 +58,8 @@ def analyze_bwd_endpoint():
             'avg_hue_value': result['avg_hue'],
             'confidence_percent': result['confidence'],
             'disease_analysis': result.get('disease_analysis', {}),
-            'recommendation': result.get('recommendation', '')
+            'recommendation': result.get('recommendation', ''),
+            'model_version': result.get('model_version')
         }), 200
             
     except Exception as e:
@@ -65,6 +67,49 @@ def analyze_bwd_endpoint():
         return jsonify({'error': 'Kesalahan internal saat menganalisis gambar.'}), 500
 
 
+@legacy_bp.route('/analyze-batch', methods=['POST'])
+def analyze_bwd_batch_endpoint():
+    """
+    Multi-image BWD analysis, streamed as NDJSON.
+    
+    Each uploaded file (form field 'files') is analyzed on the leaf process
+    pool; one JSON line is emitted per image as it finishes, followed by a
+    summary line with total timing.
+    """
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'error': 'Tidak ada file'}), 400
+
+    max_files = current_app.config.get('LEAF_BATCH_MAX_FILES', 50)
+    if len(files) > max_files:
+        return jsonify({'success': False, 'error': f'Maksimal {max_files} file per permintaan'}), 400
+
+    images = [(f.filename, f.read()) for f in files]
+
+    def generate():
+        start = time.perf_counter()
+        succeeded = 0
+        try:
+            for item in analysis_service.analyze_leaf_images(images):
+                succeeded += 1 if item['success'] else 0
+                yield json.dumps(item) + '\n'
+        except Exception as e:
+            current_app.logger.error(f"Error in /analyze-batch: {e}", exc_info=True)
+            yield json.dumps({'done': True, 'success': False, 'error': 'Kesalahan internal saat menganalisis gambar.'}) + '\n'
+            return
+
+        yield json.dumps({
+            'done': True,
+            'success': True,
+            'total_images': len(images),
+            'succeeded': succeeded,
+            'failed': len(images) - succeeded,
+            'total_ms': round((time.perf_counter() - start) * 1000, 2)
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @legacy_bp.route('/recommendation', methods=['POST'])
 def recommendation_endpoint():
     """Fertilizer recommendation endpoint - supports multiple input formats."""
@@ -455,8 +500,12 @@ def predict_yield_endpoint():
     """Legacy yield prediction endpoint."""
     try:
         data = request.get_json()
-        prediction = ml_service.predict_yield(data)
-        return jsonify({'success': True, 'predicted_yield_ton_ha': prediction})
+        prediction, model_version = ml_service.predict_yield_with_version(data)
+        return jsonify({
+            'success': True,
+            'predicted_yield_ton_ha': prediction,
+            'model_version': model_version
+        })
     except Exception as e:
         current_app.logger.error(f"Error di /predict-yield: {e}", exc_info=True)
         return jsonify({'success': False, 'error': 'Kesalahan internal saat membuat prediksi panen.'}), 500
@@ -514,7 +563,13 @@ def generate_yield_plan_endpoint():
         if target_yield <= 0:
             return jsonify({'success': False, 'error': 'Target hasil panen harus lebih dari 0.'}), 400
         
-        plan = ml_service.generate_yield_plan(commodity=commodity, target_yield_ton_ha=target_yield)
+        try:
+            neighbors = int(data.get('neighbors', 0))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'neighbors harus berupa bilangan bulat.'}), 400
+        neighbors = max(0, min(neighbors, 50))
+        
+        plan = ml_service.generate_yield_plan(commodity=commodity, target_yield_ton_ha=target_yield, neighbors=neighbors)
         if not plan:
             return jsonify({'success': False, 'error': 'Tidak ditemukan data yang cocok untuk target panen tersebut.'}), 404
         return jsonify({'success': True, 'plan': plan})
@@ -576,36 +631,19 @@ def analyze_disease_advanced_endpoint():
     if file.filename == '' or not allowed_file(file.filename):
         return jsonify({'success': False, 'error': 'Tipe file tidak valid.'}), 400
 
-    temp_path = None
     try:
-        filename = secure_filename(f"{uuid.uuid4()}.jpg")
-        temp_path = os.path.join(TEMP_IMAGE_FOLDER, filename)
-        file.save(temp_path)
-        current_app.logger.info(f"File sementara disimpan di: {temp_path}")
-
-        client = InferenceHTTPClient(
-            api_url="https://serverless.roboflow.com",
-            api_key=os.environ.get('ROBOFLOW_API_KEY', 'your_roboflow_key_here')
-        )
-
         current_app.logger.info("Menjalankan workflow Roboflow...")
-        result = client.run_workflow(
-            workspace_name="andriyanto39",
-            workflow_id="detect-and-classify",
-            images={"image": temp_path},
-            use_cache=True
-        )
-        current_app.logger.info("Workflow Roboflow berhasil dijalankan.")
+        result, cache_match = analysis_service.detect_disease_remote(file.read())
+        if cache_match:
+            current_app.logger.info(f"Hasil deteksi diambil dari cache ({cache_match}).")
+        else:
+            current_app.logger.info("Workflow Roboflow berhasil dijalankan.")
         
-        return jsonify({'success': True, 'data': result})
+        return jsonify({'success': True, 'data': result, 'cached': cache_match is not None})
 
     except Exception as e:
         current_app.logger.error(f"Error di /analyze-disease-advanced: {e}", exc_info=True)
         return jsonify({'success': False, 'error': 'Kesalahan internal saat berkomunikasi dengan layanan AI.'}), 500
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-            current_app.logger.info(f"File sementara dihapus: {temp_path}")
 
 
 @legacy_bp.route('/get-fruit-list', methods=['GET'])
@@ -665,8 +703,12 @@ def get_historical_prices_endpoint():
         
         if not commodity:
             return jsonify({'success': False, 'error': 'Komoditas tidak dipilih'}), 400
+        try:
+            max_points = parse_max_points(data.get('points'))  # Opsional: jumlah titik grafik (LTTB)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Parameter points harus bilangan bulat positif'}), 400
             
-        history = market_service.get_historical_prices(commodity, days=days)
+        history = market_service.get_historical_prices(commodity, days=days, max_points=max_points)
         if not history:
              return jsonify({'success': False, 'error': 'Data tidak ditemukan'}), 404
              
@@ -2,10 +2,18 @@
 from flask import Blueprint, request, jsonify
 from app import limiter
 from app.services.market_service import MarketService
+from app.utils.downsample import parse_max_points
+from app.utils.price_forecast import init_price_forecasts
 
 market_bp = Blueprint('market', __name__)
 
 
+@market_bp.record_once
+def _start_price_forecasts(state):
+    """Build and refresh the batch price forecasts off the request path."""
+    init_price_forecasts(state.app.config.get('PRICE_FORECAST_REFRESH_SECONDS', 0))
+
+
 @market_bp.route('/prices', methods=['POST'])
 @limiter.limit("50 per hour")
 def get_prices():
@@ -74,10 +82,18 @@ def get_historical_prices():
             }), 400
         
         time_range = int(data.get('range', 30))
+        try:
+            max_points = parse_max_points(data.get('points'))  # chart width, LTTB-downsampled
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         historical_data = MarketService.get_historical_prices(
             data['commodity'],
-            time_range
+            time_range,
+            max_points
         )
         
         if not historical_data:
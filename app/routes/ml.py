@@ -2,10 +2,17 @@
 from flask import Blueprint, request, jsonify
 from app import limiter
 from app.services.ml_service import MLService
+from app.utils.drift_monitor import init_drift_monitors
 
 ml_bp = Blueprint('ml', __name__)
 
 
+@ml_bp.record_once
+def _build_drift_references(state):
+    """Build the drift reference histograms when the blueprint is registered."""
+    init_drift_monitors(state.app.config)
+
+
 @ml_bp.route('/recommend-crop', methods=['POST'])
 @limiter.limit("30 per hour")
 def recommend_crop():
@@ -51,11 +58,12 @@ def predict_yield():
                 'required': required_fields
             }), 400
         
-        prediction = MLService.predict_yield(data)
+        prediction, model_version = MLService.predict_yield_with_version(data)
         
         return jsonify({
             'success': True,
-            'predicted_yield_ton_ha': prediction
+            'predicted_yield_ton_ha': prediction,
+            'model_version': model_version
         }), 200
         
     except Exception as e:
@@ -88,7 +96,8 @@ def predict_yield_advanced():
             'predicted_yield_ton_ha': result['predicted_yield_ton_ha'],
             'feature_importances': result['feature_importances'],
             'shap_values': result['shap_values'],
-            'base_value': result['base_value']
+            'base_value': result['base_value'],
+            'model_version': result['model_version']
         }), 200
         
     except Exception as e:
@@ -99,6 +108,42 @@ def predict_yield_advanced():
         }), 500
 
 
+@ml_bp.route('/yield-sensitivity', methods=['POST'])
+@limiter.limit("600 per hour")
+def yield_sensitivity():
+    """What-if yield curves from precomputed partial-dependence grids (no model call)."""
+    try:
+        data = request.get_json() or {}
+        
+        points = data.get('points')
+        points = max(2, min(int(points), 200)) if points else None
+        result = MLService.yield_sensitivity(data, vary=data.get('vary'), points=points)
+        
+        if result is None:
+            return jsonify({
+                'success': False,
+                'error': 'Sensitivity grids not built',
+                'message': 'Run python -m app.ml_models.sensitivity'
+            }), 503
+        
+        return jsonify({
+            'success': True,
+            **result
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Sensitivity lookup failed',
+            'message': str(e)
+        }), 500
+
+
 @ml_bp.route('/generate-yield-plan', methods=['POST'])
 @limiter.limit("20 per hour")
 def generate_yield_plan():
@@ -112,9 +157,18 @@ def generate_yield_plan():
                 'error': 'Commodity and target_yield are required'
             }), 400
         
+        try:
+            neighbors = int(data.get('neighbors', 0))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'neighbors must be an integer'
+            }), 400
+        
         plan = MLService.generate_yield_plan(
             data['commodity'],
-            float(data['target_yield'])
+            float(data['target_yield']),
+            neighbors=max(0, min(neighbors, 50))
         )
         
         if not plan:
@@ -136,6 +190,43 @@ def generate_yield_plan():
         }), 500
 
 
+@ml_bp.route('/similar-conditions', methods=['POST'])
+@limiter.limit("30 per hour")
+def similar_conditions():
+    """Find dataset conditions similar to the farmer's that reached the target yield."""
+    try:
+        data = request.get_json()
+        
+        if not data.get('target_yield'):
+            return jsonify({'success': False, 'error': 'target_yield is required'}), 400
+        
+        k = max(1, min(int(data.get('k', 5)), 50))
+        result = MLService.find_similar_conditions(data, float(data['target_yield']), k)
+        
+        if not result:
+            return jsonify({
+                'success': False,
+                'error': 'No rows reached the target yield'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'result': result
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Similar condition search failed',
+            'message': str(e)
+        }), 500
+
+
 @ml_bp.route('/calculate-fertilizer-bags', methods=['POST'])
 @limiter.limit("30 per hour")
 def calculate_fertilizer_bags():
@@ -199,7 +290,8 @@ def predict_success():
         return jsonify({
             'success': True,
             'status': result['status'],
-            'probability_of_success': result['probability_of_success']
+            'probability_of_success': result['probability_of_success'],
+            'model_version': result['model_version']
         }), 200
         
     except Exception as e:
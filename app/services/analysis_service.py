@@ -1,12 +1,70 @@
 """Analysis service for leaf and soil analysis."""
-import cv2
+import base64
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
+from inference_sdk import InferenceHTTPClient
 from app.ml_models.model_loader import ModelLoader
+from app.utils.image_pipeline import (
+    extract_leaf_color_stats, timed_extract_leaf_color_stats, DEFAULT_MAX_SIDE
+)
+from app.utils.result_cache import ImageResultCache
+
+_batch_pool = None
+_batch_pool_size = None
+_batch_pool_lock = threading.Lock()
+_result_caches = {}
+_result_caches_lock = threading.Lock()
 
 
 class AnalysisService:
     """Service for analyzing leaf images and NPK values."""
     
+    ROBOFLOW_API_URL = "https://serverless.roboflow.com"
+    ROBOFLOW_WORKSPACE = "andriyanto39"
+    ROBOFLOW_WORKFLOW_ID = "detect-and-classify"
+    
+    @staticmethod
+    def get_result_cache(name):
+        """
+        Get the shared image result cache for 'bwd' or 'disease'.
+        
+        Size, TTL and near-duplicate distance come from IMAGE_CACHE_* config.
+        """
+        with _result_caches_lock:
+            cache = _result_caches.get(name)
+            if cache is None:
+                try:
+                    from flask import current_app
+                    config = current_app.config
+                except RuntimeError:
+                    config = {}
+                cache = ImageResultCache(
+                    max_entries=config.get('IMAGE_CACHE_MAX_ENTRIES', 512),
+                    ttl=config.get('IMAGE_CACHE_TTL', 3600),
+                    max_distance=config.get('IMAGE_CACHE_PHASH_DISTANCE', 0)
+                )
+                _result_caches[name] = cache
+            return cache
+    
+    @staticmethod
+    def _bwd_cache_tag():
+        """BWD results depend on the model version and decode resolution."""
+        return f"{ModelLoader.get_model_version('bwd')}:{AnalysisService._leaf_max_side()}"
+    
+    @staticmethod
+    def _leaf_max_side():
+        """Target long side for leaf decoding (LEAF_ANALYSIS_MAX_SIDE, 0 = full size)."""
+        try:
+            from flask import current_app
+            return current_app.config.get('LEAF_ANALYSIS_MAX_SIDE', DEFAULT_MAX_SIDE)
+        except RuntimeError:
+            return DEFAULT_MAX_SIDE
+    
     @staticmethod
     def analyze_leaf_image(image_data):
         """
@@ -18,50 +76,47 @@ class AnalysisService:
         Returns:
             dict: Analysis results with score, hue, and confidence
         """
+        cache = AnalysisService.get_result_cache('bwd')
+        tag = AnalysisService._bwd_cache_tag()
+        cached, _, fingerprint = cache.lookup(image_data, tag)
+        if cached is not None:
+            return cached
+
         try:
-            bwd_model = ModelLoader.get_model('bwd')
-            
-            # Decode image
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                return None
-            
-            # Convert to HSV color space
-            hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Create mask for green color (leaves)
-            lower_green = np.array([30, 40, 40])
-            upper_green = np.array([90, 255, 255])
-            mask = cv2.inRange(hsv_image, lower_green, upper_green)
-            
-            # Check if any green pixels found
-            if cv2.countNonZero(mask) == 0:
-                return None
+            # Downscaled decode + leaf ROI + single-pass HSV histogram
+            stats = extract_leaf_color_stats(image_data, AnalysisService._leaf_max_side())
+        except Exception as e:
+            raise RuntimeError(f"Leaf analysis failed: {str(e)}")
+
+        result = AnalysisService.score_leaf_stats(stats)
+        if result is not None:
+            cache.put(fingerprint, result, tag)
+        return result
+
+    @staticmethod
+    def score_leaf_stats(stats):
+        """
+        Turn leaf colour statistics into a BWD score and spot analysis.
+        
+        Args:
+            stats: Output of image_pipeline.extract_leaf_color_stats
             
-            # Calculate average hue value
-            avg_hue = cv2.mean(hsv_image, mask=mask)[0]
+        Returns:
+            dict: Analysis results, or None if no leaf area was detected
+        """
+        if stats is None:
+            return None
+
+        try:
+            bwd_model, model_version = ModelLoader.get_model_with_version('bwd')
+
+            avg_hue = stats['avg_hue']
             
             # --- Enhanced Analysis: Spot Detection (Brown & White) ---
-            
-            # Brown spot detection (approximate range for brown/rust)
-            # Brown in HSV is typically Orange/Red with low saturation/value or specific ranges
-            # Here we use a range that covers brownish colors
-            lower_brown = np.array([10, 100, 20])
-            upper_brown = np.array([20, 255, 200])
-            brown_mask = cv2.inRange(hsv_image, lower_brown, upper_brown)
-            brown_pixels = cv2.countNonZero(brown_mask)
-            
-            # White spot detection (low saturation, high value)
-            lower_white = np.array([0, 0, 200])
-            upper_white = np.array([180, 20, 255])
-            white_mask = cv2.inRange(hsv_image, lower_white, upper_white)
-            white_pixels = cv2.countNonZero(white_mask)
-            
-            total_pixels = cv2.countNonZero(mask)
-            brown_ratio = (brown_pixels / total_pixels) * 100 if total_pixels > 0 else 0
-            white_ratio = (white_pixels / total_pixels) * 100 if total_pixels > 0 else 0
+            # Spots are counted inside the leaf ROI only, relative to the green area
+            total_pixels = stats['green_pixels']
+            brown_ratio = (stats['brown_pixels'] / total_pixels) * 100 if total_pixels > 0 else 0
+            white_ratio = (stats['white_pixels'] / total_pixels) * 100 if total_pixels > 0 else 0
             
             # Determine Disease/Condition based on spots
             disease_analysis = {
@@ -133,13 +188,159 @@ class AnalysisService:
                 'avg_hue': round(avg_hue, 2),
                 'confidence': round(confidence, 2),
                 'disease_analysis': disease_analysis,
-                'recommendation': recommendation
+                'recommendation': recommendation,
+                'model_version': model_version
             }
             
         except Exception as e:
             raise RuntimeError(f"Leaf analysis failed: {str(e)}")
 
     
+    @staticmethod
+    def _get_batch_pool(max_workers):
+        """
+        Get the shared process pool for batch leaf analysis.
+
+        The pool is keyed by size: asking for a different ``max_workers``
+        replaces it (work already submitted to the old pool still finishes).
+        """
+        global _batch_pool, _batch_pool_size
+        with _batch_pool_lock:
+            if _batch_pool is not None and _batch_pool_size != max_workers:
+                _batch_pool.shutdown(wait=False)
+                _batch_pool = None
+            if _batch_pool is None:
+                _batch_pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                _batch_pool_size = max_workers
+            return _batch_pool
+
+    @staticmethod
+    def _discard_batch_pool(pool):
+        """Drop a broken pool so the next _get_batch_pool call starts a fresh one."""
+        global _batch_pool, _batch_pool_size
+        with _batch_pool_lock:
+            if _batch_pool is pool:
+                _batch_pool, _batch_pool_size = None, None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def analyze_leaf_images(images, max_workers=None):
+        """
+        Analyze several leaf images on a bounded process pool.
+        
+        Decoding and colour extraction run in worker processes; BWD scoring
+        runs here, where the app context and loaded model are available.
+        
+        Args:
+            images: List of (filename, image bytes)
+            max_workers: Pool size (default LEAF_BATCH_WORKERS)
+            
+        Yields:
+            dict: Per-image result in completion order
+        """
+        from flask import current_app
+        if max_workers is None:
+            max_workers = current_app.config.get('LEAF_BATCH_WORKERS', 2)
+        max_side = AnalysisService._leaf_max_side()
+        pool = AnalysisService._get_batch_pool(max_workers)
+
+        cache = AnalysisService.get_result_cache('bwd')
+        tag = AnalysisService._bwd_cache_tag()
+        with_phash = cache.max_distance > 0
+
+        start = time.perf_counter()
+        futures = {}
+        try:
+            # Submit every cache miss before yielding anything
+            hits = []
+            for index, (filename, image_data) in enumerate(images):
+                # Exact match only here; the worker computes the perceptual hash
+                cached, match, fingerprint = cache.lookup(image_data, tag, near=False)
+                if cached is not None:
+                    hits.append({
+                        'index': index,
+                        'filename': filename,
+                        'success': True,
+                        'result': cached,
+                        'cache': match,
+                        'analysis_ms': 0.0
+                    })
+                    continue
+                try:
+                    future = pool.submit(timed_extract_leaf_color_stats, image_data, max_side, with_phash)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM) in an earlier batch: replace the pool once
+                    AnalysisService._discard_batch_pool(pool)
+                    pool = AnalysisService._get_batch_pool(max_workers)
+                    future = pool.submit(timed_extract_leaf_color_stats, image_data, max_side, with_phash)
+                futures[future] = (index, filename, fingerprint)
+
+            for item in hits:
+                item['finished_at_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                yield item
+
+            for future in as_completed(futures):
+                index, filename, fingerprint = futures[future]
+                item = {'index': index, 'filename': filename}
+                try:
+                    stats, analysis_ms, phash = future.result()
+                    if with_phash:
+                        fingerprint.set_phash(phash)
+                    result = AnalysisService.score_leaf_stats(stats)
+                    item['success'] = result is not None
+                    if result is None:
+                        item['error'] = 'No leaf-like area detected (green mask empty)'
+                    else:
+                        item['result'] = result
+                        cache.put(fingerprint, result, tag)
+                    item['analysis_ms'] = round(analysis_ms, 2)
+                except BrokenProcessPool as e:
+                    AnalysisService._discard_batch_pool(pool)
+                    item['success'] = False
+                    item['error'] = f"Worker process died: {e}"
+                except Exception as e:
+                    item['success'] = False
+                    item['error'] = str(e)
+                item['finished_at_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                yield item
+        finally:
+            # Client went away or an error escaped: drop work not yet started
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def detect_disease_remote(image_data):
+        """
+        Run the Roboflow detect-and-classify workflow on an uploaded image.
+        
+        The image bytes are sent base64-encoded straight from memory, and
+        results are cached by content hash so re-uploads skip the remote call.
+        
+        Returns:
+            tuple: (workflow result, cache match 'exact' | 'near' | None)
+        """
+        cache = AnalysisService.get_result_cache('disease')
+        tag = AnalysisService.ROBOFLOW_WORKFLOW_ID
+        cached, match, fingerprint = cache.lookup(image_data, tag)
+        if cached is not None:
+            return cached, match
+
+        client = InferenceHTTPClient(
+            api_url=AnalysisService.ROBOFLOW_API_URL,
+            api_key=os.environ.get('ROBOFLOW_API_KEY', 'your_roboflow_key_here')
+        )
+        result = client.run_workflow(
+            workspace_name=AnalysisService.ROBOFLOW_WORKSPACE,
+            workflow_id=AnalysisService.ROBOFLOW_WORKFLOW_ID,
+            images={"image": base64.b64encode(image_data).decode('ascii')},
+            use_cache=True
+        )
+        cache.put(fingerprint, result, tag)
+        return result, None
+
     @staticmethod
     def analyze_npk_values(n_value, p_value, k_value):
         """
@@ -1,7 +1,12 @@
 """Market service for commodity price data."""
+import logging
 import random
 from datetime import datetime, timedelta
 
+from app.config.config import Config
+
+logger = logging.getLogger(__name__)
+
 
 class MarketService:
     """Service for market price data."""
@@ -55,8 +60,30 @@ class MarketService:
             }
         }
     
+    @staticmethod
+    def _load_ticker_prices():
+        """
+        Fetch a fresh ticker snapshot from the configured source.
+
+        Returns an empty list when PIHPS has nothing, so the cache keeps its
+        last good snapshot instead of replacing it with simulated prices.
+        """
+        if Config.TICKER_SOURCE == 'pihps':
+            from app.utils.price_scraper import PIHPSScraper
+            return PIHPSScraper.fetch_ticker_prices()
+        return MarketService._simulated_ticker_prices()
+
     @staticmethod
     def get_ticker_prices():
+        """Get ticker prices, served from the shared stale-while-revalidate cache."""
+        from app.utils.ticker_cache import get_ticker_cache
+        cache = get_ticker_cache(MarketService._load_ticker_prices, Config.TICKER_REFRESH_SECONDS,
+                                 Config.TICKER_COLD_TIMEOUT)
+        # Nothing loaded yet (source down on a cold start): the simulator answers instantly
+        return cache.get() or MarketService._simulated_ticker_prices()
+
+    @staticmethod
+    def _simulated_ticker_prices():
         """Get ticker prices for multiple commodities (Simulated Real-time)."""
         ticker_items = [
             {"id": "cabai_merah_keriting", "name": "Cabai Merah", "base": 45000},
@@ -82,116 +109,275 @@ class MarketService:
         
         return live_data
     
+    @staticmethod
+    def _price_series(commodity):
+        """Recorded price series for a commodity, or None if it has no history."""
+        try:
+            from app.utils.price_series import get_price_store
+            series = get_price_store().get(commodity)
+        except Exception as e:
+            logger.error(f"Price history unavailable: {e}")
+            return None
+        return series if series is not None and len(series) else None
+
     @classmethod
-    def get_historical_prices(cls, commodity, days):
-        """Get historical price data with realistic trends."""
+    def _history(cls, commodity, days):
+        """
+        Daily prices for the trailing ``days`` days.
+
+        Returns:
+            tuple: (list of dates, list of prices) or None for unknown commodities
+        """
+        series = cls._price_series(commodity)
+        if series is not None:
+            dates, prices = series.last_days(days)
+            return [d.item() for d in dates], prices.tolist()
+
         base_data = cls.PRICE_DB.get(commodity)
         if not base_data:
             return None
-            
-        base_price = base_data["base"]
-        
-        labels = []
+
+        # No recorded history: simulate a random walk around the base price
+        dates = []
         prices = []
-        
-        # Generate trend
-        # We'll use a random walk but with a slight trend component to look realistic
-        current_price = base_price
+        current_price = base_data["base"]
         today = datetime.now()
-        
+
         # Create a trend curve (e.g., slight inflation or seasonal dip)
-        trend_factor = random.choice([-0.001, 0.001, 0]) 
-        
+        trend_factor = random.choice([-0.001, 0.001, 0])
+
         for i in range(days):
-            date = today - timedelta(days=days - i - 1)
-            labels.append(date.strftime('%d %b'))
-            
+            dates.append((today - timedelta(days=days - i - 1)).date())
+
             # Random daily fluctuation
             daily_volatility = 0.02 if "cabai" in commodity or "bawang" in commodity else 0.005 # Volatile vs Stable items
             change = random.uniform(-daily_volatility, daily_volatility) + trend_factor
-            
+
             current_price = current_price * (1 + change)
-            prices.append(int(current_price))
-        
+            prices.append(current_price)
+
+        return dates, prices
+
+    @classmethod
+    def get_historical_prices(cls, commodity, days, max_points=None):
+        """
+        Get historical price data, ending at the latest recorded day.
+
+        Args:
+            commodity (str): Commodity ID.
+            days (int): Number of days of history.
+            max_points (int): If set, downsample to at most this many points
+                with Largest-Triangle-Three-Buckets. Results for recorded
+                series are cached until the series changes.
+        """
+        if not max_points:
+            return cls._historical_prices(commodity, days)
+        from app.utils.downsample import MIN_POINTS, get_downsample_cache
+        max_points = max(int(max_points), MIN_POINTS)
+
+        series = cls._price_series(commodity)
+        if series is None:
+            return cls._historical_prices(commodity, days, max_points)
+
+        key = (commodity, int(days), int(max_points), series.version)
+        return get_downsample_cache().get_or_compute(
+            key, lambda: cls._historical_prices(commodity, days, max_points)
+        )
+
+    @classmethod
+    def _historical_prices(cls, commodity, days, max_points=None):
+        history = cls._history(commodity, days)
+        if history is None:
+            return None
+
+        dates, prices = history
+        if max_points and len(prices) > max_points:
+            from app.utils.downsample import lttb_indices
+            keep = lttb_indices([(date - dates[0]).days for date in dates], prices, int(max_points))
+            dates = [dates[i] for i in keep]
+            prices = [prices[i] for i in keep]
+
         return {
-            "labels": labels,
-            "prices": prices
+            "labels": [date.strftime('%d %b') for date in dates],
+            "prices": [int(price) for price in prices]
         }
 
+    @staticmethod
+    def _precomputed(commodity):
+        """Batch forecast entry for a commodity, or None if unavailable."""
+        try:
+            from app.utils.price_forecast import get_forecasts
+            data = get_forecasts()
+        except Exception as e:
+            logger.error(f"Precomputed price forecasts unavailable: {e}")
+            return None
+        return (data or {}).get('commodities', {}).get(commodity)
+
+    @classmethod
+    def _trend(cls, commodity):
+        """
+        Linear price trend over the last year.
+
+        Served from the batch forecasts when they cover the latest recorded
+        price. Otherwise recorded series use their running OLS statistics
+        (O(1)) and simulated series are fitted on the spot.
+
+        Returns:
+            dict: slope, intercept, last_x, last_date (the day the forecast
+            path starts after), last 30 dates/prices, the forecast model
+            name and, when precomputed, the daily forecast path; None for
+            unknown commodities
+        """
+        from app.utils.price_series import TREND_WINDOW_DAYS, TrendStats
+
+        series = cls._price_series(commodity)
+        entry = cls._precomputed(commodity)
+        if entry is not None and (series is None or entry['last_date'] == str(series.last_date)):
+            return {
+                "slope": entry['slope'],
+                "intercept": entry['intercept'],
+                "last_x": entry['last_x'],
+                "last_date": datetime.strptime(entry['last_date'], '%Y-%m-%d').date(),
+                "dates": [datetime.strptime(d, '%Y-%m-%d').date() for d in entry['history']['dates']],
+                "prices": entry['history']['prices'],
+                "path": entry['path'],
+                "model": entry.get('model', 'trend')
+            }
+
+        if series is not None:
+            snapshot = series.snapshot()
+            trend = snapshot.trend
+            last_x = series.day_index_from(snapshot.origin, snapshot.dates[-1])
+            dates, prices = series.last_days(30, snapshot)
+            dates, prices = [d.item() for d in dates], prices.tolist()
+        else:
+            history = cls._history(commodity, TREND_WINDOW_DAYS)
+            if not history:
+                return None
+            dates, prices = history
+            xs = [(date - dates[0]).days for date in dates]
+            trend = TrendStats.from_points(xs, prices)
+            last_x, dates, prices = xs[-1], dates[-30:], prices[-30:]
+
+        if series is None:
+            model = 'trend'
+        elif entry is not None:
+            model = entry.get('model', 'trend')  # stale entry: same model, refit below
+        else:
+            model = cls._configured_model(commodity)
+
+        return {
+            "slope": trend.slope,
+            "intercept": trend.intercept,
+            "last_x": last_x,
+            "last_date": dates[-1],
+            "dates": dates,
+            "prices": prices,
+            "path": None,
+            "model": model
+        }
+
+    @staticmethod
+    def _configured_model(commodity):
+        """Forecast model for a recorded series per PRICE_FORECAST_MODEL ('auto' = backtest choice)."""
+        from app.utils.price_models import MODELS, load_selection
+        name = Config.PRICE_FORECAST_MODEL
+        if name == 'auto':
+            name = load_selection().get(commodity, 'trend')
+        return name if name in MODELS else 'trend'
+
+    @classmethod
+    def _forecast_path(cls, commodity, fit, horizon):
+        """
+        Daily forecast for the next ``horizon`` days with the model in ``fit``.
+
+        The precomputed path is used when it is long enough. Otherwise (the
+        batch entry is stale, or the horizon is past it) the same model is
+        refitted on the recorded window. Only if that model cannot fit does
+        this fall back to the linear trend, and the returned name says so.
+
+        Returns:
+            tuple: (list of ``horizon`` prices, model name)
+        """
+        path, model = fit['path'], fit['model']
+        if path is not None and horizon <= len(path):
+            return list(path[:horizon]), model
+
+        if model != 'trend':
+            from app.utils.price_models import forecast
+            from app.utils.price_series import TREND_WINDOW_DAYS
+            series = cls._price_series(commodity)
+            if series is not None:
+                try:
+                    return forecast(model, series.last_days(TREND_WINDOW_DAYS)[1], horizon).tolist(), model
+                except ValueError as e:
+                    logger.warning(f"{model} forecast failed for {commodity}, using trend: {e}")
+
+        return [fit['intercept'] + fit['slope'] * (fit['last_x'] + i + 1) for i in range(horizon)], 'trend'
+
+    @staticmethod
+    def _trend_label(daily_change):
+        """Trend label and insight for an average change in Rp per day."""
+        if daily_change > 50:
+            return "Naik Tajam", "Harga diperkirakan akan melonjak signifikan. Disarankan untuk segera membeli atau mengamankan stok."
+        if daily_change > 10:
+            return "Naik", "Tren harga menunjukkan kenaikan moderat. Waspadai potensi kenaikan biaya produksi."
+        if daily_change < -50:
+            return "Turun Tajam", "Harga diperkirakan akan anjlok. Potensi keuntungan bagi pembeli, namun risiko bagi produsen."
+        if daily_change < -10:
+            return "Turun", "Tren harga cenderung menurun. Waktu yang baik untuk menunggu harga lebih rendah."
+        return "Stabil", "Harga relatif stabil. Pergerakan harga tidak signifikan dalam jangka pendek."
+
     @classmethod
     def predict_price_trend(cls, commodity, target_date_str):
         """
-        Predict price trend using Linear Regression.
+        Predict the price on a target date.
+        
+        The forecast model (see _forecast_path) gives both the predicted
+        price and the trend label, and the response names the model used.
         
         Args:
             commodity (str): Commodity ID.
             target_date_str (str): Target date in 'YYYY-MM-DD' format.
             
         Returns:
-            dict: Prediction result including price, trend, and insight.
+            dict: Prediction result including price, trend, model, and insight.
         """
-        try:
-            from sklearn.linear_model import LinearRegression
-            import numpy as np
-        except ImportError:
-            return {"error": "scikit-learn not installed"}
-
-        # 1. Generate 1 year of historical data (synthetic)
-        history = cls.get_historical_prices(commodity, 365)
-        if not history:
+        # 1. Trend over one year of daily history
+        fit = cls._trend(commodity)
+        if not fit:
             return None
 
-        prices = history['prices']
-        
-        # Prepare data for Linear Regression
-        # X = Days from start (0 to 364), y = Price
-        X = np.array(range(len(prices))).reshape(-1, 1)
-        y = np.array(prices)
-
-        # 2. Train Model
-        model = LinearRegression()
-        model.fit(X, y)
+        dates, prices = fit['dates'], fit['prices']
 
-        # 3. Calculate days to target date
+        # 2. Calculate days to target date
         today = datetime.now()
         target_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-        days_diff = (target_date - today).days
-        
-        if days_diff < 0:
+        if (target_date - today).days < 0:
             return {"error": "Target date must be in the future"}
 
-        # Target X is 365 (today) + days_diff
-        target_X = np.array([[365 + days_diff]])
-        predicted_price = int(model.predict(target_X)[0])
+        # 3. The path starts the day after the last observation, so count from there
+        last_date = fit['last_date']
+        days_diff = (target_date.date() - last_date).days
+        path, model = cls._forecast_path(commodity, fit, max(days_diff, 1))
+        current_price = prices[-1]
+        predicted_price = int(path[days_diff - 1]) if days_diff > 0 else int(current_price)
 
         # 4. Analyze Trend
-        slope = model.coef_[0]
-        if slope > 50:
-            trend = "Naik Tajam"
-            insight = "Harga diperkirakan akan melonjak signifikan. Disarankan untuk segera membeli atau mengamankan stok."
-        elif slope > 10:
-            trend = "Naik"
-            insight = "Tren harga menunjukkan kenaikan moderat. Waspadai potensi kenaikan biaya produksi."
-        elif slope < -50:
-            trend = "Turun Tajam"
-            insight = "Harga diperkirakan akan anjlok. Potensi keuntungan bagi pembeli, namun risiko bagi produsen."
-        elif slope < -10:
-            trend = "Turun"
-            insight = "Tren harga cenderung menurun. Waktu yang baik untuk menunggu harga lebih rendah."
-        else:
-            trend = "Stabil"
-            insight = "Harga relatif stabil. Pergerakan harga tidak signifikan dalam jangka pendek."
+        trend, insight = cls._trend_label((path[-1] - current_price) / len(path))
 
         return {
             "commodity_name": cls.PRICE_DB[commodity]["name"],
-            "current_price": prices[-1],
+            "current_price": int(prices[-1]),
+            "current_price_date": last_date.strftime('%d %B %Y'),
             "predicted_price": predicted_price,
             "prediction_date": target_date.strftime('%d %B %Y'),
             "trend": trend,
+            "model": model,
             "insight": insight,
             "historical_data": {
-                "labels": history['labels'][-30:], # Last 30 days for chart
-                "prices": prices[-30:]
+                "labels": [date.strftime('%d %b') for date in dates], # Last 30 days for chart
+                "prices": [int(price) for price in prices]
             }
         }
 
@@ -200,35 +386,21 @@ class MarketService:
         """
         Get price forecast for the next N days.
         """
-        try:
-            from sklearn.linear_model import LinearRegression
-            import numpy as np
-        except ImportError:
+        # 1. Trend over historical data
+        fit = cls._trend(commodity)
+        if not fit:
             return None
 
-        # 1. Get historical data
-        history = cls.get_historical_prices(commodity, 365)
-        if not history:
-            return None
-
-        prices = history['prices']
-        X = np.array(range(len(prices))).reshape(-1, 1)
-        y = np.array(prices)
-
-        # 2. Train Model
-        model = LinearRegression()
-        model.fit(X, y)
-
-        # 3. Predict Future
-        last_day_index = len(prices)
-        future_X = np.array(range(last_day_index, last_day_index + days)).reshape(-1, 1)
-        predictions = model.predict(future_X)
+        # 2. The path starts after the last observation: skip the days up to today
+        today = datetime.now()
+        gap = max((today.date() - fit['last_date']).days, 0)
+        path, model = cls._forecast_path(commodity, fit, gap + days)
+        path = path[gap:]
 
-        # 4. Format Result
+        # 3. Format Result
         forecast_data = []
-        today = datetime.now()
         
-        for i, price in enumerate(predictions):
+        for i, price in enumerate(path):
             date = today + timedelta(days=i+1)
             forecast_data.append({
                 "date": date.strftime('%d %b'),
@@ -238,5 +410,6 @@ class MarketService:
         return {
             "commodity": cls.PRICE_DB[commodity]["name"],
             "forecast": forecast_data,
-            "trend": "naik" if model.coef_[0] > 0 else "turun"
+            "trend": "naik" if path and path[-1] > fit['prices'][-1] else "turun",
+            "model": model
         }
@@ -1,4 +1,5 @@
 import os
+import time
 import pandas as pd
 import numpy as np
 from flask import current_app
@@ -7,6 +8,11 @@ import cv2
 from inference_sdk import InferenceHTTPClient
 import uuid
 from app.ml_models.model_loader import ModelLoader
+from app.ml_models.sensitivity import SENSITIVITY_FILENAME, get_sensitivity_grid
+from app.ml_models.crop_surrogate import get_crop_surrogate
+from app.utils.yield_index import get_yield_index, FEATURE_COLUMNS
+from app.utils.condition_index import get_condition_index
+from app.utils.drift_monitor import observe_request
 
 # --- MANAJEMEN DATASET ---
 def get_dataset_path(filename):
@@ -22,8 +28,19 @@ class MLService:
     @staticmethod
     def recommend_crop(data):
         """Recommend crop based on soil and environmental conditions."""
-        crop_model = ModelLoader.get_model('crop_recommendation')
-        if crop_model is None:
+        config = current_app.config
+        observe_request('recommend_crop', data, config)
+        surrogate = None
+        if config.get('CROP_SURROGATE_ENABLED'):
+            interpolate = config.get('CROP_SURROGATE_MODE') == 'interpolate'
+            surrogate = get_crop_surrogate(config['ML_MODELS_PATH'], config.get('CROP_SURROGATE_MIN_AGREEMENT', 0.97), interpolate)
+        
+        if surrogate is not None:
+            crop_model, model_version = None, surrogate.meta.get('model_version')
+        else:
+            crop_model, model_version = ModelLoader.get_model_with_version('crop_recommendation')
+        
+        if crop_model is None and surrogate is None:
             current_app.logger.warning("⚠️ Crop recommendation model not available, using fallback")
             # Fallback logic based on NPK ratios
             n = float(data.get('n_value', 0))
@@ -31,33 +48,44 @@ class MLService:
             k = float(data.get('k_value', 0))
             
             # Simple heuristic
-            if n > 80 and p > 40: return "Rice"
-            elif k > 40: return "Cotton"
-            elif p > 50: return "Wheat"
-            else: return "Maize"
-        
-        # Nama fitur harus sama persis dengan saat pelatihan
-        features = [
-            float(data.get('n_value', 0)),
-            float(data.get('p_value', 0)),
-            float(data.get('k_value', 0)),
-            float(data.get('temperature', 0)),
-            float(data.get('humidity', 0)),
-            float(data.get('ph', 0)),
-            float(data.get('rainfall', 0))
-        ]
-        input_data = np.array([features])
-        
-        # Get prediction and probability if available
-        prediction = crop_model.predict(input_data)[0]
-        crop_name = prediction.capitalize()
-        
-        confidence = 0.0
-        if hasattr(crop_model, 'predict_proba'):
-            probs = crop_model.predict_proba(input_data)[0]
-            confidence = round(max(probs) * 100, 2)
+            if n > 80 and p > 40: crop_name = "Rice"
+            elif k > 40: crop_name = "Cotton"
+            elif p > 50: crop_name = "Wheat"
+            else: crop_name = "Maize"
+            confidence = 0.0
         else:
-            confidence = 85.0  # Default confidence if predict_proba not available
+            # Nama fitur harus sama persis dengan saat pelatihan
+            features = [
+                float(data.get('n_value', 0)),
+                float(data.get('p_value', 0)),
+                float(data.get('k_value', 0)),
+                float(data.get('temperature', 0)),
+                float(data.get('humidity', 0)),
+                float(data.get('ph', 0)),
+                float(data.get('rainfall', 0))
+            ]
+        
+            if surrogate is not None:
+                # Precomputed predict_proba grid: no sklearn call on this path
+                prediction, probability = surrogate.predict(features, interpolate)
+                crop_name = prediction.capitalize()
+                confidence = round(probability * 100, 2)
+            else:
+                input_data = np.array([features])
+            
+                # Get prediction and probability if available
+                start = time.perf_counter()
+                predictions = crop_model.predict(input_data)
+                ModelLoader.shadow('crop_recommendation', input_data, predictions, (time.perf_counter() - start) * 1000)
+                prediction = predictions[0]
+                crop_name = prediction.capitalize()
+            
+                confidence = 0.0
+                if hasattr(crop_model, 'predict_proba'):
+                    probs = crop_model.predict_proba(input_data)[0]
+                    confidence = round(max(probs) * 100, 2)
+                else:
+                    confidence = 85.0  # Default confidence if predict_proba not available
 
         # Detailed crop knowledge
         crop_details = {
@@ -182,14 +210,26 @@ class MLService:
         return {
             "crop": crop_name,
             "confidence": confidence,
-            "details": details
+            "details": details,
+            "model_version": model_version
         }
 
 
     @staticmethod
     def predict_yield(data):
         """Predict crop yield based on environmental factors."""
-        yield_model = ModelLoader.get_model('yield_prediction')
+        return MLService.predict_yield_with_version(data)[0]
+
+    @staticmethod
+    def predict_yield_with_version(data):
+        """
+        Predict crop yield and report the model version that produced it.
+
+        Returns:
+            tuple: (yield in ton/ha, model version or None for the fallback)
+        """
+        observe_request('predict_yield', data, current_app.config)
+        yield_model, model_version = ModelLoader.get_model_with_version('yield_prediction')
         if yield_model is None:
             current_app.logger.warning("⚠️ Yield prediction model not available, using fallback")
             # Fallback: simple estimation based on NPK
@@ -198,7 +238,7 @@ class MLService:
             k = float(data.get('potassium', 0))
             # Simple linear estimation (ton/ha)
             estimated_yield = (n * 0.03 + p * 0.05 + k * 0.02) / 10
-            return max(1.0, min(10.0, round(estimated_yield, 2)))
+            return max(1.0, min(10.0, round(estimated_yield, 2))), None
         
         # Nama fitur harus sama persis dengan saat pelatihan
         features = [
@@ -210,12 +250,16 @@ class MLService:
             float(data.get('ph', 0))
         ]
         input_data = np.array([features])
-        prediction = yield_model.predict(input_data)[0]
-        return round(float(prediction) / 1000, 2) # Konversi dari kg/ha ke ton/ha
+        start = time.perf_counter()
+        predictions = yield_model.predict(input_data)
+        ModelLoader.shadow('yield_prediction', input_data, predictions, (time.perf_counter() - start) * 1000)
+        prediction = predictions[0]
+        return round(float(prediction) / 1000, 2), model_version # Konversi dari kg/ha ke ton/ha
 
     @staticmethod
     def predict_yield_advanced(data):
-        advanced_model = ModelLoader.get_model('advanced_yield')
+        observe_request('predict_yield', data, current_app.config)
+        advanced_model, model_version = ModelLoader.get_model_with_version('advanced_yield')
         explainer = ModelLoader.get_model('shap_explainer')
         
         feature_names = ['Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Rainfall', 'pH']
@@ -264,12 +308,16 @@ class MLService:
                 'predicted_yield_ton_ha': estimated_yield,
                 'feature_importances': feature_importance_dict,
                 'shap_values': shap_dict,
-                'base_value': base_value
+                'base_value': base_value,
+                'model_version': None
             }
 
         input_data = pd.DataFrame([features], columns=feature_names)
         
-        prediction = advanced_model.predict(input_data)[0]
+        start = time.perf_counter()
+        predictions = advanced_model.predict(input_data)
+        ModelLoader.shadow('advanced_yield', input_data, predictions, (time.perf_counter() - start) * 1000)
+        prediction = predictions[0]
         importances = advanced_model.feature_importances_
         feature_importance_dict = sorted(zip(feature_names, [float(i) for i in importances]), key=lambda x: x[1], reverse=True)
         shap_values = explainer.shap_values(input_data)
@@ -279,7 +327,8 @@ class MLService:
             'predicted_yield_ton_ha': round(float(prediction) / 1000, 2),
             'feature_importances': feature_importance_dict,
             'shap_values': shap_dict,
-            'base_value': round(float(explainer.expected_value) / 1000, 2)
+            'base_value': round(float(explainer.expected_value) / 1000, 2),
+            'model_version': model_version
         }
 
     @staticmethod
@@ -305,8 +354,66 @@ class MLService:
 
 
     @staticmethod
-    def generate_yield_plan(commodity=None, target_yield_ton_ha=None):
-        """Generate comprehensive plan to achieve target yield with commodity-specific recommendations."""
+    def yield_sensitivity(data, vary=None, points=None):
+        """
+        What-if yield curves served from the precomputed partial-dependence grids.
+        
+        The advanced model is never loaded or invoked; missing features default
+        to the dataset median.
+        
+        Args:
+            data: Any of nitrogen, phosphorus, potassium, temperature, rainfall, ph
+            vary: Feature name(s) to sweep (default: all)
+            points: Points per curve (default: the grid resolution)
+        
+        Returns:
+            dict or None if the grids have not been built
+        """
+        grid = get_sensitivity_grid(os.path.join(current_app.config['ML_MODELS_PATH'], SENSITIVITY_FILENAME))
+        if grid is None:
+            return None
+        
+        by_key = {name.lower(): name for name in grid.features}
+        values = {
+            name: float(data[key]) for key, name in by_key.items()
+            if data.get(key) not in (None, '')
+        }
+        
+        if vary is None:
+            sweep = grid.features
+        else:
+            requested = [vary] if isinstance(vary, str) else list(vary)
+            unknown = [v for v in requested if str(v).lower() not in by_key]
+            if unknown:
+                raise ValueError(f"Unknown feature(s): {', '.join(map(str, unknown))}")
+            sweep = [by_key[str(v).lower()] for v in requested]
+        
+        curves = {}
+        for name in sweep:
+            xs, ys = grid.curve(values, name, points)
+            curves[name] = {
+                'values': [round(float(x), 3) for x in xs],
+                'predicted_yield_ton_ha': [round(float(y) / 1000, 3) for y in ys]
+            }
+        
+        manifest_checksum = ModelLoader.get_registry().cached_manifest().get('advanced_yield', {}).get('sha256')
+        return {
+            'predicted_yield_ton_ha': round(grid.predict(values) / 1000, 2),
+            'conditions': dict(zip(grid.features, (round(float(v), 3) for v in grid.row_from(values)))),
+            'curves': curves,
+            'model_version': grid.meta.get('model_version'),
+            'stale': bool(manifest_checksum) and manifest_checksum != grid.meta.get('model_sha256'),
+            'fidelity_r2': round(float(grid.meta['fidelity_r2']), 4) if 'fidelity_r2' in grid.meta else None
+        }
+
+    @staticmethod
+    def generate_yield_plan(commodity=None, target_yield_ton_ha=None, neighbors=0):
+        """
+        Generate comprehensive plan to achieve target yield with commodity-specific recommendations.
+        
+        For general commodities the plan comes from the preloaded EDA_500 yield
+        index; ``neighbors`` >= 1 also returns that many nearest-yield rows.
+        """
         from app.data.yield_benchmarks import YieldBenchmarks
         
         # Handle both old (single param) and new (two params) signatures
@@ -325,39 +432,104 @@ class MLService:
                 return MLService._generate_commodity_specific_plan(commodity, target_yield_ton_ha, commodity_data)
         
         # Fallback to EDA dataset for general/unsupported commodities
-        dataset_path = get_dataset_path('EDA_500.csv')
-        if not os.path.exists(dataset_path):
-            raise RuntimeError("Dataset EDA_500.csv tidak ditemukan.")
-        
-        df = pd.read_csv(dataset_path)
-        df['Yield'] = pd.to_numeric(df['Yield'], errors='coerce')
-        df.dropna(subset=['Yield'], inplace=True)
+        index = get_yield_index(get_dataset_path('EDA_500.csv'))
         
         target_yield_kg = float(target_yield_ton_ha) * 1000
-        best_match_row = df.iloc[(df['Yield'] - target_yield_kg).abs().argsort()[:1]]
+        best_match = index.nearest(target_yield_kg)
         
-        if best_match_row.empty:
+        if best_match is None:
             return None
 
-        result = best_match_row.iloc[0]
+        result = index.row(best_match)
+        distribution = index.percentile_bands(target_yield_kg)
         plan = {
             "commodity_name": "Umum",
             "target_yield": target_yield_ton_ha,
             "feasibility": "unknown",
             "npk_requirements": {
-                "Nitrogen (kg/ha)": round(float(result['Nitrogen']), 2),
-                "Phosphorus (kg/ha)": round(float(result['Phosphorus']), 2),
-                "Potassium (kg/ha)": round(float(result['Potassium']), 2)
+                "Nitrogen (kg/ha)": round(result['Nitrogen'], 2),
+                "Phosphorus (kg/ha)": round(result['Phosphorus'], 2),
+                "Potassium (kg/ha)": round(result['Potassium'], 2)
             },
             "environmental_conditions": {
-                "Temperature (°C)": round(float(result['Temperature']), 2),
-                "Rainfall (mm)": round(float(result['Rainfall']), 2),
-                "pH Tanah": round(float(result['pH']), 2)
+                "Temperature (°C)": round(result['Temperature'], 2),
+                "Rainfall (mm)": round(result['Rainfall'], 2),
+                "pH Tanah": round(result['pH'], 2)
             },
-            "actual_yield_from_data": f"{round(float(result['Yield'])/1000, 2)} ton/ha"
+            "actual_yield_from_data": f"{round(result['Yield']/1000, 2)} ton/ha",
+            "yield_distribution": {
+                "target_percentile": round(distribution['percentile'], 1),
+                "percentile_bands_ton_ha": {
+                    band: round(value / 1000, 2) for band, value in distribution['bands'].items()
+                }
+            }
         }
+        
+        if neighbors and neighbors >= 1:
+            positions = index.k_nearest(target_yield_kg, neighbors)
+            plan["nearest_rows"] = [
+                {name: round(value, 2) for name, value in index.row(pos).items()}
+                for pos in positions
+            ]
+            plan["nearest_feature_ranges"] = {
+                name: {q: round(v, 2) for q, v in ranges.items()}
+                for name, ranges in index.feature_ranges(positions).items()
+            }
         return plan
     
+    @staticmethod
+    def find_similar_conditions(data, target_yield_ton_ha, k=5):
+        """
+        Find dataset rows that reached the target yield under conditions like the farmer's.
+        
+        Any of nitrogen, phosphorus, potassium, temperature, rainfall and ph
+        present in ``data`` are matched (normalized Euclidean distance); the
+        rest are left free and summarised as recommendations.
+        """
+        conditions = {
+            name: float(data[name.lower()])
+            for name in FEATURE_COLUMNS
+            if data.get(name.lower()) not in (None, '')
+        }
+        
+        dataset_path = get_dataset_path('EDA_500.csv')
+        index = get_condition_index(dataset_path)
+        
+        start = time.perf_counter()
+        matches = index.query(conditions, float(target_yield_ton_ha) * 1000, k)
+        query_ms = (time.perf_counter() - start) * 1000
+        
+        if not matches:
+            return None
+        
+        yield_index = index.yield_index
+        positions = np.array([pos for pos, _ in matches])
+        rows = []
+        for pos, distance in matches:
+            row = yield_index.row(pos)
+            rows.append({
+                "Nitrogen (kg/ha)": round(row['Nitrogen'], 2),
+                "Phosphorus (kg/ha)": round(row['Phosphorus'], 2),
+                "Potassium (kg/ha)": round(row['Potassium'], 2),
+                "Temperature (°C)": round(row['Temperature'], 2),
+                "Rainfall (mm)": round(row['Rainfall'], 2),
+                "pH Tanah": round(row['pH'], 2),
+                "yield_ton_ha": round(row['Yield'] / 1000, 2),
+                "distance": round(distance, 3)
+            })
+        
+        ranges = yield_index.feature_ranges(positions)
+        return {
+            "target_yield": target_yield_ton_ha,
+            "matched_on": list(conditions),
+            "similar_rows": rows,
+            "recommended_ranges": {
+                name: {q: round(v, 2) for q, v in ranges[name].items()}
+                for name in FEATURE_COLUMNS if name not in conditions
+            },
+            "query_ms": round(query_ms, 3)
+        }
+    
     @staticmethod
     def _generate_commodity_specific_plan(commodity, target_yield, commodity_data):
         """Generate detailed commodity-specific yield plan."""
@@ -610,7 +782,8 @@ class MLService:
     @staticmethod
     def predict_success(data):
         """Predict farming success probability."""
-        success_model = ModelLoader.get_model('success_model')
+        observe_request('predict_yield', data, current_app.config)
+        success_model, model_version = ModelLoader.get_model_with_version('success_model')
         if success_model is None:
             current_app.logger.warning("⚠️ Success prediction model not available, using fallback")
             # Fallback: heuristic based on optimal ranges
@@ -625,7 +798,7 @@ class MLService:
             if 20 <= temp <= 30: score += 40
             
             status = "Berhasil" if score >= 60 else "Berisiko Tinggi"
-            return {'status': status, 'probability_of_success': score}
+            return {'status': status, 'probability_of_success': score, 'model_version': None}
         
         features = [
             float(data.get('nitrogen', 0)),
@@ -637,7 +810,10 @@ class MLService:
         ]
         input_data = np.array([features])
         
-        prediction = success_model.predict(input_data)[0]
+        start = time.perf_counter()
+        predictions = success_model.predict(input_data)
+        ModelLoader.shadow('success_model', input_data, predictions, (time.perf_counter() - start) * 1000)
+        prediction = predictions[0]
         probability = success_model.predict_proba(input_data)[0]
         
         status = "Berhasil" if prediction == 1 else "Berisiko Tinggi"
@@ -645,6 +821,7 @@ class MLService:
         
         return {
             'status': status,
-            'probability_of_success': prob_percent
+            'probability_of_success': prob_percent,
+            'model_version': model_version
         }
 
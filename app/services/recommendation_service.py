@@ -27,8 +27,9 @@ class RecommendationService:
             peringatan = []
         
         # Try to use ML model
+        model_version = None
         try:
-            model = ModelLoader.get_model('recommendation')
+            model, model_version = ModelLoader.get_model_with_version('recommendation')
             if model is not None:
                 input_df = np.array([[
                     ph_tanah,
@@ -47,6 +48,7 @@ class RecommendationService:
             else:
                 raise RuntimeError("Model not available")
         except Exception as e:
+            model_version = None
             # Fallback to rule-based recommendation
             # Base NPK on plant age and BWD score
             if umur_tanaman_hari < 30:
@@ -112,7 +114,8 @@ class RecommendationService:
             "rekomendasi_pupuk_ml": rekomendasi_pupuk_ml,
             "analisa_bwd": analisa_bwd,
             "analisa_kesehatan": analisa_kesehatan,
-            "peringatan_penting": peringatan
+            "peringatan_penting": peringatan,
+            "model_version": model_version
         }
     
     @staticmethod
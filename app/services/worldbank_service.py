@@ -1,11 +1,72 @@
 """World Bank Food Price Service."""
-import requests
-from datetime import datetime
+import bisect
 import logging
+import threading
+import time
+
+import requests
+
+from app.config.config import Config
 
 logger = logging.getLogger(__name__)
 
 
+class WorldBankDataset:
+    """
+    Fetched World Bank price records, indexed for lookups.
+
+    - ``by_commodity``: internal commodity id -> matching valid records,
+      most recent first
+    - ``by_product``: product name -> records, most recent first
+    - ``products``: every product name seen, including ones without a valid price
+    - ``dates``: sorted distinct dates, with ``by_date`` for range queries
+    """
+
+    def __init__(self, records, commodity_map):
+        self.fetched_at = time.time()
+        self.size = 0
+        self.by_product = {}
+        self.by_date = {}
+        products = set()
+        for record in records:
+            self.size += 1
+            if record.get('product'):
+                products.add(record['product'])
+            try:
+                price = float(record.get('price', 0))
+            except (ValueError, TypeError):
+                continue
+            if price <= 0:
+                continue
+            entry = {
+                'price': price,
+                'market': record.get('market', 'Unknown Market'),
+                'date': record.get('date', ''),
+                'product': record.get('product')
+            }
+            if entry['product']:
+                self.by_product.setdefault(entry['product'], []).append(entry)
+            self.by_date.setdefault(entry['date'], []).append(entry)
+
+        for entries in self.by_product.values():
+            entries.sort(key=lambda x: x['date'], reverse=True)
+        self.products = sorted(products)
+        self.dates = sorted(self.by_date)
+
+        self.by_commodity = {}
+        for commodity_id, wb_product in commodity_map.items():
+            matches = [entry for product, entries in self.by_product.items()
+                       if wb_product.lower() in product.lower() for entry in entries]
+            matches.sort(key=lambda x: x['date'], reverse=True)
+            self.by_commodity[commodity_id] = matches
+
+    def between(self, start=None, end=None):
+        """Records with ``start <= date <= end`` (ISO date strings, either bound optional)."""
+        lo = 0 if start is None else bisect.bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return [entry for date in self.dates[lo:hi] for entry in self.by_date[date]]
+
+
 class WorldBankService:
     """Service for fetching food prices from World Bank RTFP API."""
     
@@ -29,40 +90,107 @@ class WorldBankService:
         "daging_sapi": "beef"
     }
     
+    PAGE_SIZE = 1000
+    _dataset = None
+    _dataset_lock = threading.Lock()
+    _fetch_done = None  # Event of the fetch in flight, None when idle
+    _failed_at = None
+
+    @classmethod
+    def iter_records(cls, page_size=None, max_records=None):
+        """
+        Stream records from the API, one page at a time.
+
+        Args:
+            page_size: Records per request (default PAGE_SIZE)
+            max_records: Stop after this many records (default WORLDBANK_MAX_RECORDS)
+
+        Yields:
+            dict: One price record
+        """
+        page_size = page_size or cls.PAGE_SIZE
+        max_records = max_records or Config.WORLDBANK_MAX_RECORDS
+        session = requests.Session()
+        offset = 0
+        try:
+            while offset < max_records:
+                limit = min(page_size, max_records - offset)
+                response = session.get(cls.BASE_URL, params={'limit': limit, 'offset': offset, 'format': 'json'},
+                                       timeout=10)
+                response.raise_for_status()
+                page = response.json()
+                records = page.get('data', []) if isinstance(page, dict) else page
+                yield from records
+                offset += len(records)
+                if len(records) < limit:
+                    break
+        finally:
+            session.close()
+
     @classmethod
     def fetch_latest_prices(cls, limit=1000):
         """Fetch latest food prices from World Bank API."""
         try:
-            params = {
-                'limit': limit,
-                'format': 'json'
-            }
-            
-            response = requests.get(cls.BASE_URL, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # DEBUG: Print structure
-            print(f"\n[DEBUG] Response keys: {data.keys() if isinstance(data, dict) else 'Not a dict'}")
-            if isinstance(data, dict) and 'data' in data:
-                print(f"[DEBUG] Data length: {len(data['data'])}")
-                if data['data']:
-                    print(f"[DEBUG] First record keys: {data['data'][0].keys()}")
-                    print(f"[DEBUG] First record sample: {data['data'][0]}")
-            elif isinstance(data, list):
-                print(f"[DEBUG] Response is a list with {len(data)} items")
-                if data:
-                    print(f"[DEBUG] First item: {data[0]}")
-            
-            logger.info(f"Fetched {len(data.get('data', []))} price records from World Bank")
-            return data
-            
+            records = list(cls.iter_records(max_records=limit))
+            logger.info(f"Fetched {len(records)} price records from World Bank")
+            return {'data': records}
+
         except Exception as e:
             logger.error(f"Error fetching World Bank data: {e}")
-            print(f"[ERROR] {e}")
             return None
-    
+
+    @classmethod
+    def _fetch(cls, done):
+        try:
+            dataset = WorldBankDataset(cls.iter_records(), cls.COMMODITY_MAP)
+            cls._dataset, cls._failed_at = dataset, None
+            logger.info(f"World Bank dataset indexed: {dataset.size} records, {len(dataset.products)} products")
+        except Exception as e:
+            cls._failed_at = time.time()
+            logger.error(f"Error fetching World Bank data (next attempt in {Config.WORLDBANK_FAILURE_BACKOFF}s): {e}")
+        finally:
+            with cls._dataset_lock:
+                cls._fetch_done = None
+            done.set()
+
+    @classmethod
+    def _start_fetch(cls, force=False):
+        """Start a background fetch unless one is running or a failure is still backing off; return its event."""
+        with cls._dataset_lock:
+            if cls._fetch_done is not None:
+                return cls._fetch_done
+            if not force and cls._failed_at is not None \
+                    and time.time() - cls._failed_at < Config.WORLDBANK_FAILURE_BACKOFF:
+                return None
+            done = cls._fetch_done = threading.Event()
+        threading.Thread(target=cls._fetch, args=(done,), name='worldbank-fetch', daemon=True).start()
+        return done
+
+    @classmethod
+    def get_dataset(cls, force=False):
+        """
+        Get the indexed dataset, refetching it once WORLDBANK_CACHE_TTL has passed.
+
+        Fetches run on a background thread, one at a time. A stale dataset is
+        returned immediately while it refetches. With no dataset yet, callers
+        wait at most WORLDBANK_COLD_TIMEOUT seconds. A failed fetch keeps the
+        previous dataset and is not retried for WORLDBANK_FAILURE_BACKOFF
+        seconds, so an API outage does not cost every request a retry.
+        ``force`` skips the TTL and the backoff and waits for the fetch.
+
+        Returns:
+            WorldBankDataset or None if nothing could be fetched yet
+        """
+        dataset = cls._dataset
+        fresh = dataset is not None and time.time() - dataset.fetched_at < Config.WORLDBANK_CACHE_TTL
+        if fresh and not force:
+            return dataset
+
+        done = cls._start_fetch(force)
+        if done is not None and (force or dataset is None):
+            done.wait(None if force else Config.WORLDBANK_COLD_TIMEOUT)
+        return cls._dataset
+
     @classmethod
     def get_price_for_commodity(cls, commodity_id):
         """Get current price for a specific commodity."""
@@ -72,37 +200,16 @@ class WorldBankService:
             logger.warning(f"Commodity {commodity_id} not mapped to World Bank product")
             return None
         
-        # Fetch data
-        data = cls.fetch_latest_prices(limit=500)
-        if not data or 'data' not in data:
+        dataset = cls.get_dataset()
+        if dataset is None:
             return None
         
-        # Filter for the specific product and get recent prices
-        prices = []
-        for record in data['data']:
-            product_name = record.get('product', '').lower()
-            if wb_product.lower() in product_name:
-                try:
-                    price = float(record.get('price', 0))
-                    market = record.get('market', 'Unknown Market')
-                    date = record.get('date', '')
-                    
-                    if price > 0:
-                        prices.append({
-                            'price': price,
-                            'market': market,
-                            'date': date,
-                            'product': record.get('product')
-                        })
-                except (ValueError, TypeError):
-                    continue
-        
+        # Indexed records are already sorted most recent first
+        prices = dataset.by_commodity.get(commodity_id, [])
         if not prices:
             logger.warning(f"No price data found for {wb_product}")
             return None
         
-        # Sort by date (most recent first) and get average of recent prices
-        prices.sort(key=lambda x: x['date'], reverse=True)
         recent_prices = prices[:10]  # Take 10 most recent
         
         avg_price = sum(p['price'] for p in recent_prices) / len(recent_prices)
@@ -117,14 +224,5 @@ class WorldBankService:
     @classmethod
     def get_all_available_products(cls):
         """Get list of all available products in the dataset."""
-        data = cls.fetch_latest_prices(limit=100)
-        if not data or 'data' not in data:
-            return []
-        
-        products = set()
-        for record in data['data']:
-            product = record.get('product', '')
-            if product:
-                products.add(product)
-        
-        return sorted(list(products))
+        dataset = cls.get_dataset()
+        return list(dataset.products) if dataset else []
@@ -0,0 +1,354 @@
+"""
+Typed, memory-mapped binary cache for the bundled CSV datasets.
+
+The first load of a CSV converts it to one ``.npy`` file per column
+(float32 for real-valued columns, int32 for integer columns, datetime64[D]
+for ISO dates and integer category codes for text) in a directory named
+after the SHA-256 of the source file. Every later load memory-maps those
+columns instead of parsing text, so only the pages a caller touches are
+read and forked workers share them through the page cache. Editing the CSV
+changes its checksum, which transparently produces a fresh cache.
+
+    python -m app.utils.columnar_store            # report on bundled datasets
+    python -m app.utils.columnar_store --rebuild  # force re-conversion
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CACHE_DIR_NAME = '.columnar'
+META_FILE = 'meta.json'
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_DATASETS = (
+    os.path.join(_BASE_DIR, 'ml_models', 'EDA_500.csv'),
+    os.path.join(_BASE_DIR, 'ml_models', 'Crop_recommendation.csv'),
+    os.path.join(_BASE_DIR, 'data', 'price_history_1year.csv'),
+)
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def source_checksum(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a source file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_root(path):
+    """
+    Directory that holds the converted datasets for ``path``.
+
+    ``DATASET_CACHE_DIR`` overrides the default ``.columnar`` folder next to
+    the CSV; read-only deployments fall back to the system temp directory.
+    """
+    root = os.getenv('DATASET_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    try:
+        os.makedirs(root, exist_ok=True)
+        if os.access(root, os.W_OK):
+            return root
+    except OSError:
+        pass
+    return os.path.join(tempfile.gettempdir(), 'agrisensa_columnar')
+
+
+def _category_codes(series):
+    categorical = pd.Categorical(series)
+    n_categories = len(categorical.categories)
+    code_dtype = np.int8 if n_categories < 127 else np.int16 if n_categories < 32767 else np.int32
+    return categorical.codes.astype(code_dtype), [str(c) for c in categorical.categories]
+
+
+def _encode_column(series):
+    """
+    Convert one parsed CSV column to compact arrays.
+
+    Text columns that are partly numeric (EDA_500's ``Yield`` holds shifted
+    category labels in some rows) become a float32 column, NaN where the
+    text was not a number, plus category codes for those text cells.
+
+    Returns:
+        tuple: (ndarray, codes ndarray or None, column meta dict)
+    """
+    if series.dtype == object:
+        present = series.notna()
+        numeric = pd.to_numeric(series, errors='coerce')
+        numeric_count = int(numeric.notna().sum())
+        if numeric_count == int(present.sum()):
+            series = numeric
+        elif numeric_count:
+            codes, categories = _category_codes(series.where(numeric.isna()))
+            return numeric.to_numpy(dtype=np.float32), codes, {'kind': 'mixed', 'categories': categories}
+        else:
+            dates = pd.to_datetime(series, format='%Y-%m-%d', errors='coerce')
+            if int(dates.notna().sum()) == int(present.sum()):
+                return dates.values.astype('datetime64[D]'), None, {'kind': 'date'}
+
+            codes, categories = _category_codes(series)
+            return codes, None, {'kind': 'category', 'categories': categories}
+
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=np.bool_), None, {'kind': 'bool'}
+
+    if pd.api.types.is_integer_dtype(series):
+        values = series.to_numpy()
+        info = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(np.int32), None, {'kind': 'int'}
+        return values.astype(np.int64), None, {'kind': 'int'}
+
+    return series.to_numpy(dtype=np.float32), None, {'kind': 'float'}
+
+
+def build_cache(path, checksum=None):
+    """
+    Convert ``path`` to its columnar cache directory and return that directory.
+
+    The directory is written under a temporary name and renamed into place,
+    so concurrent builders never observe a half-written cache.
+    """
+    checksum = checksum or source_checksum(path)
+    root = cache_root(path)
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, f"{os.path.basename(path)}.{checksum[:16]}")
+
+    start = time.perf_counter()
+    frame = pd.read_csv(path)
+    parse_seconds = time.perf_counter() - start
+
+    staging = tempfile.mkdtemp(prefix='.build-', dir=root)
+    try:
+        columns = []
+        for position, name in enumerate(frame.columns):
+            values, codes, meta = _encode_column(frame[name])
+            filename = f"{position:03d}.npy"
+            np.save(os.path.join(staging, filename), values, allow_pickle=False)
+            if codes is not None:
+                meta['codes_file'] = f"{position:03d}.codes.npy"
+                np.save(os.path.join(staging, meta['codes_file']), codes, allow_pickle=False)
+            columns.append(dict(meta, name=name, file=filename, dtype=str(values.dtype)))
+
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump({
+                'format_version': FORMAT_VERSION,
+                'source': os.path.basename(path),
+                'source_sha256': checksum,
+                'source_bytes': os.path.getsize(path),
+                'rows': len(frame),
+                'read_csv_seconds': parse_seconds,
+                'columns': columns
+            }, f, indent=2)
+
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another process finished first; its copy is identical.
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Converted {os.path.basename(path)} to columnar cache {target}")
+    return target
+
+
+class ColumnarDataset:
+    """Memory-mapped columns of one converted CSV."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format in {directory}")
+
+        self.columns = {}
+        self.categories = {}
+        self.text_codes = {}    # mixed columns: codes of the non-numeric cells
+        for column in self.meta['columns']:
+            name = column['name']
+            self.columns[name] = np.load(os.path.join(directory, column['file']), mmap_mode='r')
+            if column['kind'] in ('category', 'mixed'):
+                self.categories[name] = column['categories']
+            if column['kind'] == 'mixed':
+                self.text_codes[name] = np.load(os.path.join(directory, column['codes_file']), mmap_mode='r')
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def checksum(self):
+        return self.meta['source_sha256']
+
+    @property
+    def nbytes(self):
+        """Bytes of column data (what a fully paged-in load would occupy)."""
+        arrays = list(self.columns.values()) + list(self.text_codes.values())
+        return int(sum(values.nbytes for values in arrays))
+
+    def decode(self, name):
+        """Column ``name`` as originally written, with codes mapped back to strings."""
+        values = self.columns[name]
+        if name not in self.categories:
+            return values
+        labels = np.array(self.categories[name] + [None], dtype=object)
+        codes = self.text_codes.get(name, values)
+        decoded = labels[np.where(codes < 0, len(labels) - 1, codes)]
+        if name in self.text_codes:
+            numeric = ~np.isnan(values)
+            decoded[numeric] = values[numeric]
+        return decoded
+
+    def to_frame(self, columns=None):
+        """
+        Materialize a DataFrame (text columns as pandas Categorical).
+
+        Mixed columns come back numeric, NaN where the cell was text, the
+        same as ``pd.to_numeric(errors='coerce')`` on the raw column.
+
+        Args:
+            columns: Optional subset of column names, in the desired order
+        """
+        data = {}
+        for name in columns or self.columns:
+            values = self.columns[name]
+            if name in self.categories and name not in self.text_codes:
+                data[name] = pd.Categorical.from_codes(np.asarray(values), self.categories[name])
+            else:
+                data[name] = np.asarray(values)
+        return pd.DataFrame(data)
+
+
+def load_dataset(path, rebuild=False):
+    """
+    Get the columnar view of the CSV at ``path``, converting it if needed.
+
+    Loaded datasets are reused per process while the file's size and mtime
+    are unchanged, so repeated calls do not re-hash the source.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset {os.path.basename(path)} tidak ditemukan.")
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if not rebuild:
+        dataset = _loaded.get(key)
+        if dataset is not None:
+            return dataset
+
+    with _loaded_lock:
+        dataset = None if rebuild else _loaded.get(key)
+        if dataset is None:
+            checksum = source_checksum(path)
+            directory = os.path.join(cache_root(path), f"{os.path.basename(path)}.{checksum[:16]}")
+            if rebuild and os.path.isdir(directory):
+                shutil.rmtree(directory, ignore_errors=True)
+            try:
+                dataset = ColumnarDataset(directory)
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(directory, ignore_errors=True)
+                dataset = ColumnarDataset(build_cache(path, checksum))
+            for stale in [k for k in _loaded if k[0] == key[0]]:
+                del _loaded[stale]
+            _loaded[key] = dataset
+        return dataset
+
+
+def load_frame(path, columns=None):
+    """``pd.read_csv`` replacement backed by the columnar cache."""
+    return load_dataset(path).to_frame(columns)
+
+
+def compare_with_read_csv(path, repeats=5):
+    """
+    Measure the columnar load against ``pd.read_csv`` for one dataset.
+
+    Returns:
+        dict: load times (ms), in-memory bytes and on-disk bytes for both
+    """
+    dataset = load_dataset(path)
+
+    csv_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        frame = pd.read_csv(path)
+        csv_ms.append((time.perf_counter() - start) * 1000)
+    csv_bytes = int(frame.memory_usage(deep=True).sum())
+
+    mmap_ms, frame_ms = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        opened = ColumnarDataset(dataset.directory)
+        mmap_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        opened.to_frame()
+        frame_ms.append((time.perf_counter() - start) * 1000)
+
+    cache_disk = sum(
+        os.path.getsize(os.path.join(dataset.directory, name)) for name in os.listdir(dataset.directory)
+    )
+    read_csv_ms = float(np.median(csv_ms))
+    open_ms = float(np.median(mmap_ms))
+    to_frame_ms = float(np.median(frame_ms))
+
+    return {
+        'dataset': os.path.basename(path),
+        'rows': len(dataset),
+        'columns': len(dataset.columns),
+        'read_csv_ms': round(read_csv_ms, 3),
+        'mmap_open_ms': round(open_ms, 3),
+        'mmap_to_frame_ms': round(to_frame_ms, 3),
+        'load_speedup': round(read_csv_ms / max(open_ms + to_frame_ms, 1e-6), 1),
+        'read_csv_memory_bytes': csv_bytes,
+        'columnar_memory_bytes': dataset.nbytes,
+        'memory_saving_pct': round((1 - dataset.nbytes / csv_bytes) * 100, 1) if csv_bytes else 0.0,
+        'csv_disk_bytes': os.path.getsize(path),
+        'columnar_disk_bytes': cache_disk,
+        'cache_dir': dataset.directory
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert bundled CSV datasets to the columnar cache and report savings")
+    parser.add_argument('paths', nargs='*', help="CSV files (default: bundled datasets)")
+    parser.add_argument('--rebuild', action='store_true', help="Re-convert even if a cache exists")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    reports = []
+    for path in args.paths or BUNDLED_DATASETS:
+        load_dataset(path, rebuild=args.rebuild)
+        report = compare_with_read_csv(path, repeats=args.repeats)
+        reports.append(report)
+        print(
+            f"{report['dataset']:<28} rows={report['rows']:<6} "
+            f"read_csv={report['read_csv_ms']:.1f}ms "
+            f"mmap={report['mmap_open_ms']:.2f}ms (+{report['mmap_to_frame_ms']:.1f}ms to_frame, "
+            f"x{report['load_speedup']}) "
+            f"memory {report['read_csv_memory_bytes'] / 1e6:.2f}MB -> {report['columnar_memory_bytes'] / 1e6:.2f}MB "
+            f"(-{report['memory_saving_pct']}%)"
+        )
+    return reports
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""KD-tree search for growing conditions that reached a target yield."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.utils.yield_index import FEATURE_COLUMNS, get_yield_index
+
+DEFAULT_BANDS = 32
+DEFAULT_MAX_TREES = 64
+
+
+class ConditionIndex:
+    """
+    Nearest-neighbour search over normalized EDA_500 conditions.
+
+    Rows come from a :class:`YieldIndex`, so they are already sorted by Yield
+    and "rows that achieved at least the target" is a contiguous suffix. The
+    suffix is split at ``bands`` yield quantiles; a query searches the KD-tree
+    of the band that starts just below the target, so at most one band of
+    non-qualifying rows has to be skipped.
+
+    Only the features the farmer supplies take part in the distance. Trees
+    are built lazily per (feature subset, band) and kept in an LRU of
+    ``max_trees`` entries, since every subset/band pair would otherwise
+    stay in memory.
+    """
+
+    def __init__(self, yield_index, bands=DEFAULT_BANDS, leaf_size=40, max_trees=DEFAULT_MAX_TREES):
+        self.yield_index = yield_index
+        self.yields = yield_index.yields
+        matrix = np.column_stack([yield_index.columns[name] for name in FEATURE_COLUMNS]).astype(np.float64)
+        self.mean = np.nanmean(matrix, axis=0)
+        std = np.nanstd(matrix, axis=0)
+        self.std = np.where(std > 0, std, 1.0)
+        normalized = (matrix - self.mean) / self.std
+        self.normalized = np.nan_to_num(normalized)
+        n = len(self.yields)
+        self.band_starts = np.unique(np.linspace(0, n, bands + 1, dtype=np.intp)[:-1]) if n else np.array([0])
+        self.leaf_size = leaf_size
+        self.max_trees = max_trees
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tree(self, columns, band_start):
+        key = (columns, band_start)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None:
+                from sklearn.neighbors import KDTree
+                tree = KDTree(self.normalized[band_start:, list(columns)], leaf_size=self.leaf_size)
+                self._trees[key] = tree
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+            else:
+                self._trees.move_to_end(key)
+        return tree
+
+    def query(self, conditions, target_yield, k=5):
+        """
+        Find the ``k`` rows most similar to ``conditions`` with Yield >= target.
+
+        Args:
+            conditions: {feature name: value} for any of FEATURE_COLUMNS
+            target_yield: Minimum Yield (kg/ha)
+            k: Number of rows to return
+
+        Returns:
+            list: [(row position, normalized distance), ...], nearest first
+        """
+        columns = tuple(i for i, name in enumerate(FEATURE_COLUMNS) if conditions.get(name) is not None)
+        if not columns:
+            raise ValueError(f"At least one of {', '.join(FEATURE_COLUMNS)} is required")
+
+        first_ok = int(np.searchsorted(self.yields, target_yield, side='left'))
+        available = len(self.yields) - first_ok
+        k = min(int(k), available)
+        if k <= 0:
+            return []
+
+        band_start = int(self.band_starts[np.searchsorted(self.band_starts, first_ok, side='right') - 1])
+        skipped = first_ok - band_start  # rows in the tree that miss the target
+
+        point = np.array([[(float(conditions[FEATURE_COLUMNS[i]]) - self.mean[i]) / self.std[i] for i in columns]])
+        tree = self._tree(columns, band_start)
+
+        fetch = min(k * 4, k + skipped)
+        while True:
+            distances, offsets = tree.query(point, k=fetch)
+            positions = offsets[0] + band_start
+            keep = positions >= first_ok
+            if keep.sum() >= k or fetch >= k + skipped:
+                break
+            fetch = min(fetch * 2, k + skipped)
+
+        return list(zip(positions[keep][:k].tolist(), distances[0][keep][:k].tolist()))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_condition_index(path):
+    """Get the process-wide ConditionIndex for the EDA dataset at ``path``."""
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = ConditionIndex(get_yield_index(path))
+            _indexes[path] = index
+        return index
@@ -1,7 +1,7 @@
 """Data loader utility for loading datasets and knowledge bases."""
 import os
-import pandas as pd
 from flask import current_app
+from app.utils.columnar_store import load_frame
 
 
 class DataLoader:
@@ -13,7 +13,7 @@ class DataLoader:
         try:
             dataset_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'EDA_500.csv')
             if os.path.exists(dataset_path):
-                return pd.read_csv(dataset_path)
+                return load_frame(dataset_path)
             return None
         except Exception as e:
             current_app.logger.error(f"Failed to load EDA dataset: {e}")
@@ -0,0 +1,103 @@
+"""Largest-Triangle-Three-Buckets downsampling for chart series."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MIN_POINTS = 3
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points LTTB keeps when reducing ``(x, y)`` to ``n_out`` points.
+
+    The first and last points are always kept. The points in between are
+    split into ``n_out - 2`` equal buckets. From each bucket, LTTB picks the
+    point that forms the largest triangle with the point picked from the
+    previous bucket and the mean of the next bucket. Triangle areas are
+    computed for a whole bucket at once.
+
+    Returns:
+        ndarray: Sorted int indices (all indices if ``n_out >= len(x)``)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+
+    # Bucket boundaries over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean of each bucket (used as the third vertex for the bucket before it)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def parse_max_points(value):
+    """
+    Validate a requested point count.
+
+    Returns:
+        int or None: None when not given, otherwise at least MIN_POINTS
+
+    Raises:
+        ValueError: If ``value`` is not a positive integer
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('points must be a positive integer')
+    try:
+        points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('points must be a positive integer')
+    if points < 1:
+        raise ValueError('points must be a positive integer')
+    return max(points, MIN_POINTS)
+
+
+class DownsampleCache:
+    """Small LRU of downsampled results, keyed by the caller."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Cached value for ``key``, calling ``compute()`` on a miss."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+_cache = DownsampleCache()
+
+
+def get_downsample_cache():
+    return _cache
@@ -0,0 +1,283 @@
+"""Streaming input-drift monitor for the prediction endpoints."""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from app.utils.columnar_store import load_dataset
+
+logger = logging.getLogger(__name__)
+
+# monitor name -> (training CSV in ML_MODELS_PATH, {request field: dataset column}, target column)
+# Only rows whose target is numeric form the reference, matching what the model was trained on
+# (EDA_500 rows without a numeric Yield are column-shifted).
+DRIFT_SOURCES = {
+    'recommend_crop': ('Crop_recommendation.csv', {
+        'n_value': 'N', 'p_value': 'P', 'k_value': 'K', 'temperature': 'temperature',
+        'humidity': 'humidity', 'ph': 'ph', 'rainfall': 'rainfall'
+    }, None),
+    'predict_yield': ('EDA_500.csv', {
+        'nitrogen': 'Nitrogen', 'phosphorus': 'Phosphorus', 'potassium': 'Potassium',
+        'temperature': 'Temperature', 'rainfall': 'Rainfall', 'ph': 'pH'
+    }, 'Yield'),
+}
+
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+_EPS = 1e-4
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def population_stability_index(expected, actual):
+    """PSI between two histograms given as proportions over the same bins."""
+    expected = np.clip(expected, _EPS, None)
+    actual = np.clip(actual, _EPS, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    """
+    Per-feature binned histograms of live inputs vs. the training data.
+
+    ``observe`` only appends the raw row to a bounded buffer, so the request
+    path pays one deque append. Rows are folded into the histograms in
+    vectorized batches by a daemon thread, woken every ``fold_every`` rows,
+    or when a report is requested. Bin edges are the training minimum, deciles and maximum, so
+    inputs outside the training range land in their own tail bins.
+
+    Histograms are kept for the whole process lifetime and for a rolling
+    window of ``window_seconds``. When a window closes it becomes the
+    "previous window" snapshot.
+    """
+
+    def __init__(self, name, reference, bins=10, window_seconds=3600, fold_every=1024):
+        self.name = name
+        self.features = list(reference)
+        self.window_seconds = window_seconds
+        self.fold_every = fold_every
+
+        self.edges = []
+        self.reference = []
+        self.reference_mean = []
+        for feature in self.features:
+            values = np.asarray(reference[feature], dtype=np.float64)
+            values = values[~np.isnan(values)]
+            # [min, deciles..., max]: the first and last bins catch out-of-range inputs
+            inner = np.unique(np.concatenate([
+                [values.min()],
+                np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]),
+                [np.nextafter(values.max(), np.inf)]
+            ])) if len(values) else np.array([0.0])
+            self.edges.append(inner)
+            counts = np.bincount(np.searchsorted(inner, values, side='right'), minlength=len(inner) + 1)
+            self.reference.append(counts / max(counts.sum(), 1))
+            self.reference_mean.append(float(values.mean()) if len(values) else None)
+
+        self._pending = deque(maxlen=fold_every * 16)
+        self._lock = threading.Lock()
+        self._total = [np.zeros(len(e) + 1, dtype=np.int64) for e in self.edges]
+        self._window = [np.zeros(len(e) + 1, dtype=np.int64) for e in self.edges]
+        self._sums = np.zeros(len(self.features))
+        self._previous = None
+        self._window_start = time.time()
+        self._fold_requested = threading.Event()
+        self._folder = None
+        self.observed = 0
+        self.dropped = 0
+
+    def _ensure_folder(self):
+        if self._folder is not None and self._folder.is_alive():
+            return
+
+        def _run():
+            while True:
+                self._fold_requested.wait()
+                self._fold_requested.clear()
+                try:
+                    self.fold()
+                except Exception as e:
+                    logger.error(f"Drift monitor '{self.name}' fold failed: {e}")
+
+        with self._lock:
+            if self._folder is None or not self._folder.is_alive():
+                self._folder = threading.Thread(target=_run, name=f'drift-fold-{self.name}', daemon=True)
+                self._folder.start()
+
+    def observe(self, row):
+        """Record one prediction input (sequence in ``self.features`` order)."""
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(row)
+        if len(self._pending) >= self.fold_every and not self._fold_requested.is_set():
+            self._ensure_folder()
+            self._fold_requested.set()
+
+    def fold(self):
+        """Move buffered rows into the histograms."""
+        with self._lock:
+            rows = []
+            while self._pending:
+                try:
+                    rows.append(self._pending.popleft())
+                except IndexError:
+                    break
+
+            now = time.time()
+            if now - self._window_start >= self.window_seconds:
+                self._previous = {
+                    'start': self._window_start,
+                    'end': now,
+                    'counts': self._window
+                }
+                self._window = [np.zeros_like(c) for c in self._window]
+                self._window_start = now
+
+            if not rows:
+                return
+            data = np.asarray(rows, dtype=np.float64)
+            for i, inner in enumerate(self.edges):
+                column = data[:, i]
+                column = column[~np.isnan(column)]
+                counts = np.bincount(np.searchsorted(inner, column, side='right'), minlength=len(inner) + 1)
+                self._total[i] += counts
+                self._window[i] += counts
+            self._sums += np.nansum(data, axis=0)
+            self.observed += len(rows)
+
+    def _compare(self, histograms):
+        features = {}
+        worst = 0.0
+        for i, feature in enumerate(self.features):
+            n = int(histograms[i].sum())
+            if n == 0:
+                features[feature] = {'count': 0}
+                continue
+            live = histograms[i] / n
+            psi = population_stability_index(self.reference[i], live)
+            worst = max(worst, psi)
+            features[feature] = {
+                'count': n,
+                'psi': round(psi, 4),
+                'max_cdf_gap': round(float(np.abs(np.cumsum(live) - np.cumsum(self.reference[i])).max()), 4),
+                'below_training_range_pct': round(float(live[0]) * 100, 2),
+                'above_training_range_pct': round(float(live[-1]) * 100, 2),
+                'status': self._status(psi)
+            }
+        return {'max_psi': round(worst, 4), 'status': self._status(worst), 'features': features}
+
+    @staticmethod
+    def _status(psi):
+        if psi >= PSI_SIGNIFICANT:
+            return 'drift'
+        if psi >= PSI_MODERATE:
+            return 'moderate'
+        return 'stable'
+
+    def report(self):
+        """Drift metrics for the whole process lifetime and the rolling windows."""
+        self.fold()
+        with self._lock:
+            total = [c.copy() for c in self._total]
+            window = [c.copy() for c in self._window]
+            previous = self._previous
+            means = self._sums / self.observed if self.observed else None
+
+        result = {
+            'observed': self.observed,
+            'dropped': self.dropped,
+            'lifetime': self._compare(total),
+            'current_window': dict(self._compare(window), start=self._window_start),
+            'previous_window': dict(self._compare(previous['counts']), start=previous['start'], end=previous['end'])
+            if previous else None,
+        }
+        if means is not None:
+            for i, feature in enumerate(self.features):
+                stats = result['lifetime']['features'][feature]
+                stats['live_mean'] = round(float(means[i]), 3)
+                stats['training_mean'] = round(self.reference_mean[i], 3) if self.reference_mean[i] is not None else None
+        return result
+
+    def reset(self):
+        """Forget all observed inputs."""
+        with self._lock:
+            self._pending.clear()
+            self._total = [np.zeros_like(c) for c in self._total]
+            self._window = [np.zeros_like(c) for c in self._window]
+            self._sums[:] = 0
+            self._previous = None
+            self._window_start = time.time()
+            self.observed = 0
+            self.dropped = 0
+
+
+def get_drift_monitor(name, models_path, bins=10, window_seconds=3600):
+    """Get the process-wide monitor ``name``, building its reference histograms once."""
+    monitor = _monitors.get(name)
+    if monitor is not None:
+        return monitor
+    with _monitors_lock:
+        monitor = _monitors.get(name)
+        if monitor is None:
+            dataset_file, fields, target = DRIFT_SOURCES[name]
+            dataset = load_dataset(os.path.join(models_path, dataset_file))
+            reference = {column: np.asarray(dataset[column], dtype=np.float64) for column in fields.values()}
+            if target is not None:
+                keep = ~np.isnan(np.asarray(dataset[target], dtype=np.float64))
+                reference = {column: values[keep] for column, values in reference.items()}
+            monitor = DriftMonitor(name, reference, bins, window_seconds)
+            _monitors[name] = monitor
+        return monitor
+
+
+def init_drift_monitors(config):
+    """Build every monitor's reference histograms up front, so no request pays for it. Never raises."""
+    if not config.get('DRIFT_MONITOR_ENABLED', True):
+        return
+    for name in DRIFT_SOURCES:
+        try:
+            get_drift_monitor(name, config['ML_MODELS_PATH'], config.get('DRIFT_BINS', 10),
+                              config.get('DRIFT_WINDOW_SECONDS', 3600))
+        except Exception as e:
+            logger.error(f"Drift monitor '{name}' could not be built: {e}")
+
+
+def observe_request(name, data, config):
+    """
+    Record the inputs of one prediction request. Never raises.
+
+    Args:
+        name: Key of DRIFT_SOURCES
+        data: Request payload (the same dict the service reads features from)
+        config: Flask app config
+    """
+    if not config.get('DRIFT_MONITOR_ENABLED', True):
+        return
+    try:
+        monitor = get_drift_monitor(name, config['ML_MODELS_PATH'], config.get('DRIFT_BINS', 10),
+                                    config.get('DRIFT_WINDOW_SECONDS', 3600))
+        row = []
+        for field in DRIFT_SOURCES[name][1]:
+            value = data.get(field)
+            try:
+                row.append(float(value))
+            except (TypeError, ValueError):
+                row.append(np.nan)
+        monitor.observe(row)
+    except Exception as e:
+        logger.error(f"Drift monitor '{name}' failed: {e}")
+
+
+def drift_report():
+    """Reports for every monitor that has been created in this process."""
+    return {name: monitor.report() for name, monitor in list(_monitors.items())}
+
+
+def reset_monitors():
+    """Reset every monitor in this process."""
+    for monitor in list(_monitors.values()):
+        monitor.reset()
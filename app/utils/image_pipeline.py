@@ -0,0 +1,346 @@
+"""
+Downscaled leaf-image pipeline for BWD colour analysis.
+
+Phone photos (often 12 MP) are decoded at reduced resolution using the JPEG
+DCT-scaling decoder (``IMREAD_REDUCED_COLOR_*``), cropped to the bounding box
+of the green leaf area, and classified in a single pass: every ROI pixel is
+mapped to a (hue, saturation class, value class) code and counted with one
+``bincount``. Green/brown/white pixel counts and the mean green hue are then
+read off that histogram.
+
+The S/V class boundaries are exactly the ``inRange`` thresholds the original
+analysis used, so results differ from the full-resolution path only through
+downscaling and ROI cropping.
+"""
+import struct
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_MAX_SIDE = 1024
+
+# Saturation classes: [0,20] [21,39] [40,99] [100,255]
+_S_EDGES = (21, 40, 100)
+# Value classes: [0,19] [20,39] [40,199] [200,200] [201,255]
+_V_EDGES = (20, 40, 200, 201)
+_NS = len(_S_EDGES) + 1
+_NV = len(_V_EDGES) + 1
+_NSV = _NS * _NV
+
+
+def _class_lut(edges, multiplier=1):
+    lut = np.zeros(256, dtype=np.uint8)
+    for edge in edges:
+        lut[edge:] += multiplier
+    return lut
+
+
+_S_LUT = _class_lut(_S_EDGES, _NV)
+_V_LUT = _class_lut(_V_EDGES)
+
+# Same boxes as the original inRange masks, expressed as class selections
+_GREEN = (slice(30, 91), slice(2, _NS), slice(2, _NV))   # H 30-90, S >= 40, V >= 40
+_BROWN = (slice(10, 21), slice(3, _NS), slice(1, 4))     # H 10-20, S >= 100, V 20-200
+_WHITE = (slice(0, 181), slice(0, 1), slice(3, _NV))     # S <= 20, V >= 200
+
+_LOWER_GREEN = np.array([30, 40, 40])
+_UPPER_GREEN = np.array([90, 255, 255])
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def image_dimensions(image_data):
+    """
+    Read (width, height) from a JPEG or PNG header without decoding.
+
+    Returns:
+        tuple or None if the format is not recognised.
+    """
+    if image_data[:8] == b'\x89PNG\r\n\x1a\n' and len(image_data) >= 24:
+        return struct.unpack('>II', image_data[16:24])
+
+    if image_data[:2] != b'\xff\xd8':
+        return None
+
+    i, size = 2, len(image_data)
+    while i + 9 < size:
+        if image_data[i] != 0xFF:
+            i += 1
+            continue
+        marker = image_data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack('>H', image_data[i + 2:i + 4])[0]
+        # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', image_data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def choose_scale(image_data, max_side=DEFAULT_MAX_SIDE):
+    """Largest decoder reduction (1, 2, 4 or 8) that keeps the long side >= max_side."""
+    dims = image_dimensions(image_data)
+    if not dims or not max_side:
+        return 1
+    long_side = max(dims)
+    scale = 1
+    for candidate in (2, 4, 8):
+        if long_side / candidate >= max_side:
+            scale = candidate
+    return scale
+
+
+def decode_downscaled(image_data, max_side=DEFAULT_MAX_SIDE):
+    """
+    Decode image bytes at reduced resolution.
+
+    Returns:
+        tuple: (BGR image or None, scale factor used)
+    """
+    scale = choose_scale(image_data, max_side)
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, _REDUCED_FLAGS[scale])
+    return image, scale
+
+
+def leaf_roi(hsv_image):
+    """
+    Bounding box (x, y, w, h) of green leaf pixels, or None if there are none.
+    """
+    mask = cv2.inRange(hsv_image, _LOWER_GREEN, _UPPER_GREEN)
+    if cv2.countNonZero(mask) == 0:
+        return None
+    return cv2.boundingRect(mask)
+
+
+def hsv_class_histogram(hsv_image):
+    """
+    Count pixels per (hue, saturation class, value class) in one pass.
+
+    Returns:
+        ndarray: int64 histogram shaped (180, _NS, _NV)
+    """
+    h, s, v = cv2.split(hsv_image)
+    sv = cv2.add(cv2.LUT(s, _S_LUT), cv2.LUT(v, _V_LUT))
+    codes = h.astype(np.uint16) * _NSV + sv
+    return np.bincount(codes.ravel(), minlength=180 * _NSV).reshape(180, _NS, _NV)
+
+
+def summarize_histogram(hist):
+    """
+    Derive the leaf colour statistics from an HSV class histogram.
+
+    Returns:
+        dict: green/brown/white pixel counts and mean green hue
+    """
+    green = hist[_GREEN]
+    green_pixels = int(green.sum())
+    avg_hue = 0.0
+    if green_pixels:
+        hue_counts = green.sum(axis=(1, 2))
+        avg_hue = float(np.dot(np.arange(30, 91), hue_counts) / green_pixels)
+
+    return {
+        'avg_hue': avg_hue,
+        'green_pixels': green_pixels,
+        'brown_pixels': int(hist[_BROWN].sum()),
+        'white_pixels': int(hist[_WHITE].sum())
+    }
+
+
+def extract_leaf_color_stats(image_data, max_side=DEFAULT_MAX_SIDE):
+    """
+    Run the downscaled ROI pipeline on raw image bytes.
+
+    Args:
+        image_data: Binary image data
+        max_side: Target long side after decoder reduction (0 = full size)
+
+    Returns:
+        dict or None: colour statistics, or None if the image cannot be
+        decoded or contains no green area
+    """
+    image, scale = decode_downscaled(image_data, max_side)
+    if image is None:
+        return None
+
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    roi = leaf_roi(hsv_image)
+    if roi is None:
+        return None
+
+    x, y, w, h = roi
+    stats = summarize_histogram(hsv_class_histogram(hsv_image[y:y + h, x:x + w]))
+    stats['scale'] = scale
+    stats['roi'] = [x * scale, y * scale, w * scale, h * scale]
+    return stats
+
+
+def timed_extract_leaf_color_stats(image_data, max_side=DEFAULT_MAX_SIDE, with_phash=False):
+    """
+    Process-pool entry point: run the pipeline and time it in the worker.
+
+    With ``with_phash`` the worker also computes the perceptual hash for the
+    result cache, so the request thread never decodes the image for it.
+
+    Returns:
+        tuple: (stats or None, elapsed milliseconds, perceptual hash or None)
+    """
+    start = time.perf_counter()
+    stats = extract_leaf_color_stats(image_data, max_side)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    phash = None
+    if with_phash:
+        from app.utils.result_cache import perceptual_hash
+        try:
+            phash = perceptual_hash(image_data)
+        except Exception:
+            phash = None
+    return stats, elapsed_ms, phash
+
+
+def extract_leaf_color_stats_full(image_data):
+    """
+    Reference implementation: full-resolution decode with separate masks.
+
+    Kept for parity checks and benchmarking against the downscaled pipeline.
+    """
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv_image, _LOWER_GREEN, _UPPER_GREEN)
+    green_pixels = cv2.countNonZero(mask)
+    if green_pixels == 0:
+        return None
+
+    brown_mask = cv2.inRange(hsv_image, np.array([10, 100, 20]), np.array([20, 255, 200]))
+    white_mask = cv2.inRange(hsv_image, np.array([0, 0, 200]), np.array([180, 20, 255]))
+    return {
+        'avg_hue': cv2.mean(hsv_image, mask=mask)[0],
+        'green_pixels': green_pixels,
+        'brown_pixels': cv2.countNonZero(brown_mask),
+        'white_pixels': cv2.countNonZero(white_mask),
+        'scale': 1,
+        'roi': None
+    }
+
+
+def synthetic_leaf_image(width=4000, height=3000, seed=0):
+    """
+    Encode a phone-sized JPEG of a green leaf with brown and white spots.
+
+    Used by the benchmark when no sample photos are given.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 235, dtype=np.uint8)
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.35), int(height * 0.25))
+    cv2.ellipse(image, center, axes, 15, 0, 360, (40, 150, 60), -1)
+    for _ in range(60):
+        x = int(rng.integers(center[0] - axes[0] // 2, center[0] + axes[0] // 2))
+        y = int(rng.integers(center[1] - axes[1] // 2, center[1] + axes[1] // 2))
+        color = (30, 70, 130) if rng.random() < 0.7 else (240, 240, 240)
+        cv2.circle(image, (x, y), int(rng.integers(8, 40)), color, -1)
+    noise = rng.normal(0, 6, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def _measure(func, image_data, repeats):
+    import tracemalloc
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(image_data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    result = func(image_data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'peak_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+def benchmark(images, max_side=DEFAULT_MAX_SIDE, repeats=10, hue_tolerance=1.0):
+    """
+    Compare the downscaled pipeline with the full-resolution reference.
+
+    Args:
+        images: {label: image bytes}
+        max_side: Pipeline target long side
+        repeats: Timed runs per image and pipeline
+        hue_tolerance: Allowed absolute difference in mean hue
+
+    Returns:
+        dict: per-image latency, peak memory and parity figures
+    """
+    report = {}
+    for label, image_data in images.items():
+        full, full_timing = _measure(extract_leaf_color_stats_full, image_data, repeats)
+        fast, fast_timing = _measure(lambda data: extract_leaf_color_stats(data, max_side), image_data, repeats)
+
+        entry = {'full': full_timing, 'downscaled': fast_timing}
+        if full and fast:
+            hue_delta = abs(full['avg_hue'] - fast['avg_hue'])
+            entry['parity'] = {
+                'avg_hue_full': round(full['avg_hue'], 2),
+                'avg_hue_downscaled': round(fast['avg_hue'], 2),
+                'avg_hue_delta': round(hue_delta, 3),
+                'brown_ratio_full': round(full['brown_pixels'] / full['green_pixels'] * 100, 2),
+                'brown_ratio_downscaled': round(fast['brown_pixels'] / fast['green_pixels'] * 100, 2),
+                'white_ratio_full': round(full['white_pixels'] / full['green_pixels'] * 100, 2),
+                'white_ratio_downscaled': round(fast['white_pixels'] / fast['green_pixels'] * 100, 2),
+                'within_tolerance': hue_delta <= hue_tolerance
+            }
+            entry['speedup'] = round(full_timing['p50_ms'] / max(fast_timing['p50_ms'], 1e-6), 2)
+        else:
+            entry['parity'] = {'full_detected': bool(full), 'downscaled_detected': bool(fast)}
+        report[label] = entry
+    return report
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import os
+
+    parser = argparse.ArgumentParser(description='Benchmark the downscaled leaf analysis pipeline.')
+    parser.add_argument('images', nargs='*', help='Leaf photos (default: synthetic 12 MP image)')
+    parser.add_argument('--max-side', type=int, default=DEFAULT_MAX_SIDE)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--hue-tolerance', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.images:
+        images = {}
+        for path in args.images:
+            with open(path, 'rb') as fh:
+                images[os.path.basename(path)] = fh.read()
+    else:
+        images = {'synthetic_12mp': synthetic_leaf_image()}
+
+    report = benchmark(images, args.max_side, args.repeats, args.hue_tolerance)
+    print(json.dumps(report, indent=2))
+    return 0 if all(e['parity'].get('within_tolerance', False) for e in report.values()) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+"""Streaming robust outlier scoring for reported prices."""
+import bisect
+import threading
+from collections import deque
+
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed data
+
+_validator = None
+_validator_lock = threading.Lock()
+
+
+class RobustWindow:
+    """
+    Median and MAD of the last ``size`` prices.
+
+    The window is kept both in arrival order (to evict) and sorted (to read
+    the median), so an update is a bounded insort/remove and the median is
+    an index lookup. The MAD is recomputed lazily on the first score after
+    an update; with the window size fixed, every step is constant time.
+    """
+
+    __slots__ = ('size', '_order', '_sorted', '_mad')
+
+    def __init__(self, size=64):
+        self.size = size
+        self._order = deque()
+        self._sorted = []
+        self._mad = None
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, value):
+        if len(self._order) == self.size:
+            old = self._order.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._order.append(value)
+        bisect.insort(self._sorted, value)
+        self._mad = None
+
+    @property
+    def median(self):
+        values, n = self._sorted, len(self._sorted)
+        return values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+
+    @property
+    def mad(self):
+        if self._mad is None:
+            median = self.median
+            deviations = sorted(abs(v - median) for v in self._sorted)
+            n = len(deviations)
+            self._mad = deviations[n // 2] if n % 2 else (deviations[n // 2 - 1] + deviations[n // 2]) / 2
+        return self._mad
+
+
+class PriceAnomalyValidator:
+    """
+    Scores each new price against recent prices for the same commodity.
+
+    Statistics are kept per (commodity, province, price_type), with a
+    national window per (commodity, price_type) as the fallback while a
+    province has fewer than ``min_samples`` prices. The score is the robust
+    z-score ``|price - median| / (1.4826 * MAD)``. The MAD is floored at
+    ``min_spread`` times the median, so a run of identical prices does not
+    make every small change an outlier. Held prices are not added to the
+    windows.
+
+    State lives in this process. When a ``loader`` is given, each group is
+    seeded once, on first use, with ``loader(commodity_id, province_id,
+    price_type, limit)`` (the last ``window`` accepted prices, oldest
+    first; province None means national), so a fresh worker scores against
+    real history instead of starting empty.
+    """
+
+    def __init__(self, window=64, min_samples=8, flag_z=3.5, hold_z=6.0, min_spread=0.01, loader=None):
+        self.window = window
+        self.min_samples = min_samples
+        self.flag_z = flag_z
+        self.hold_z = hold_z
+        self.min_spread = min_spread
+        self.loader = loader
+        self._windows = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def _window(self, key):
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = RobustWindow(self.window)
+        return window
+
+    def _seed(self, key):
+        """Load a group's recent history once; the query runs outside the lock."""
+        if self.loader is None or key in self._seeded:
+            return
+        prices = self.loader(key[0], key[1], key[2], self.window)
+        with self._lock:
+            if key in self._seeded:
+                return
+            self._seeded.add(key)
+            window = self._window(key)
+            live = list(window._order)
+            # Seeded history goes first; prices recorded meanwhile stay the most recent
+            window._order.clear()
+            window._sorted.clear()
+            for value in list(prices)[-self.window:] + live:
+                window.add(float(value))
+
+    def score(self, commodity_id, province_id, price_type, price):
+        """
+        Robust z-score of ``price`` without recording it.
+
+        Returns:
+            dict: score, median, mad, samples and scope, or None if there is not enough history yet
+        """
+        keys = (('province', (commodity_id, province_id, price_type)),
+                ('national', (commodity_id, None, price_type)))
+        for _, key in keys:
+            self._seed(key)
+        with self._lock:
+            for scope, key in keys:
+                window = self._windows.get(key)
+                if window is not None and len(window) >= self.min_samples:
+                    median, mad = window.median, window.mad
+                    spread = max(MAD_SCALE * mad, self.min_spread * abs(median), 1e-9)
+                    return {
+                        'score': round(abs(price - median) / spread, 2),
+                        'median': median,
+                        'mad': mad,
+                        'samples': len(window),
+                        'scope': scope
+                    }
+        return None
+
+    def record(self, commodity_id, province_id, price_type, price):
+        """Add an accepted price to the province and national windows."""
+        with self._lock:
+            self._window((commodity_id, province_id, price_type)).add(price)
+            if province_id is not None:
+                self._window((commodity_id, None, price_type)).add(price)
+
+    def check(self, commodity_id, province_id, price_type, price, record=True):
+        """
+        Score a new price, then record it unless it is held.
+
+        Pass ``record=False`` when the price is not committed yet, and call
+        record() once it is, so rolled-back inserts never enter the windows.
+
+        Returns:
+            tuple: (action, stats) where action is 'ok', 'flag' or 'hold'
+        """
+        price = float(price)
+        stats = self.score(commodity_id, province_id, price_type, price)
+        action = 'ok'
+        if stats is not None:
+            if stats['score'] >= self.hold_z:
+                action = 'hold'
+            elif stats['score'] >= self.flag_z:
+                action = 'flag'
+        if record and action != 'hold':
+            self.record(commodity_id, province_id, price_type, price)
+        return action, stats
+
+    def status(self):
+        with self._lock:
+            return {
+                'groups': len(self._windows),
+                'seeded_groups': len(self._seeded),
+                'window': self.window,
+                'min_samples': self.min_samples,
+                'flag_z': self.flag_z,
+                'hold_z': self.hold_z
+            }
+
+
+def get_price_validator(window=64, min_samples=8, flag_z=3.5, hold_z=6.0, loader=None):
+    """Get the process-wide validator, created with the given settings on first use."""
+    global _validator
+    if _validator is None:
+        with _validator_lock:
+            if _validator is None:
+                _validator = PriceAnomalyValidator(window, min_samples, flag_z, hold_z, loader=loader)
+    return _validator
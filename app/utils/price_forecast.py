@@ -0,0 +1,271 @@
+"""
+Batch trend forecasts for every commodity.
+
+All commodity histories are stacked as columns of one (days x commodities)
+matrix on a shared daily grid, with NaN where a series has no observation.
+Every column's least-squares trend is then fitted at once from masked column
+sums. The 90-day forecast paths (from the trend, or per commodity from the
+model chosen in app.utils.price_models) are written to a JSON file, and
+MarketService serves predictions from that file instead of fitting per
+request.
+
+Requests only read the file. It is built from cron with:
+    python -m app.utils.price_forecast
+or, when PRICE_FORECAST_REFRESH_SECONDS > 0, by a daemon thread started at
+app startup (init_price_forecasts). Every worker runs that thread, but a
+worker skips the rebuild while the file is younger than the interval, so
+one rebuild per interval serves them all. Commodities without recorded
+history (simulated from MarketService.PRICE_DB) are not in the file.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.utils.columnar_store import cache_root
+from app.utils.price_series import PRICE_HISTORY_PATH, TREND_WINDOW_DAYS
+
+logger = logging.getLogger(__name__)
+
+HORIZONS = (7, 30, 90)
+FORECAST_FILENAME = 'price_forecasts.json'
+HISTORY_TAIL_DAYS = 30
+
+_cache = {'path': None, 'mtime': None, 'data': None}
+_cache_lock = threading.Lock()
+_build_lock = threading.Lock()
+_refresher = None
+_stop_event = threading.Event()
+
+
+def default_path():
+    return os.path.join(cache_root(PRICE_HISTORY_PATH), FORECAST_FILENAME)
+
+
+def stack_histories(histories):
+    """
+    Stack ``{commodity: (dates, prices)}`` into one matrix on a shared daily grid.
+
+    Returns:
+        tuple: (grid start datetime64[D], (days x commodities) float64 matrix with NaN gaps, commodity list)
+    """
+    commodities = list(histories)
+    day_arrays = [np.asarray(histories[c][0], dtype='datetime64[D]') for c in commodities]
+    start = min(d[0] for d in day_arrays)
+    end = max(d[-1] for d in day_arrays)
+    Y = np.full(((end - start).astype(np.int64) + 1, len(commodities)), np.nan)
+    for j, (days, commodity) in enumerate(zip(day_arrays, commodities)):
+        Y[(days - start).astype(np.int64), j] = histories[commodity][1]
+    return start, Y, commodities
+
+
+def fit_trends(Y):
+    """
+    Least-squares line through every column of ``Y`` at once.
+
+    x is the row index; NaN cells are left out of their column's fit.
+
+    Returns:
+        tuple: (slopes, intercepts, x of each column's last observation)
+    """
+    mask = ~np.isnan(Y)
+    x = np.arange(len(Y), dtype=np.float64)[:, None]
+    y = np.where(mask, Y, 0.0)
+    xm = np.where(mask, x, 0.0)
+
+    n = mask.sum(axis=0).astype(np.float64)
+    sx = xm.sum(axis=0)
+    sy = y.sum(axis=0)
+    sxx = (xm * xm).sum(axis=0)
+    sxy = (xm * y).sum(axis=0)
+
+    denominator = n * sxx - sx * sx
+    valid = (n >= 2) & (denominator > 1e-9 * np.maximum(n * sxx, 1.0))
+    slopes = np.where(valid, (n * sxy - sx * sy) / np.where(valid, denominator, 1.0), 0.0)
+    intercepts = np.where(n > 0, (sy - slopes * sx) / np.maximum(n, 1.0), 0.0)
+    last_x = len(Y) - 1 - np.argmax(mask[::-1], axis=0)
+    return slopes, intercepts, last_x
+
+
+def forecast_all(histories, max_horizon=max(HORIZONS)):
+    """
+    Fit every history and project it ``max_horizon`` days past its last observation.
+
+    Returns:
+        dict: {commodity: {slope, intercept, last_date, current_price, path}}
+    """
+    start, Y, commodities = stack_histories(histories)
+    slopes, intercepts, last_x = fit_trends(Y)
+    steps = np.arange(1, max_horizon + 1, dtype=np.float64)[:, None]
+    paths = intercepts + slopes * (last_x + steps)  # (horizon x commodities)
+
+    results = {}
+    for j, commodity in enumerate(commodities):
+        results[commodity] = {
+            'slope': float(slopes[j]),
+            'intercept': float(intercepts[j]),
+            'last_x': int(last_x[j]),
+            'last_date': str(start + np.timedelta64(int(last_x[j]), 'D')),
+            'current_price': float(Y[last_x[j], j]),
+            'path': np.round(paths[:, j], 2).tolist()
+        }
+    return results
+
+
+def build_forecasts(path=None, window_days=TREND_WINDOW_DAYS, model=None):
+    """
+    Forecast every commodity with recorded history and write the result atomically.
+
+    The trend line is always fitted (it drives the trend label). The daily
+    path comes from ``model`` (default: PRICE_FORECAST_MODEL); ``'auto'``
+    uses the per-commodity choice saved by the price_models backtest.
+
+    Returns:
+        dict: The written document
+    """
+    from app.config.config import Config
+    from app.services.market_service import MarketService
+    from app.utils.price_models import MODELS, forecast, load_selection
+
+    path = path or default_path()
+    model = model or Config.PRICE_FORECAST_MODEL
+    selection = load_selection() if model == 'auto' else {}
+    histories, tails = {}, {}
+    for commodity in MarketService.PRICE_DB:
+        if MarketService._price_series(commodity) is None:
+            continue  # simulated random walk: nothing worth precomputing
+        history = MarketService._history(commodity, window_days)
+        if not history or not len(history[1]):
+            continue
+        dates, prices = history
+        histories[commodity] = (dates, prices)
+        tails[commodity] = {
+            'dates': [str(d) for d in dates[-HISTORY_TAIL_DAYS:]],
+            'prices': [int(p) for p in prices[-HISTORY_TAIL_DAYS:]]
+        }
+
+    results = forecast_all(histories) if histories else {}
+    for commodity, entry in results.items():
+        name = selection.get(commodity, 'trend') if model == 'auto' else model
+        entry['model'] = 'trend'
+        if name != 'trend' and name in MODELS:
+            try:
+                prices = histories[commodity][1]
+                entry['path'] = np.round(forecast(name, prices, len(entry['path'])), 2).tolist()
+                entry['model'] = name
+            except ValueError as e:
+                logger.warning(f"{name} forecast skipped for {commodity}: {e}")
+        entry['history'] = tails[commodity]
+        entry['horizons'] = {str(h): entry['path'][h - 1] for h in HORIZONS}
+
+    document = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'window_days': window_days,
+        'horizons': list(HORIZONS),
+        'commodities': results
+    }
+    fd, tmp_path = tempfile.mkstemp(prefix='.forecasts-', dir=os.path.dirname(path) or '.')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        json.dump(document, fh)
+    os.replace(tmp_path, path)
+    logger.info(f"Price forecasts written for {len(results)} commodities: {path}")
+    return document
+
+
+def load_forecasts(path=None):
+    """Read the forecast file, re-reading only when it changes. None if it does not exist."""
+    path = path or default_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _cache['path'] == path and _cache['mtime'] == mtime:
+        return _cache['data']
+    with _cache_lock:
+        if _cache['path'] != path or _cache['mtime'] != mtime:
+            with open(path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            _cache.update(path=path, mtime=mtime, data=data)
+        return _cache['data']
+
+
+def get_forecasts(path=None):
+    """The precomputed forecasts, or None if they have not been built. Never builds."""
+    return load_forecasts(path)
+
+
+def _file_age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def refresh_forecasts(max_age, path=None):
+    """
+    Rebuild the forecast file unless it is younger than ``max_age`` seconds.
+
+    Returns:
+        bool: True if a build ran
+    """
+    path = path or default_path()
+    with _build_lock:
+        age = _file_age(path)
+        if age is not None and age < max_age:
+            return False
+        build_forecasts(path)
+        return True
+
+
+def init_price_forecasts(interval, path=None):
+    """
+    Startup hook: build the file in the background if it is missing or stale,
+    then keep it fresh every ``interval`` seconds (0 = cron only, no thread).
+    """
+    global _refresher
+    if interval <= 0 or (_refresher is not None and _refresher.is_alive()):
+        return
+    _stop_event.clear()
+
+    def _refresh():
+        while True:
+            try:
+                refresh_forecasts(interval, path)
+            except Exception as e:
+                logger.error(f"Price forecast refresh failed: {e}")
+            if _stop_event.wait(interval):
+                return
+
+    _refresher = threading.Thread(target=_refresh, name='price-forecast-refresher', daemon=True)
+    _refresher.start()
+
+
+def stop_refresher():
+    """Stop the background refresher started by init_price_forecasts."""
+    global _refresher
+    _stop_event.set()
+    if _refresher is not None:
+        _refresher.join(timeout=1)
+        _refresher = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute trend forecasts for every commodity.')
+    parser.add_argument('--output', help=f'Output JSON (default: {FORECAST_FILENAME} in the dataset cache)')
+    parser.add_argument('--window-days', type=int, default=TREND_WINDOW_DAYS)
+    parser.add_argument('--model', help='trend, seasonal_naive, holt_winters, ar or auto (default: PRICE_FORECAST_MODEL)')
+    args = parser.parse_args(argv)
+
+    document = build_forecasts(args.output, args.window_days, args.model)
+    summary = {c: dict(e['horizons'], model=e['model']) for c, e in document['commodities'].items()}
+    print(json.dumps({'generated_at': document['generated_at'], 'forecasts': summary}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+Seasonal price forecasting models and a rolling-origin backtest.
+
+Every model has the same two-call interface: ``fit(y)`` on a 1-D array of
+daily prices, then ``predict(horizon)``, which returns the next ``horizon``
+days. They are plain NumPy so they can run on the request path and inside
+the batch forecast job:
+- ``trend``: least-squares line (the original MarketService behaviour)
+- ``seasonal_naive``: repeat the last season
+- ``holt_winters``: additive level/trend/season smoothing; the smoothing
+  parameters are chosen by one-step error over a grid, all evaluated in one
+  vectorized pass
+- ``ar``: autoregression on the last ``order`` days, fitted by least squares
+
+The backtest refits every model at rolling origins over the recorded price
+history, then reports accuracy and fit/predict time per model and the best
+model per commodity. ``--write`` saves that choice; the batch forecast job
+then uses it (PRICE_FORECAST_MODEL=auto).
+
+Usage:
+    python -m app.utils.price_models
+    python -m app.utils.price_models --horizon 14 --write
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from app.utils.price_series import PRICE_HISTORY_PATH, TrendStats, get_price_store
+
+SEASON_DAYS = 7
+SELECTION_FILENAME = 'price_model_selection.json'
+
+
+class TrendModel:
+    """Least-squares straight line."""
+
+    def fit(self, y):
+        y = np.asarray(y, dtype=np.float64)
+        x = np.arange(len(y))
+        self.stats = TrendStats()
+        self.stats.n = len(y)
+        self.stats.sx, self.stats.sy = float(x.sum()), float(y.sum())
+        self.stats.sxx, self.stats.sxy = float(np.dot(x, x)), float(np.dot(x, y))
+        self.n = len(y)
+        return self
+
+    def predict(self, horizon):
+        return self.stats.intercept + self.stats.slope * np.arange(self.n, self.n + horizon)
+
+
+class SeasonalNaive:
+    """Each day repeats the same day of the last season."""
+
+    def __init__(self, season=SEASON_DAYS):
+        self.season = season
+
+    def fit(self, y):
+        y = np.asarray(y, dtype=np.float64)
+        self.last = y[-self.season:] if len(y) >= self.season else np.full(self.season, y[-1])
+        return self
+
+    def predict(self, horizon):
+        return np.resize(self.last, horizon)
+
+
+class HoltWinters:
+    """Additive Holt-Winters with grid-searched smoothing parameters."""
+
+    ALPHAS = (0.1, 0.3, 0.5, 0.8)
+    BETAS = (0.01, 0.05, 0.1)
+    GAMMAS = (0.05, 0.1, 0.3)
+
+    def __init__(self, season=SEASON_DAYS, damping=0.98):
+        self.season = season
+        self.damping = damping
+
+    def fit(self, y):
+        y = np.asarray(y, dtype=np.float64)
+        m = self.season
+        if len(y) < 2 * m:
+            raise ValueError(f"Holt-Winters needs at least {2 * m} observations")
+
+        grid = np.array([(a, b, g) for a in self.ALPHAS for b in self.BETAS for g in self.GAMMAS])
+        alpha, beta, gamma = grid[:, 0], grid[:, 1], grid[:, 2]
+        phi = self.damping
+        k = len(grid)
+
+        level = np.full(k, y[:m].mean())
+        trend = np.full(k, (y[m:2 * m].mean() - y[:m].mean()) / m)
+        season = np.tile(y[:m] - y[:m].mean(), (k, 1))
+        sse = np.zeros(k)
+        for t in range(m, len(y)):
+            s = season[:, t % m]
+            forecast = level + phi * trend + s
+            sse += (y[t] - forecast) ** 2
+            new_level = alpha * (y[t] - s) + (1 - alpha) * (level + phi * trend)
+            trend = beta * (new_level - level) + (1 - beta) * phi * trend
+            season[:, t % m] = gamma * (y[t] - new_level) + (1 - gamma) * s
+            level = new_level
+
+        best = int(np.argmin(sse))
+        self.params = {'alpha': float(alpha[best]), 'beta': float(beta[best]), 'gamma': float(gamma[best])}
+        self.level, self.trend = level[best], trend[best]
+        self.seasonal = season[best]
+        self.n = len(y)
+        return self
+
+    def predict(self, horizon):
+        steps = np.arange(1, horizon + 1)
+        damped = np.cumsum(self.damping ** steps)
+        return self.level + damped * self.trend + self.seasonal[(self.n + steps - 1) % self.season]
+
+
+class AutoRegressive:
+    """AR(order) with intercept, forecast recursively."""
+
+    def __init__(self, order=SEASON_DAYS, ridge=1e-6):
+        self.order = order
+        self.ridge = ridge
+
+    def fit(self, y):
+        y = np.asarray(y, dtype=np.float64)
+        p = self.order
+        if len(y) <= 2 * p:
+            raise ValueError(f"AR({p}) needs more than {2 * p} observations")
+        # Scale so the ridge term is unit-free
+        self.scale = float(np.abs(y).mean()) or 1.0
+        z = y / self.scale
+        lags = np.lib.stride_tricks.sliding_window_view(z[:-1], p)
+        X = np.hstack([np.ones((len(lags), 1)), lags])
+        target = z[p:]
+        self.coef = np.linalg.solve(X.T @ X + self.ridge * np.eye(p + 1), X.T @ target)
+        self.history = z[-p:].copy()
+        return self
+
+    def predict(self, horizon):
+        window = list(self.history)
+        out = np.empty(horizon)
+        for i in range(horizon):
+            value = self.coef[0] + np.dot(self.coef[1:], window[-self.order:])
+            out[i] = value
+            window.append(value)
+        return out * self.scale
+
+
+MODELS = {
+    'trend': TrendModel,
+    'seasonal_naive': SeasonalNaive,
+    'holt_winters': HoltWinters,
+    'ar': AutoRegressive,
+}
+
+
+def make_model(name):
+    return MODELS[name]()
+
+
+def forecast(name, y, horizon):
+    """Fit model ``name`` on ``y`` and return the next ``horizon`` values."""
+    return make_model(name).fit(y).predict(horizon)
+
+
+def backtest(y, name, horizon=7, initial=None, step=7):
+    """
+    Rolling-origin evaluation of one model on one series.
+
+    The model is refit at origins ``initial, initial + step, ...`` on all data
+    up to the origin, and scored on the following ``horizon`` days.
+
+    Returns:
+        dict: mae, mape (%), rmse, origins, mean fit/predict milliseconds
+    """
+    y = np.asarray(y, dtype=np.float64)
+    initial = initial or len(y) // 2
+    errors, actuals = [], []
+    fit_ms = predict_ms = 0.0
+    origins = range(initial, len(y) - horizon + 1, step)
+    for origin in origins:
+        start = time.perf_counter()
+        model = make_model(name).fit(y[:origin])
+        fitted = time.perf_counter()
+        predicted = model.predict(horizon)
+        fit_ms += (fitted - start) * 1000
+        predict_ms += (time.perf_counter() - fitted) * 1000
+        actual = y[origin:origin + horizon]
+        errors.append(predicted - actual)
+        actuals.append(actual)
+
+    count = len(errors)
+    if not count:
+        return {'origins': 0}
+    errors, actuals = np.concatenate(errors), np.concatenate(actuals)
+    return {
+        'origins': count,
+        'mae': round(float(np.abs(errors).mean()), 2),
+        'mape': round(float((np.abs(errors) / np.maximum(np.abs(actuals), 1e-9)).mean() * 100), 3),
+        'rmse': round(float(np.sqrt((errors ** 2).mean())), 2),
+        'fit_ms': round(fit_ms / count, 3),
+        'predict_ms': round(predict_ms / count, 3),
+    }
+
+
+def run_backtests(horizon=7, step=7, models=None, store=None):
+    """
+    Backtest every model on every recorded commodity.
+
+    Returns:
+        dict: {'commodities': {id: {'best': name, 'models': {name: metrics}}}, 'summary': {name: mean metrics}}
+    """
+    store = store or get_price_store()
+    models = models or list(MODELS)
+    report = {}
+    for commodity in store.commodities():
+        prices = store.get(commodity).prices
+        results = {name: backtest(prices, name, horizon, step=step) for name in models}
+        scored = {name: r for name, r in results.items() if r.get('origins')}
+        best = min(scored, key=lambda name: scored[name]['mape']) if scored else 'trend'
+        report[commodity] = {'best': best, 'models': results}
+
+    summary = {}
+    for name in models:
+        rows = [r['models'][name] for r in report.values() if r['models'][name].get('origins')]
+        if rows:
+            summary[name] = {
+                metric: round(float(np.mean([row[metric] for row in rows])), 3)
+                for metric in ('mape', 'mae', 'fit_ms', 'predict_ms')
+            }
+            summary[name]['best_for'] = sum(1 for r in report.values() if r['best'] == name)
+    return {'horizon': horizon, 'step': step, 'commodities': report, 'summary': summary}
+
+
+def selection_path():
+    from app.utils.columnar_store import cache_root
+    return os.path.join(cache_root(PRICE_HISTORY_PATH), SELECTION_FILENAME)
+
+
+def write_selection(report, path=None):
+    """Save the best model per commodity from a backtest report."""
+    path = path or selection_path()
+    selection = {commodity: entry['best'] for commodity, entry in report['commodities'].items()}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump({'horizon': report['horizon'], 'models': selection}, fh, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_selection(path=None):
+    """{commodity: model name} from the last saved backtest, or {}."""
+    path = path or selection_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh).get('models', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the price forecasting models.')
+    parser.add_argument('--horizon', type=int, default=7, help='Days ahead scored at each origin')
+    parser.add_argument('--step', type=int, default=7, help='Days between origins')
+    parser.add_argument('--models', nargs='*', choices=list(MODELS))
+    parser.add_argument('--write', action='store_true', help='Save the best model per commodity for the forecast job')
+    args = parser.parse_args(argv)
+
+    report = run_backtests(args.horizon, args.step, args.models)
+    if args.write:
+        report['written'] = write_selection(report)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,127 @@
 """Price scraper for PIHPS (Bank Indonesia) data."""
-import requests
-from datetime import datetime
+import argparse
+import asyncio
+import functools
+import json
 import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TICKER_COMMODITIES = [
+    "Beras Premium",
+    "Beras Medium",
+    "Bawang Merah Ukuran Sedang",
+    "Bawang Putih Ukuran Sedang",
+    "Cabai Merah Keriting",
+    "Cabai Merah Besar",
+    "Cabai Rawit Hijau",
+    "Cabai Rawit Merah",
+    "Daging Ayam Ras Segar",
+    "Daging Sapi Kualitas 1",
+    "Telur Ayam Ras Segar",
+    "Minyak Goreng Curah",
+    "Gula Pasir Lokal",
+    "Jagung Pipilan Kering"
+]
+
+_session = None
+_session_lock = threading.Lock()
+_executor = None
+_loop = None
+_runtime_lock = threading.Lock()
+
+
+def get_session(pool_size=10):
+    """Process-wide requests.Session with a keep-alive connection pool."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_executor(max_workers=10):
+    """Process-wide thread pool for the blocking session calls of the async fetchers."""
+    global _executor
+    if _executor is None:
+        with _runtime_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pihps-fetch')
+    return _executor
+
+
+def get_event_loop():
+    """
+    Process-wide event loop running on its own daemon thread.
+
+    Synchronous callers submit coroutines to it with
+    ``asyncio.run_coroutine_threadsafe`` instead of creating and tearing
+    down a loop per call.
+    """
+    global _loop
+    if _loop is None:
+        with _runtime_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='pihps-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host for asyncio callers.
+
+    Each host gets ``rate`` requests per second with bursts of up to
+    ``burst``; ``acquire`` sleeps until a token is available. A rate of 0
+    disables limiting.
+    """
+
+    def __init__(self, rate=10.0, burst=5):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # host -> (tokens, last refill)
+
+    async def acquire(self, host):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[host] = (tokens - 1, now)
+                return
+            self._buckets[host] = (tokens, now)
+            await asyncio.sleep((1 - tokens) / self.rate)
+
 
 class PIHPSScraper:
     """Scraper for Bank Indonesia PIHPS price data."""
-    
+
     BASE_URL = "https://www.bi.go.id"
     DATA_ENDPOINT = "/hargapangan/WebSite/Home/GetChartData"
-    
+
+    # Async fetch pipeline
+    CONCURRENCY = 5
+    RATE_PER_HOST = 10.0  # requests per second
+    TIMEOUT = 3  # seconds
+    RETRY_BACKOFF = 0.2  # seconds, doubled per attempt, with full jitter
+
     # Mapping of commodity names (Indonesian to internal keys)
     COMMODITY_MAP = {
         "Beras Premium": "beras_premium",
@@ -29,111 +139,226 @@ class PIHPSScraper:
         "Gula Pasir Lokal": "gula_pasir",
         "Jagung Pipilan Kering": "jagung_pipilan"
     }
-    
+
+    @staticmethod
+    def _params(commodity_name):
+        # Generate temp_id (seems to be timestamp-based)
+        return {
+            "tempId": str(int(datetime.now().timestamp() * 1000)),
+            "comName": commodity_name,
+            "forInfo": "true"
+        }
+
+    @staticmethod
+    def _parse(commodity_name, data):
+        # The API returns an array with price info
+        if data and len(data) > 0:
+            latest = data[0]  # Most recent data point
+            return {
+                "name": commodity_name,
+                "price": int(float(latest.get("harga", 0))),
+                "unit": "kg",  # Most commodities are per kg
+                "date": latest.get("date", "")
+            }
+        return None
+
+    @staticmethod
+    def _ticker_item(price_info):
+        # Simplify name for ticker
+        simple_name = price_info["name"].replace(" Ukuran Sedang", "").replace(" Segar", "").replace(" Kering", "")
+        return {
+            "name": simple_name,
+            "price": price_info["price"],
+            "unit": price_info["unit"]
+        }
+
     @classmethod
-    def fetch_commodity_price(cls, commodity_name, max_retries=2):
+    def fetch_commodity_price(cls, commodity_name, max_retries=2, base_url=None):
         """
         Fetch current price for a specific commodity.
-        
+
         Args:
             commodity_name: Indonesian name of commodity (e.g., "Bawang Merah Ukuran Sedang")
             max_retries: Number of retry attempts if request fails
-            
+            base_url: Override BASE_URL (e.g. a local stand-in server)
+
         Returns:
             dict: {"name": str, "price": int, "unit": str, "date": str} or None
         """
+        url = f"{base_url or cls.BASE_URL}{cls.DATA_ENDPOINT}"
         for attempt in range(max_retries):
             try:
-                # Generate temp_id (seems to be timestamp-based)
-                temp_id = str(int(datetime.now().timestamp() * 1000))
-                
-                params = {
-                    "tempId": temp_id,
-                    "comName": commodity_name,
-                    "forInfo": "true"
-                }
-                
-                response = requests.get(
-                    f"{cls.BASE_URL}{cls.DATA_ENDPOINT}",
-                    params=params,
-                    timeout=3  # Reduced from 10 to 3 seconds
-                )
+                response = get_session().get(url, params=cls._params(commodity_name), timeout=cls.TIMEOUT)
                 response.raise_for_status()
-                
-                data = response.json()
-                
-                # The API returns an array with price info
-                if data and len(data) > 0:
-                    latest = data[0]  # Most recent data point
-                    return {
-                        "name": commodity_name,
-                        "price": int(float(latest.get("harga", 0))),
-                        "unit": "kg",  # Most commodities are per kg
-                        "date": latest.get("date", "")
-                    }
-                
-                return None
-                
+                return cls._parse(commodity_name, response.json())
+
             except Exception as e:
                 if attempt == max_retries - 1:  # Last attempt
                     logger.error(f"Error fetching price for {commodity_name}: {e}")
                 # Otherwise, retry silently
                 continue
-        
+
+        return None
+
+    @classmethod
+    async def fetch_commodity_price_async(cls, commodity_name, semaphore, limiter, max_retries=3, base_url=None):
+        """
+        Async variant of fetch_commodity_price.
+
+        The blocking request runs on the shared keep-alive session in the
+        shared executor (get_executor). ``semaphore`` bounds concurrency and
+        ``limiter`` paces requests per host. Failed attempts are retried after exponential backoff with
+        full jitter.
+
+        Returns:
+            dict or None
+        """
+        url = f"{base_url or cls.BASE_URL}{cls.DATA_ENDPOINT}"
+        host = urlsplit(url).netloc
+        session = get_session(cls.CONCURRENCY * 2)
+        executor = get_executor(cls.CONCURRENCY * 2)
+        loop = asyncio.get_running_loop()
+        for attempt in range(max_retries):
+            try:
+                async with semaphore:
+                    await limiter.acquire(host)
+                    response = await loop.run_in_executor(executor, functools.partial(
+                        session.get, url, params=cls._params(commodity_name), timeout=cls.TIMEOUT
+                    ))
+                response.raise_for_status()
+                return cls._parse(commodity_name, response.json())
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    logger.error(f"Error fetching price for {commodity_name}: {e}")
+                    return None
+                await asyncio.sleep(random.uniform(0, cls.RETRY_BACKOFF * (2 ** attempt)))
         return None
-    
+
     @classmethod
-    def fetch_ticker_prices(cls, commodities=None):
+    async def fetch_ticker_prices_async(cls, commodities=None, base_url=None, concurrency=None, rate=None):
+        """
+        Fetch all ticker commodities concurrently.
+
+        Returns:
+            list: Ticker items in the order of ``commodities`` (failed ones omitted)
+        """
+        commodities = commodities or DEFAULT_TICKER_COMMODITIES
+        concurrency = concurrency or cls.CONCURRENCY
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = HostRateLimiter(cls.RATE_PER_HOST if rate is None else rate, burst=concurrency)
+        results = await asyncio.gather(*[
+            cls.fetch_commodity_price_async(name, semaphore, limiter, base_url=base_url)
+            for name in commodities
+        ])
+        return [cls._ticker_item(info) for info in results if info]
+
+    @classmethod
+    def fetch_ticker_prices(cls, commodities=None, base_url=None, rate=None):
         """
         Fetch prices for multiple commodities for ticker display.
-        
+
         Args:
             commodities: List of commodity names. If None, uses default set.
-            
+            base_url: Override BASE_URL (e.g. a local stand-in server)
+            rate: Requests per second per host (default RATE_PER_HOST, 0 = unlimited)
+
         Returns:
             list: [{"name": str, "price": int, "unit": str}, ...]
         """
-        if commodities is None:
-            # Default commodities for ticker - expanded list
-            commodities = [
-                "Beras Premium",
-                "Beras Medium",
-                "Bawang Merah Ukuran Sedang",
-                "Bawang Putih Ukuran Sedang",
-                "Cabai Merah Keriting",
-                "Cabai Merah Besar",
-                "Cabai Rawit Hijau",
-                "Cabai Rawit Merah",
-                "Daging Ayam Ras Segar",
-                "Daging Sapi Kualitas 1",
-                "Telur Ayam Ras Segar",
-                "Minyak Goreng Curah",
-                "Gula Pasir Lokal",
-                "Jagung Pipilan Kering"
-            ]
-        
-        # Use ThreadPoolExecutor for concurrent requests (faster)
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
-        ticker_data = []
-        
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            # Submit all fetch tasks
-            future_to_commodity = {
-                executor.submit(cls.fetch_commodity_price, commodity): commodity 
-                for commodity in commodities
-            }
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_commodity):
-                price_info = future.result()
-                if price_info:
-                    # Simplify name for ticker
-                    simple_name = price_info["name"].replace(" Ukuran Sedang", "").replace(" Segar", "").replace(" Kering", "")
-                    ticker_data.append({
-                        "name": simple_name,
-                        "price": price_info["price"],
-                        "unit": price_info["unit"]
-                    })
-        
-        return ticker_data
+        coroutine = cls.fetch_ticker_prices_async(commodities, base_url, rate=rate)
+        # Runs on the shared background loop, so this also works when called from inside another loop
+        return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+
+# ---------- Local stand-in server and benchmark ----------
+
+def start_stub_server(latency=0.1, failure_rate=0.0, port=0):
+    """
+    Start a local HTTP/1.1 keep-alive server that imitates GetChartData.
+
+    Returns:
+        tuple: (server, base_url); call ``server.shutdown()`` when done
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            if random.random() < failure_rate:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = json.dumps([{"harga": str(random.randint(5000, 150000)), "date": datetime.now().strftime('%Y-%m-%d')}]).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _fetch_unpooled(base_url, commodities):
+    """The previous behaviour: a fresh thread pool and a bare requests.get per commodity."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(name):
+        try:
+            response = requests.get(f"{base_url}{PIHPSScraper.DATA_ENDPOINT}", params=PIHPSScraper._params(name),
+                                    timeout=PIHPSScraper.TIMEOUT)
+            response.raise_for_status()
+            return PIHPSScraper._parse(name, response.json())
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        return [info for info in executor.map(fetch, commodities) if info]
+
+
+def benchmark(latency=0.1, failure_rate=0.0, repeats=5):
+    """
+    Wall time for the 14 default commodities against a local stand-in server.
+
+    Returns:
+        dict: Mean seconds and items returned per strategy
+    """
+    server, base_url = start_stub_server(latency, failure_rate)
+    try:
+        strategies = {
+            'unpooled_threads': lambda: _fetch_unpooled(base_url, DEFAULT_TICKER_COMMODITIES),
+            'async_pooled': lambda: PIHPSScraper.fetch_ticker_prices(base_url=base_url, rate=0),
+            'async_pooled_rate_limited': lambda: PIHPSScraper.fetch_ticker_prices(base_url=base_url),
+        }
+        report = {'latency_s': latency, 'failure_rate': failure_rate, 'commodities': len(DEFAULT_TICKER_COMMODITIES)}
+        for name, run in strategies.items():
+            timings, items = [], 0
+            for _ in range(repeats):
+                start = time.perf_counter()
+                items = len(run())
+                timings.append(time.perf_counter() - start)
+            report[name] = {'mean_s': round(sum(timings) / len(timings), 4), 'min_s': round(min(timings), 4),
+                            'items': items}
+        return report
+    finally:
+        server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark PIHPS ticker fetching against a local stand-in server.')
+    parser.add_argument('--latency', type=float, default=0.1, help='Simulated server latency (seconds)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.latency, args.failure_rate, args.repeats), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""In-memory columnar store of daily commodity prices."""
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from app.utils.columnar_store import load_dataset
+
+PRICE_HISTORY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'price_history_1year.csv'
+)
+
+TREND_WINDOW_DAYS = 365
+
+# One consistent, immutable view of a PriceSeries: dates/prices are read-only
+# views of exactly the published observations, and trend matches them.
+SeriesSnapshot = namedtuple('SeriesSnapshot', 'dates prices trend origin version')
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def to_day(value):
+    """Coerce a date, datetime, 'YYYY-MM-DD' string or datetime64 to datetime64[D]."""
+    if isinstance(value, np.datetime64):
+        return value.astype('datetime64[D]')
+    if hasattr(value, 'date') and callable(value.date):
+        value = value.date()
+    return np.datetime64(str(value)[:10], 'D')
+
+
+class TrendStats:
+    """
+    Running OLS sufficient statistics (n, sum x, sum y, sum xx, sum xy).
+
+    Points can be added and removed in O(1), and the least-squares slope and
+    intercept are read off in O(1), with no refit.
+    """
+
+    __slots__ = ('n', 'sx', 'sy', 'sxx', 'sxy')
+
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def copy(self):
+        stats = TrendStats()
+        stats.n, stats.sx, stats.sy, stats.sxx, stats.sxy = self.n, self.sx, self.sy, self.sxx, self.sxy
+        return stats
+
+    @classmethod
+    def from_points(cls, xs, ys):
+        stats = cls()
+        for x, y in zip(xs, ys):
+            stats.add(x, y)
+        return stats
+
+    def add(self, x, y):
+        x, y = float(x), float(y)
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+
+    def remove(self, x, y):
+        x, y = float(x), float(y)
+        self.n -= 1
+        self.sx -= x
+        self.sy -= y
+        self.sxx -= x * x
+        self.sxy -= x * y
+
+    @property
+    def slope(self):
+        denominator = self.n * self.sxx - self.sx * self.sx
+        if self.n < 2 or denominator <= 1e-9 * max(self.n * self.sxx, 1.0):
+            return 0.0
+        return (self.n * self.sxy - self.sx * self.sy) / denominator
+
+    @property
+    def intercept(self):
+        if not self.n:
+            return 0.0
+        return (self.sy - self.slope * self.sx) / self.n
+
+    def predict(self, x):
+        return self.intercept + self.slope * x
+
+
+class PriceSeries:
+    """
+    Contiguous, date-sorted NumPy arrays for one commodity.
+
+    Range queries are two binary searches (``np.searchsorted``) and return
+    views, not copies. Appends in date order go into spare capacity
+    (amortized O(1)). Back-filled or corrected dates rebuild the arrays, so
+    views handed out earlier never change underneath a reader.
+
+    ``trend`` holds OLS statistics over the trailing ``trend_window`` days,
+    with x in days since ``origin``. In-order appends update it in O(1)
+    (amortized, counting the points that slide out of the window).
+
+    Readers never take the lock: every change publishes a new
+    :class:`SeriesSnapshot` with a single assignment, and readers work from
+    the one snapshot they read. Writers are serialized by the lock and never
+    modify anything a published snapshot can see.
+    """
+
+    def __init__(self, commodity_id, name, dates, prices, trend_window=TREND_WINDOW_DAYS):
+        self.commodity_id = commodity_id
+        self.name = name
+        n = len(dates)
+        capacity = max(16, n + n // 4)
+        self._dates = np.empty(capacity, dtype='datetime64[D]')
+        self._prices = np.empty(capacity, dtype=np.float64)
+        self._dates[:n] = dates
+        self._prices[:n] = prices
+        self._lock = threading.Lock()
+        self.trend_window = trend_window
+        origin = self._dates[0] if n else None
+        trend, self._trend_lo = self._build_trend(self._dates[:n], self._prices[:n], origin)
+        self._appends_since_rebuild = 0
+        self._publish(n, trend, origin, 0)
+
+    def _publish(self, n, trend, origin, version):
+        dates, prices = self._dates[:n], self._prices[:n]
+        dates.flags.writeable = False
+        prices.flags.writeable = False
+        self._snapshot = SeriesSnapshot(dates, prices, trend, origin, version)
+
+    def snapshot(self):
+        """The current :class:`SeriesSnapshot`; use it when reading several fields together."""
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot.dates)
+
+    @property
+    def version(self):
+        """Bumped on every change, for caches keyed on the series."""
+        return self._snapshot.version
+
+    @property
+    def trend(self):
+        return self._snapshot.trend
+
+    @property
+    def origin(self):
+        return self._snapshot.origin
+
+    @property
+    def dates(self):
+        return self._snapshot.dates
+
+    @property
+    def prices(self):
+        return self._snapshot.prices
+
+    @property
+    def first_date(self):
+        dates = self._snapshot.dates
+        return dates[0] if len(dates) else None
+
+    @property
+    def last_date(self):
+        dates = self._snapshot.dates
+        return dates[-1] if len(dates) else None
+
+    @staticmethod
+    def day_index_from(origin, date):
+        return int((to_day(date) - origin).astype(np.int64))
+
+    def day_index(self, date):
+        """x coordinate of ``date`` for :attr:`trend`."""
+        return self.day_index_from(self._snapshot.origin, date)
+
+    def _window_floor(self, last_date):
+        return last_date - np.timedelta64(self.trend_window - 1, 'D')
+
+    def _build_trend(self, dates, prices, origin):
+        """OLS statistics over the trailing window of ``dates``; returns (stats, first row in the window)."""
+        trend = TrendStats()
+        lo = 0
+        if len(dates):
+            lo = int(np.searchsorted(dates, self._window_floor(dates[-1]), side='left'))
+            xs = (dates[lo:] - origin).astype(np.int64).astype(np.float64)
+            ys = prices[lo:]
+            trend.n = len(xs)
+            trend.sx, trend.sy = float(xs.sum()), float(ys.sum())
+            trend.sxx, trend.sxy = float(np.dot(xs, xs)), float(np.dot(xs, ys))
+        return trend, lo
+
+    def range(self, start=None, end=None):
+        """
+        Observations with ``start <= date <= end`` (either bound optional).
+
+        Returns:
+            tuple: (dates view, prices view)
+        """
+        return self._range(self._snapshot, start, end)
+
+    @staticmethod
+    def _range(snapshot, start, end):
+        dates = snapshot.dates
+        lo = 0 if start is None else int(np.searchsorted(dates, to_day(start), side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, to_day(end), side='right'))
+        return dates[lo:hi], snapshot.prices[lo:hi]
+
+    def last_days(self, days, snapshot=None):
+        """The trailing ``days`` calendar days ending at the latest observation (of ``snapshot`` if given)."""
+        snapshot = snapshot or self._snapshot
+        if not len(snapshot.dates):
+            return snapshot.dates, snapshot.prices
+        return self._range(snapshot, snapshot.dates[-1] - np.timedelta64(max(int(days), 1) - 1, 'D'), None)
+
+    def append(self, date, price):
+        """
+        Add or correct one observation.
+
+        Returns:
+            bool: True if it was a plain in-order append
+        """
+        day = to_day(date)
+        with self._lock:
+            current = self._snapshot
+            n = len(current.dates)
+            if n == 0 or day > current.dates[-1]:
+                if n == len(self._dates):
+                    grow = max(16, n // 2)
+                    self._dates = np.concatenate([self._dates[:n], np.empty(grow, dtype='datetime64[D]')])
+                    self._prices = np.concatenate([self._prices[:n], np.empty(grow, dtype=np.float64)])
+                # Slot n is past every published view, so readers cannot see these writes
+                self._dates[n] = day
+                self._prices[n] = float(price)
+                origin = day if current.origin is None else current.origin
+                trend = current.trend.copy()
+                trend.add(self.day_index_from(origin, day), price)
+                floor = self._window_floor(day)
+                while self._dates[self._trend_lo] < floor:
+                    lo = self._trend_lo
+                    trend.remove(self.day_index_from(origin, self._dates[lo]), self._prices[lo])
+                    self._trend_lo = lo + 1
+                self._appends_since_rebuild += 1
+                if self._appends_since_rebuild >= self.trend_window:
+                    # Shed accumulated rounding error; still O(1) amortized
+                    trend, self._trend_lo = self._build_trend(self._dates[:n + 1], self._prices[:n + 1], origin)
+                    self._appends_since_rebuild = 0
+                self._publish(n + 1, trend, origin, current.version + 1)
+                return True
+
+            # Out of order or a correction: copy-on-write
+            dates, prices = current.dates.copy(), current.prices.copy()
+            pos = int(np.searchsorted(dates, day))
+            if pos < n and dates[pos] == day:
+                prices[pos] = float(price)
+            else:
+                dates = np.insert(dates, pos, day)
+                prices = np.insert(prices, pos, float(price))
+            capacity = max(16, len(dates) + len(dates) // 4)
+            new_dates = np.empty(capacity, dtype='datetime64[D]')
+            new_prices = np.empty(capacity, dtype=np.float64)
+            new_dates[:len(dates)] = dates
+            new_prices[:len(prices)] = prices
+            self._dates, self._prices = new_dates, new_prices
+            origin = min(current.origin, day)
+            trend, self._trend_lo = self._build_trend(dates, prices, origin)
+            self._appends_since_rebuild = 0
+            self._publish(len(dates), trend, origin, current.version + 1)
+            return False
+
+
+class PriceStore:
+    """Per-commodity :class:`PriceSeries`, loaded from the bundled price history."""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path=PRICE_HISTORY_PATH):
+        """Load ``date,commodity_id,commodity_name,price`` rows through the columnar cache."""
+        store = cls()
+        dataset = load_dataset(path)
+        codes = np.asarray(dataset['commodity_id'])
+        ids = dataset.categories['commodity_id']
+        name_codes = np.asarray(dataset['commodity_name'])
+        names = dataset.categories['commodity_name']
+        dates = np.asarray(dataset['date'], dtype='datetime64[D]')
+        prices = np.asarray(dataset['price'], dtype=np.float64)
+
+        order = np.lexsort((dates, codes))
+        codes, dates, prices, name_codes = codes[order], dates[order], prices[order], name_codes[order]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+            if hi <= lo or codes[lo] < 0:
+                continue
+            commodity_id = ids[codes[lo]]
+            store._series[commodity_id] = PriceSeries(commodity_id, names[name_codes[lo]], dates[lo:hi], prices[lo:hi])
+        return store
+
+    def get(self, commodity_id):
+        """PriceSeries for a commodity, or None if there is no history for it."""
+        return self._series.get(commodity_id)
+
+    def commodities(self):
+        return list(self._series)
+
+    def append(self, commodity_id, date, price, name=None):
+        """Record a new price, creating the series if needed."""
+        series = self._series.get(commodity_id)
+        if series is None:
+            with self._lock:
+                series = self._series.get(commodity_id)
+                if series is None:
+                    series = PriceSeries(commodity_id, name or commodity_id,
+                                         np.empty(0, dtype='datetime64[D]'), np.empty(0))
+                    self._series[commodity_id] = series
+        return series.append(date, price)
+
+
+def get_price_store(path=PRICE_HISTORY_PATH):
+    """Get the process-wide PriceStore, loading it on first use."""
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore.from_csv(path)
+        return _store
@@ -0,0 +1,158 @@
+"""Content-addressed result cache for uploaded images."""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(image_data):
+    """
+    64-bit DCT perceptual hash of an image, or None if it cannot be decoded.
+
+    The image is decoded at 1/8 scale in grayscale, resized to 32x32, and the
+    low-frequency 8x8 DCT block (minus the DC term) is thresholded at its
+    median. Re-encoded, resized or lightly edited copies of the same photo
+    land within a few bits of each other.
+    """
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    block = cv2.dct(small)[:8, :8].flatten()[1:]
+    bits = block > np.median(block)
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+class ImageFingerprint:
+    """SHA-256 and (lazily) perceptual hash of one upload."""
+
+    __slots__ = ('sha256', '_image_data', '_phash', '_phash_done')
+
+    def __init__(self, image_data):
+        self.sha256 = hashlib.sha256(image_data).hexdigest()
+        self._image_data = image_data
+        self._phash = None
+        self._phash_done = False
+
+    @property
+    def phash(self):
+        if not self._phash_done:
+            try:
+                self._phash = perceptual_hash(self._image_data)
+            except Exception:
+                self._phash = None
+            self._phash_done = True
+            self._image_data = None
+        return self._phash
+
+    def set_phash(self, phash):
+        """Use a hash computed elsewhere (e.g. in a worker process that already had the bytes)."""
+        self._phash = phash
+        self._phash_done = True
+        self._image_data = None
+
+
+class ImageResultCache:
+    """
+    Bounded LRU + TTL cache of analysis results keyed by image content.
+
+    Lookups try the exact SHA-256 of the bytes. Near-duplicate matching on
+    the perceptual hash (within ``max_distance`` bits) is off by default: it
+    can return the result of a different but similar photo, and a miss then
+    pays an extra image decode. Every entry carries a ``tag`` (e.g. the model
+    version) and only matches lookups with the same tag, so a model hot swap
+    never serves stale results. Results are copied in and out, so callers
+    may mutate what they get back.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, max_distance=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()   # sha256 -> (result, tag, phash, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def lookup(self, image_data, tag=None, near=True):
+        """
+        Look up a cached result for the image.
+
+        Args:
+            near: Allow a perceptual-hash match when max_distance > 0. Pass
+                False to skip the decode here, e.g. when a worker will
+                compute the hash and hand it to put() via set_phash().
+
+        Returns:
+            tuple: (result or None, match type 'exact' | 'near' | None, fingerprint)
+        """
+        fingerprint = ImageFingerprint(image_data)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(fingerprint.sha256)
+            if entry is not None:
+                if entry[3] > now and entry[1] == tag:
+                    self._entries.move_to_end(fingerprint.sha256)
+                    self.hits += 1
+                    return copy.deepcopy(entry[0]), 'exact', fingerprint
+                del self._entries[fingerprint.sha256]
+
+        if self.max_distance > 0 and near:
+            phash = fingerprint.phash
+            if phash is not None:
+                with self._lock:
+                    best_key, best_distance = None, self.max_distance + 1
+                    for key, (result, entry_tag, entry_phash, expires_at) in self._entries.items():
+                        if entry_phash is None or entry_tag != tag or expires_at <= now:
+                            continue
+                        distance = hamming_distance(phash, entry_phash)
+                        if distance < best_distance:
+                            best_key, best_distance = key, distance
+                    if best_key is not None:
+                        self._entries.move_to_end(best_key)
+                        self.near_hits += 1
+                        return copy.deepcopy(self._entries[best_key][0]), 'near', fingerprint
+
+        with self._lock:
+            self.misses += 1
+        return None, None, fingerprint
+
+    def put(self, fingerprint, result, tag=None):
+        """Store a result under the fingerprint returned by lookup()."""
+        phash = fingerprint.phash if self.max_distance > 0 else None
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries[fingerprint.sha256] = (result, tag, phash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(fingerprint.sha256)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses
+            }
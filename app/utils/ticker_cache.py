@@ -0,0 +1,113 @@
+"""Stale-while-revalidate cache for the price ticker."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class TickerCache:
+    """
+    Serves the last good ticker snapshot without waiting on the loader.
+
+    A daemon thread reloads the snapshot every ``interval`` seconds. Loads
+    are single-flight and always run on a background thread: while one is
+    running, other callers join it instead of starting their own, so a cold
+    start under load makes exactly one upstream fetch. Only requests that
+    arrive before the first snapshot wait, and for at most
+    ``cold_timeout`` seconds. A loader that raises or returns nothing
+    keeps the previous snapshot.
+    """
+
+    def __init__(self, loader, interval=60, cold_timeout=5):
+        self.loader = loader
+        self.interval = interval
+        self.cold_timeout = cold_timeout
+        self._snapshot = None  # (data, fetched_at)
+        self._inflight = None
+        self._flight_lock = threading.Lock()
+        self._refresher = None
+        self.loads = 0
+        self.failures = 0
+        self.last_error = None
+
+    def _run_load(self, event):
+        try:
+            data = self.loader()
+            if data:
+                self._snapshot = (data, time.time())
+                self.loads += 1
+            else:
+                raise ValueError('loader returned no data')
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Ticker refresh failed, keeping last snapshot: {e}")
+        finally:
+            with self._flight_lock:
+                self._inflight = None
+            event.set()
+
+    def _load(self):
+        """Start a background load unless one is in flight; return its completion event."""
+        with self._flight_lock:
+            if self._inflight is not None:
+                return self._inflight
+            event = self._inflight = threading.Event()
+        threading.Thread(target=self._run_load, args=(event,), name='ticker-load', daemon=True).start()
+        return event
+
+    def _ensure_refresher(self):
+        if self.interval <= 0 or (self._refresher is not None and self._refresher.is_alive()):
+            return
+
+        def _refresh():
+            while True:
+                time.sleep(self.interval)
+                self._load().wait()
+
+        self._refresher = threading.Thread(target=_refresh, name='ticker-refresher', daemon=True)
+        self._refresher.start()
+
+    def get(self):
+        """
+        The current ticker data, or None if nothing has loaded yet.
+
+        A snapshot older than two intervals (e.g. the refresher was not
+        running) is still returned, and a background reload is started.
+        """
+        self._ensure_refresher()
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._load().wait(self.cold_timeout)
+            snapshot = self._snapshot
+            return snapshot[0] if snapshot else None
+
+        if self.interval > 0 and time.time() - snapshot[1] > 2 * self.interval:
+            self._load()
+        return snapshot[0]
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'updated_at': snapshot[1] if snapshot else None,
+            'age_seconds': round(time.time() - snapshot[1], 1) if snapshot else None,
+            'interval': self.interval,
+            'loads': self.loads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'refreshing': self._inflight is not None
+        }
+
+
+def get_ticker_cache(loader, interval=60, cold_timeout=5):
+    """Get the process-wide TickerCache, creating it with ``loader`` on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TickerCache(loader, interval, cold_timeout)
+    return _cache
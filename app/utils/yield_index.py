@@ -0,0 +1,115 @@
+"""Preloaded, Yield-sorted index over the EDA_500 dataset."""
+import os
+import threading
+
+import numpy as np
+
+from app.utils.columnar_store import load_dataset
+
+FEATURE_COLUMNS = ('Nitrogen', 'Phosphorus', 'Potassium', 'Temperature', 'Rainfall', 'pH')
+INDEX_COLUMNS = FEATURE_COLUMNS + ('Yield',)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class YieldIndex:
+    """
+    Compact float32 columns of EDA_500 sorted by Yield.
+
+    Nearest-yield lookups are a binary search (``np.searchsorted``) instead
+    of an argsort over the whole dataset, and the k nearest rows come from a
+    small window around the insertion point.
+    """
+
+    def __init__(self, columns):
+        order = np.argsort(columns['Yield'], kind='stable')
+        self.columns = {name: np.ascontiguousarray(values[order], dtype=np.float32)
+                        for name, values in columns.items()}
+        self.yields = self.columns['Yield']
+
+    @classmethod
+    def from_csv(cls, path):
+        """Build the index from EDA_500.csv, dropping rows without a numeric Yield."""
+        dataset = load_dataset(path)
+        keep = ~np.isnan(np.asarray(dataset['Yield'], dtype=np.float32))
+        return cls({name: np.asarray(dataset[name], dtype=np.float32)[keep] for name in INDEX_COLUMNS})
+
+    def __len__(self):
+        return len(self.yields)
+
+    def nearest(self, target):
+        """Position of the row whose Yield is closest to ``target`` (kg/ha)."""
+        if not len(self):
+            return None
+        pos = int(np.searchsorted(self.yields, target))
+        if pos == 0:
+            return 0
+        if pos == len(self):
+            return pos - 1
+        return pos if self.yields[pos] - target < target - self.yields[pos - 1] else pos - 1
+
+    def k_nearest(self, target, k):
+        """Positions of the ``k`` rows closest in Yield, nearest first."""
+        k = max(0, min(int(k), len(self)))
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+        pos = int(np.searchsorted(self.yields, target))
+        lo, hi = max(0, pos - k), min(len(self), pos + k)
+        window = np.abs(self.yields[lo:hi] - np.float32(target))
+        return lo + np.argsort(window, kind='stable')[:k]
+
+    def row(self, pos):
+        """Row at ``pos`` as {column: float}."""
+        return {name: float(values[pos]) for name, values in self.columns.items()}
+
+    def percentile_of(self, target):
+        """Share of rows (0-100) with Yield below ``target``."""
+        if not len(self):
+            return None
+        return float(np.searchsorted(self.yields, target)) / len(self) * 100
+
+    def yield_at_percentile(self, percentile):
+        """Yield value at a percentile of the sorted column (O(1))."""
+        percentile = min(100.0, max(0.0, percentile))
+        return float(self.yields[int(round(percentile / 100 * (len(self) - 1)))])
+
+    def percentile_bands(self, target, offsets=(10, 5)):
+        """
+        Where ``target`` sits in the yield distribution and the yields at
+        neighbouring percentile bands (e.g. -10, -5, 0, +5, +10 points).
+        """
+        percentile = self.percentile_of(target)
+        bands = {}
+        for offset in offsets:
+            bands[f"-{offset}"] = self.yield_at_percentile(percentile - offset)
+            bands[f"+{offset}"] = self.yield_at_percentile(percentile + offset)
+        bands['0'] = self.yield_at_percentile(percentile)
+        return {
+            'percentile': percentile,
+            'bands': dict(sorted(bands.items(), key=lambda item: float(item[0])))
+        }
+
+    def feature_ranges(self, positions, quantiles=(10, 50, 90)):
+        """Per-feature percentiles across a set of rows (e.g. the k nearest)."""
+        if len(positions) == 0:
+            return {}
+        return {
+            name: {f"p{q}": float(v) for q, v in zip(quantiles, np.percentile(self.columns[name][positions], quantiles))}
+            for name in FEATURE_COLUMNS
+        }
+
+
+def get_yield_index(path):
+    """Get the process-wide YieldIndex for ``path``, building it once."""
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            if not os.path.exists(path):
+                raise RuntimeError(f"Dataset {os.path.basename(path)} tidak ditemukan.")
+            index = YieldIndex.from_csv(path)
+            _indexes[path] = index
+        return index